@@ -101,26 +101,186 @@ MAX_PDF_SIZE_MB = int(os.getenv("MAX_PDF_SIZE_MB", "50"))
 DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_PDF_SIZE_MB * 1024 * 1024
 FILE_UPLOAD_MAX_MEMORY_SIZE = MAX_PDF_SIZE_MB * 1024 * 1024
 
+# ── Cache ─────────────────────────────────────────────────────
+
+# Rendered result HTML is cached per page; point this at a shared backend
+# (e.g. Redis/Memcached) when running several processes.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "5000"))},
+    }
+}
+
+# Seconds a rendered page stays cached (default: 1 day)
+RENDER_CACHE_TIMEOUT = int(os.getenv("RENDER_CACHE_TIMEOUT", "86400"))
+
+# ── Storage compression ───────────────────────────────────────
+
+# Codec for ConversionTask.page_results: "zlib" (default), "zstd" (needs the
+# zstandard package) or "none". Existing rows stay readable either way.
+PAGE_RESULTS_CODEC = os.getenv("PAGE_RESULTS_CODEC", "zlib")
+
+# Store output Markdown files gzipped (.md.gz); downloads are unchanged
+COMPRESS_OUTPUT_FILES = os.getenv("COMPRESS_OUTPUT_FILES", "False").lower() in ("true", "1", "yes")
+
+# Trained compression dictionaries (see `manage.py train_compression_dict`)
+COMPRESSION_DICT_DIR = MEDIA_ROOT / "compression"
+
 # ── Default primary key ──────────────────────────────────────
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # ── Vision API configuration ─────────────────────────────────
 
-VISION_BACKEND = os.getenv("VISION_BACKEND", "openai")  # "openai" or "gemini"
+VISION_BACKEND = os.getenv("VISION_BACKEND", "openai")  # "openai", "gemini" or "multi"
+
+# "multi": pages are spread over these backends (those with an API key) by
+# weight and live load, e.g. "openai=2,gemini=1".
+VISION_MULTI_WEIGHTS = {
+    name.strip(): float(weight or 1)
+    for name, _, weight in (
+        item.partition("=")
+        for item in os.getenv("VISION_MULTI_WEIGHTS", "openai=1,gemini=1").split(",")
+        if item.strip()
+    )
+}
 
 # OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+# More keys for the same provider, comma-separated; calls are balanced across them
+OPENAI_API_KEYS = [k.strip() for k in os.getenv("OPENAI_API_KEYS", "").split(",") if k.strip()]
 OPENAI_VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4o-mini")
+# Override the API endpoint, e.g. http://127.0.0.1:8100/v1 for the stub server
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
 
 # Gemini
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+GEMINI_API_KEYS = [k.strip() for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k.strip()]
 GEMINI_VISION_MODEL = os.getenv("GEMINI_VISION_MODEL", "gemini-2.0-flash")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")
+
+# Model cascade: transcribe with these cheaper models first and re-transcribe
+# pages scoring below CASCADE_MIN_SCORE (0-1) with the configured model.
+OPENAI_CASCADE_MODEL = os.getenv("OPENAI_CASCADE_MODEL", "")
+GEMINI_CASCADE_MODEL = os.getenv("GEMINI_CASCADE_MODEL", "")
+CASCADE_MIN_SCORE = float(os.getenv("CASCADE_MIN_SCORE", "0.7"))
 
 # Processing
 VISION_MAX_WORKERS = int(os.getenv("VISION_MAX_WORKERS", "4"))
 MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "100"))
 
+# Margin cropping: before encoding, cut off headers/footers repeated on at
+# least CROP_MIN_REPEAT of the pages, within CROP_MAX_FRACTION of each edge.
+CROP_MARGINS = os.getenv("CROP_MARGINS", "False").lower() in ("true", "1", "yes")
+CROP_MIN_REPEAT = float(os.getenv("CROP_MIN_REPEAT", "0.6"))
+CROP_MAX_FRACTION = float(os.getenv("CROP_MAX_FRACTION", "0.2"))
+
+# Shared page scheduler: SCHEDULER_WORKERS concurrent vision calls across all
+# tasks in this process (0 = a separate pool of VISION_MAX_WORKERS per task).
+# Pages are interleaved by priority weight and fair share per "task" or per
+# "submitter".
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))
+SCHEDULER_FAIR_SHARE = os.getenv("SCHEDULER_FAIR_SHARE", "task")
+SCHEDULER_PRIORITY_WEIGHTS = {
+    -1: float(os.getenv("SCHEDULER_WEIGHT_LOW", "1")),
+    0: float(os.getenv("SCHEDULER_WEIGHT_NORMAL", "4")),
+    1: float(os.getenv("SCHEDULER_WEIGHT_HIGH", "16")),
+}
+
+# Deadlines: SDK timeout per HTTP request, wall-time limit per page call and
+# per transcription run (0 = none). A page running STRAGGLER_FACTOR times the
+# run's median latency is sent again (0 = never), for at most
+# STRAGGLER_MAX_FRACTION of the pages, once STRAGGLER_MIN_SAMPLES have finished.
+VISION_REQUEST_TIMEOUT = float(os.getenv("VISION_REQUEST_TIMEOUT", "90"))
+PAGE_DEADLINE_SECONDS = float(os.getenv("PAGE_DEADLINE_SECONDS", "240"))
+TASK_DEADLINE_SECONDS = float(os.getenv("TASK_DEADLINE_SECONDS", "0"))
+STRAGGLER_FACTOR = float(os.getenv("STRAGGLER_FACTOR", "3"))
+STRAGGLER_MIN_SAMPLES = int(os.getenv("STRAGGLER_MIN_SAMPLES", "5"))
+STRAGGLER_MAX_FRACTION = float(os.getenv("STRAGGLER_MAX_FRACTION", "0.1"))
+
+# Hedged requests (opt-in): a page running past the HEDGE_PERCENTILE latency of
+# the last HEDGE_WINDOW calls is also sent to HEDGE_BACKEND ("same", "other"
+# or a backend name); the first answer wins. Hedges are capped at
+# HEDGE_MAX_EXTRA_PERCENT of calls.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "False").lower() in ("true", "1", "yes")
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_BACKEND = os.getenv("HEDGE_BACKEND", "same")
+HEDGE_MAX_EXTRA_PERCENT = float(os.getenv("HEDGE_MAX_EXTRA_PERCENT", "5"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+
+# API key pools (OPENAI_API_KEYS / GEMINI_API_KEYS): a key answered with
+# 429/401/403 KEY_QUARANTINE_AFTER times in a row is not used for
+# KEY_QUARANTINE_SECONDS.
+KEY_QUARANTINE_AFTER = int(os.getenv("KEY_QUARANTINE_AFTER", "3"))
+KEY_QUARANTINE_SECONDS = float(os.getenv("KEY_QUARANTINE_SECONDS", "60"))
+
+# Circuit breaker per backend/model: opens when BREAKER_ERROR_RATE of at least
+# BREAKER_MIN_CALLS calls in the last BREAKER_WINDOW_SECONDS failed (0 = off),
+# then lets one probe through every BREAKER_OPEN_SECONDS. Refused pages fail
+# (BREAKER_MODE=fail) or wait up to BREAKER_PARK_SECONDS for the breaker (park).
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_MODE = os.getenv("BREAKER_MODE", "park")
+BREAKER_PARK_SECONDS = float(os.getenv("BREAKER_PARK_SECONDS", "240"))
+
+# After a cancel, wait this long for in-flight vision calls before abandoning them
+CANCEL_GRACE_SECONDS = float(os.getenv("CANCEL_GRACE_SECONDS", "5"))
+
+# Split tasks longer than SHARD_SIZE pages (0 = never) into page-range shards.
+# Shards are worked on by SHARD_LOCAL_WORKERS threads in the process that
+# started the task and by any `manage.py shard_worker` processes; a shard whose
+# worker has not reported progress for SHARD_LEASE_SECONDS is handed to another.
+SHARD_SIZE = int(os.getenv("SHARD_SIZE", "0"))
+SHARD_LOCAL_WORKERS = int(os.getenv("SHARD_LOCAL_WORKERS", "2"))
+SHARD_LEASE_SECONDS = int(os.getenv("SHARD_LEASE_SECONDS", "300"))
+SHARD_MAX_ATTEMPTS = int(os.getenv("SHARD_MAX_ATTEMPTS", "3"))
+SHARD_POLL_INTERVAL = float(os.getenv("SHARD_POLL_INTERVAL", "2"))
+
+# Record/replay vision calls: "" (off), "record" or "replay". Replay sleeps
+# for the recorded latency ("original") or not at all ("zero").
+VISION_CASSETTE_MODE = os.getenv("VISION_CASSETTE_MODE", "")
+VISION_CASSETTE_DIR = Path(os.getenv("VISION_CASSETTE_DIR", BASE_DIR / "cassettes"))
+VISION_CASSETTE_LATENCY = os.getenv("VISION_CASSETTE_LATENCY", "original")
+
+# Content search backend (dotted path to a SearchBackend subclass). Empty =
+# SQLite FTS5 on SQLite, otherwise an unindexed scan of plain-text page copies.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "")
+
+# Prometheus /metrics endpoint. METRICS_TOKEN (optional) is required as a
+# Bearer token; METRICS_MULTIPROC_DIR aggregates metrics across worker processes.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in ("true", "1", "yes")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# JSON task API (/api/tasks/). API_TOKEN (optional) is required as a Bearer
+# token, else the endpoints need a CSRF token like forms; API_PATH_ROOTS lists directories whose PDFs may be submitted by
+# server-side path (empty = uploads only).
+API_TOKEN = os.getenv("API_TOKEN", "")
+API_PATH_ROOTS = [p.strip() for p in os.getenv("API_PATH_ROOTS", "").split(",") if p.strip()]
+
+# Completion webhooks: payloads are signed with WEBHOOK_SECRET (HMAC-SHA256)
+# and retried WEBHOOK_MAX_ATTEMPTS times, waiting WEBHOOK_RETRY_BACKOFF
+# seconds (doubling) between attempts. WEBHOOK_ALLOWED_HOSTS restricts targets
+# to those hosts (".example.com" includes subdomains); when empty, any host
+# with only public addresses is allowed.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_ALLOWED_HOSTS = [h.strip() for h in os.getenv("WEBHOOK_ALLOWED_HOSTS", "").split(",") if h.strip()]
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BACKOFF = float(os.getenv("WEBHOOK_RETRY_BACKOFF", "2"))
+
+# Profile this fraction of tasks (0–1) in addition to those requested per task
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+
+# Tasks per page on the history page
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+
 DEFAULT_PROMPT = (
     "Transcribe the information in this document in Markdown format. "
     "Keep the language of the file. "
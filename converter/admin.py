@@ -1,6 +1,37 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html, format_html_join
 
-from .models import ConversionTask
+from .models import ConversionTask, TaskShard
+from .services.page_metrics import summarize_metrics
+from .services.processing import cancel_processing, copy_task, profiling_supported, start_processing
+from .services.search import filter_by_filename
+
+
+class TaskShardInline(admin.TabularInline):
+    model = TaskShard
+    fields = (
+        "index",
+        "start_page",
+        "end_page",
+        "status",
+        "worker",
+        "attempts",
+        "pages_processed",
+        "heartbeat_at",
+        "error_message",
+    )
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("page_results", "failed_pages", "metrics")
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(ConversionTask)
@@ -15,8 +46,10 @@ class ConversionTaskAdmin(admin.ModelAdmin):
         "processing_time_seconds",
         "created_at",
     )
-    list_filter = ("status", "vision_backend", "created_at")
+    list_filter = ("status", "priority", "vision_backend", "created_at")
     search_fields = ("original_filename",)
+    # Skip the unfiltered COUNT(*) on large tables
+    show_full_result_count = False
     readonly_fields = (
         "status",
         "page_count",
@@ -25,6 +58,139 @@ class ConversionTaskAdmin(admin.ModelAdmin):
         "error_message",
         "vision_backend",
         "vision_model",
+        "webhook_status",
+        "metrics_summary",
+        "profile_link",
         "created_at",
         "updated_at",
     )
+    # Shown aggregated via metrics_summary / as a download link instead
+    exclude = ("metrics", "profile_file")
+    actions = ("rerun_with_profiling", "cancel_tasks")
+    # Only present while a sharded task is processing
+    inlines = (TaskShardInline,)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        match = request.resolver_match
+        if match and match.url_name and match.url_name.endswith("_changelist"):
+            # The list never shows the prompt or per-page JSON
+            qs = qs.defer(*ConversionTask.HEAVY_FIELDS)
+        return qs
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<int:pk>/profile/",
+                self.admin_site.admin_view(self.download_profile),
+                name="converter_conversiontask_profile",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def download_profile(self, request, pk):
+        task = get_object_or_404(ConversionTask.objects.only("pk", "profile_file"), pk=pk)
+        if not self.has_view_permission(request, task):
+            raise Http404
+        if not task.profile_file:
+            raise Http404("No profile recorded for this task.")
+        return FileResponse(
+            task.profile_file.open("rb"),
+            as_attachment=True,
+            filename=task.profile_file.name.rsplit("/", 1)[-1],
+            content_type="application/zip",
+        )
+
+    @admin.display(description="Profile")
+    def profile_link(self, obj):
+        if not obj.profile_file:
+            return "Requested (runs with the next conversion)" if obj.profile_requested else "—"
+        return format_html(
+            '<a href="{}">Download profile</a> (cProfile, stack samples, memory)',
+            reverse("admin:converter_conversiontask_profile", args=[obj.pk]),
+        )
+
+    @admin.action(description="Re-run selected tasks with profiling")
+    def rerun_with_profiling(self, request, queryset):
+        """Convert copies of the selected tasks under the profiler; the originals are untouched."""
+        started, sharded = [], []
+        for task in queryset.defer("failed_pages", "page_results", "metrics"):
+            if not task.pdf_file:
+                continue
+            if not profiling_supported(task):
+                sharded.append(task.original_filename)
+                continue
+            # No webhook: the copy was not submitted by the original's API client
+            copy = copy_task(task, profile_requested=True, webhook_url="")
+            start_processing(copy.pk)
+            started.append(copy.pk)
+        if started:
+            self.message_user(
+                request,
+                f"Started {len(started)} profiled conversion(s) as new task(s) "
+                f"{', '.join(map(str, started))}; profiles appear on them when done.",
+                messages.SUCCESS,
+            )
+        if sharded:
+            self.message_user(
+                request,
+                f"Not profiled (sharded tasks cannot be profiled): {', '.join(sharded)}.",
+                messages.WARNING,
+            )
+
+    @admin.action(description="Cancel selected running tasks")
+    def cancel_tasks(self, request, queryset):
+        cancelled = sum(1 for pk in queryset.values_list("pk", flat=True) if cancel_processing(pk))
+        self.message_user(request, f"Cancelled {cancelled} task(s).", messages.SUCCESS)
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return filter_by_filename(queryset, search_term), False
+
+    @admin.display(description="Metrics")
+    def metrics_summary(self, obj):
+        summary = summarize_metrics(obj.metrics)
+        if not summary:
+            return "—"
+        stages = summary["stages"]
+        rows = [
+            ("Pages (failed)", f"{summary['pages']} ({summary['failed']})"),
+            (
+                "Stages",
+                ", ".join(f"{name.removesuffix('_ms')} {ms / 1000:.2f}s" for name, ms in stages.items()),
+            ),
+            ("Render / encode total", f"{summary['render_ms_total']:.0f} ms / {summary['encode_ms_total']:.0f} ms"),
+            (
+                "Image bytes (mean)",
+                f"{summary['image_bytes_total']:,} ({summary['image_bytes_mean']:,})",
+            ),
+            ("Queue wait mean / max", f"{summary['queue_ms_mean']:.0f} ms / {summary['queue_ms_max']:.0f} ms"),
+            (
+                "API latency mean / p50 / p95 / max",
+                f"{summary['api_ms_mean']:.0f} / {summary['api_ms_p50']:.0f} / "
+                f"{summary['api_ms_p95']:.0f} / {summary['api_ms_max']:.0f} ms",
+            ),
+            ("Retries", summary["retries"]),
+            ("Resubmitted pages", summary["resubmitted"]),
+            (
+                "Pages by backend",
+                ", ".join(f"{name}: {count}" for name, count in sorted(summary["backends"].items())) or "—",
+            ),
+            ("Tokens in / out", f"{summary['input_tokens']:,} / {summary['output_tokens']:,}"),
+        ]
+        if summary["scored"]:
+            rows.append(
+                (
+                    "Cascade escalations",
+                    f"{summary['escalated']} of {summary['scored']} "
+                    f"({summary['escalated'] / summary['scored']:.0%})",
+                )
+            )
+        if summary["cropped"]:
+            rows.append(("Pages with cropped margins", summary["cropped"]))
+        return format_html(
+            "<table>{}</table>",
+            format_html_join("", "<tr><th>{}</th><td>{}</td></tr>", rows),
+        )
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ConverterConfig(AppConfig):
     name = "converter"
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects receivers)
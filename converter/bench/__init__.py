@@ -0,0 +1,8 @@
+"""Offline benchmarking for the conversion pipeline.
+
+- ``pdfs``: synthetic PDFs (text-only, scanned-image or mixed pages).
+- ``mock_backend``: a vision backend with configurable latency and errors.
+- ``runner``: runs ``_process_task`` end to end and collects metrics.
+
+Driven by ``python manage.py bench``.
+"""
@@ -0,0 +1,88 @@
+"""A local vision backend with configurable latency and error distributions."""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+class MockAPIError(Exception):
+    """Base class for simulated provider errors."""
+
+
+class MockRateLimitError(MockAPIError):
+    pass
+
+
+class MockServerError(MockAPIError):
+    pass
+
+
+class MockTimeoutError(MockAPIError):
+    pass
+
+
+ERROR_CLASSES = {
+    "ratelimit": MockRateLimitError,
+    "server": MockServerError,
+    "timeout": MockTimeoutError,
+}
+
+
+@dataclass
+class MockBackend:
+    """Callable with the signature of a vision backend page function.
+
+    Latency is log-normally distributed around ``latency_ms`` (``jitter`` is
+    the sigma of the underlying normal), which gives the long right tail real
+    APIs show. A fraction ``error_rate`` of calls raise one of
+    ``ERROR_CLASSES``, picked according to ``error_mix`` weights.
+    """
+
+    latency_ms: float = 200.0
+    jitter: float = 0.3
+    error_rate: float = 0.0
+    error_mix: dict[str, float] = field(default_factory=lambda: {"server": 1.0})
+    seed: int = 0
+    calls: int = 0
+    errors: int = 0
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, base64_image: str, prompt: str, model: str) -> str:
+        with self._lock:
+            self.calls += 1
+            call_no = self.calls
+            delay = self._rng.lognormvariate(0.0, self.jitter) * self.latency_ms / 1000
+            kind = None
+            if self._rng.random() < self.error_rate:
+                kind = self._rng.choices(
+                    list(self.error_mix), weights=list(self.error_mix.values())
+                )[0]
+                self.errors += 1
+
+        time.sleep(delay)
+        if kind is not None:
+            raise ERROR_CLASSES[kind](f"Simulated {kind} error (call {call_no})")
+        return (
+            f"# Page transcription {call_no}\n\n"
+            f"Mock output for a {len(base64_image) * 3 // 4}-byte image.\n\n"
+            "| Item | Amount |\n| --- | --- |\n| Total | 42.00 |\n"
+        )
+
+
+def parse_error_mix(value: str) -> dict[str, float]:
+    """Parse ``"ratelimit:0.5,server:0.3,timeout:0.2"`` into weights."""
+    mix: dict[str, float] = {}
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        name, _, weight = part.partition(":")
+        if name not in ERROR_CLASSES:
+            raise ValueError(
+                f"Unknown error kind {name!r}; expected one of {sorted(ERROR_CLASSES)}"
+            )
+        mix[name] = float(weight or 1)
+    return mix or {"server": 1.0}
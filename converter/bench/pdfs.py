@@ -0,0 +1,76 @@
+"""Synthetic PDF generation for benchmarks."""
+
+from __future__ import annotations
+
+import random
+
+import pymupdf
+
+PAGE_KINDS = ("text", "scanned", "mixed")
+
+_WORDS = (
+    "invoice total amount payment contract clause section article party "
+    "agreement date period annex schedule report summary revenue cost "
+    "balance account statement quarter annual policy notice delivery"
+).split()
+
+
+def generate_pdf(pages: int, kind: str = "text", seed: int = 0) -> bytes:
+    """Return the bytes of a synthetic *pages*-page PDF.
+
+    Args:
+        pages: Number of pages.
+        kind: ``text`` (text layer only), ``scanned`` (each page is a single
+            raster image, no text layer) or ``mixed`` (random mix of both).
+        seed: Seed for reproducible content.
+    """
+    if kind not in PAGE_KINDS:
+        raise ValueError(f"Unknown page kind {kind!r}; expected one of {PAGE_KINDS}")
+    rng = random.Random(seed)
+    doc = pymupdf.open()
+    for n in range(1, pages + 1):
+        page_kind = kind if kind != "mixed" else rng.choice(("text", "scanned"))
+        if page_kind == "text":
+            _add_text_page(doc, n, rng)
+        else:
+            _add_scanned_page(doc, n, rng)
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data
+
+
+def _page_text(n: int, rng: random.Random) -> tuple[str, list[str]]:
+    title = f"Section {n}: {' '.join(rng.sample(_WORDS, 3)).title()}"
+    paragraphs = [
+        " ".join(rng.choice(_WORDS) for _ in range(rng.randint(40, 90))).capitalize() + "."
+        for _ in range(rng.randint(2, 4))
+    ]
+    return title, paragraphs
+
+
+def _add_text_page(doc, n: int, rng: random.Random) -> None:
+    page = doc.new_page(width=595, height=842)  # A4 in points
+    title, paragraphs = _page_text(n, rng)
+    page.insert_text((56, 60), "ACME Corp. — Confidential", fontsize=8)
+    page.insert_text((56, 100), title, fontsize=16)
+    y = 130
+    for para in paragraphs:
+        rect = pymupdf.Rect(56, y, 539, y + 160)
+        page.insert_textbox(rect, para, fontsize=10)
+        y += 170
+    # A small table
+    for row in range(4):
+        cells = [rng.choice(_WORDS), str(rng.randint(1, 9999)), f"{rng.random() * 1000:.2f}"]
+        for col, cell in enumerate(cells):
+            page.insert_text((56 + col * 160, y + row * 16), cell, fontsize=9)
+    page.insert_text((280, 810), f"Page {n}", fontsize=8)
+
+
+def _add_scanned_page(doc, n: int, rng: random.Random) -> None:
+    # Render a text page to a raster and place it as an image, like a scan
+    scratch = pymupdf.open()
+    _add_text_page(scratch, n, rng)
+    pix = scratch[0].get_pixmap(dpi=110, colorspace=pymupdf.csGRAY)
+    scratch.close()
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=pix.tobytes("jpeg", jpg_quality=70))
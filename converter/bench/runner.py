@@ -0,0 +1,241 @@
+"""Run the full ``_process_task`` pipeline against the mock backend and measure it."""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import override_settings
+
+from converter.models import ConversionTask
+from converter.services import processing, vision
+
+from .mock_backend import MockBackend
+from .pdfs import generate_pdf
+
+MOCK_BACKEND_NAME = "mock"
+
+
+@dataclass
+class BenchConfig:
+    pages: int = 20
+    kind: str = "text"
+    repeat: int = 3
+    workers: int = 4
+    latency_ms: float = 200.0
+    jitter: float = 0.3
+    error_rate: float = 0.0
+    error_mix: dict[str, float] = field(default_factory=lambda: {"server": 1.0})
+    seed: int = 0
+
+
+# ── Public API ────────────────────────────────────────────────
+
+
+@contextlib.contextmanager
+def bench_environment():
+    """Run inside a throwaway test database and MEDIA_ROOT."""
+    old_name = connection.settings_dict["NAME"]
+    with tempfile.TemporaryDirectory(prefix="pdf2md-bench-") as media_root:
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def run_benchmark(config: BenchConfig, log=None) -> dict:
+    """Run ``config.repeat`` conversions and return a JSON-serialisable report."""
+    pdf_bytes = generate_pdf(config.pages, kind=config.kind, seed=config.seed)
+    runs = []
+    for n in range(1, config.repeat + 1):
+        backend = MockBackend(
+            latency_ms=config.latency_ms,
+            jitter=config.jitter,
+            error_rate=config.error_rate,
+            error_mix=config.error_mix,
+            seed=config.seed + n,
+        )
+        run = _run_once(pdf_bytes, backend, config)
+        run["run"] = n
+        runs.append(run)
+        if log:
+            log(
+                f"run {n}: {run['pages_per_s']:.2f} pages/s, "
+                f"wall {run['wall_s']:.2f}s, peak RSS {run['peak_rss_mb']:.0f} MB, "
+                f"{run['db_writes']} DB writes"
+            )
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "config": asdict(config),
+        "pdf_bytes": len(pdf_bytes),
+        "runs": runs,
+        "summary": _summarize(runs),
+    }
+
+
+def compare_reports(current: dict, baseline: dict) -> list[str]:
+    """Return human-readable lines comparing two reports' medians."""
+    lines = []
+    for key, better in (
+        ("pages_per_s", "higher"),
+        ("wall_s", "lower"),
+        ("render_s", "lower"),
+        ("transcribe_s", "lower"),
+        ("other_s", "lower"),
+        ("peak_rss_mb", "lower"),
+        ("db_writes", "lower"),
+    ):
+        cur = current["summary"].get(key)
+        base = baseline.get("summary", {}).get(key)
+        if cur is None or not base:
+            continue
+        change = (cur - base) / base * 100
+        lines.append(f"{key:>14}: {base:10.3f} -> {cur:10.3f} ({change:+.1f}%, {better} is better)")
+    return lines
+
+
+# ── Helpers ───────────────────────────────────────────────────
+
+
+def _run_once(pdf_bytes: bytes, backend: MockBackend, config: BenchConfig) -> dict:
+    task = ConversionTask.objects.create(
+        original_filename=f"bench-{config.kind}-{config.pages}p.pdf",
+        pdf_file=ContentFile(pdf_bytes, name="bench.pdf"),
+        prompt=settings.DEFAULT_PROMPT,
+    )
+    stages = {"render_s": 0.0, "transcribe_s": 0.0}
+    queries = {"reads": 0, "writes": 0}
+
+    def count_queries(execute, sql, params, many, context):
+        kind = sql.lstrip()[:6].upper()
+        queries["writes" if kind in ("INSERT", "UPDATE", "DELETE") else "reads"] += 1
+        return execute(sql, params, many, context)
+
+    vision.register_backend(MOCK_BACKEND_NAME, backend)
+    sampler = _RSSSampler()
+    try:
+        with override_settings(
+            VISION_BACKEND=MOCK_BACKEND_NAME, VISION_MAX_WORKERS=config.workers
+        ), _timed(processing, "pdf_to_base64_images", stages, "render_s"), _timed(
+            processing, "transcribe_with_cascade", stages, "transcribe_s"
+        ), connection.execute_wrapper(count_queries):
+            sampler.start()
+            start = time.perf_counter()
+            processing._process_task(task.pk)
+            wall = time.perf_counter() - start
+    finally:
+        sampler.stop()
+        vision.register_backend(MOCK_BACKEND_NAME, None)
+
+    task.refresh_from_db()
+    pages = task.page_count or config.pages
+    return {
+        "status": task.status,
+        "pages": pages,
+        "failed_pages": task.failed_page_count,
+        "wall_s": wall,
+        "pages_per_s": pages / wall if wall else 0.0,
+        "render_s": stages["render_s"],
+        "transcribe_s": stages["transcribe_s"],
+        "other_s": max(wall - stages["render_s"] - stages["transcribe_s"], 0.0),
+        "peak_rss_mb": sampler.peak_mb,
+        "db_writes": queries["writes"],
+        "db_reads": queries["reads"],
+        "backend_calls": backend.calls,
+        "backend_errors": backend.errors,
+    }
+
+
+@contextlib.contextmanager
+def _timed(module, name: str, bucket: dict, key: str):
+    """Temporarily wrap ``module.name`` to add its wall time to ``bucket[key]``."""
+    original = getattr(module, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            bucket[key] += time.perf_counter() - start
+
+    setattr(module, name, wrapper)
+    try:
+        yield
+    finally:
+        setattr(module, name, original)
+
+
+class _RSSSampler:
+    """Track peak resident set size during a run (samples /proc every 20 ms)."""
+
+    interval = 0.02
+
+    def __init__(self):
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="bench-rss")
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._sample()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        self.peak_mb = max(self.peak_mb, _current_rss_mb())
+
+
+def _current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as fh:
+            resident_pages = int(fh.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # No /proc (e.g. macOS): fall back to the process-lifetime peak
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if platform.system() == "Darwin" else maxrss / 1024
+
+
+def _summarize(runs: list[dict]) -> dict:
+    keys = (
+        "wall_s", "pages_per_s", "render_s", "transcribe_s", "other_s",
+        "peak_rss_mb", "db_writes", "db_reads", "failed_pages",
+    )
+    return {key: statistics.median(run[key] for run in runs) for key in keys}
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+            timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
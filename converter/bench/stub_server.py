@@ -0,0 +1,383 @@
+"""A local HTTP server emulating the OpenAI and Gemini endpoints we call.
+
+Speaks just enough of ``POST /v1/chat/completions`` (OpenAI) and
+``POST /v1beta/models/{model}:generateContent`` /
+``:streamGenerateContent`` (Gemini) for the SDKs to accept its responses.
+Point the backends at it with ``OPENAI_BASE_URL=http://host:port/v1`` and
+``GEMINI_BASE_URL=http://host:port``.
+
+Faults are injected per request, in this order: invalid API key (401),
+per-key request budget (429), concurrency limit (429), random 429 with
+``Retry-After``, random 5xx, then latency, then an optional slow (trickled)
+response body. OpenAI responses carry ``x-ratelimit-*-requests`` headers for
+the key's budget. ``GET /stats`` returns counters as JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_MARKDOWN = (
+    "# Stub transcription\n\n"
+    "This page was transcribed by the local stub server.\n\n"
+    "| Item | Amount |\n| --- | --- |\n| Total | 42.00 |\n"
+)
+
+_GEMINI_PATH = re.compile(r"^/v1(?:beta|alpha)?/models/([^/:]+):(generateContent|streamGenerateContent)$")
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 500.0
+    jitter: float = 0.3
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    max_concurrent: int = 0
+    error_rate: float = 0.0
+    error_status: int = 503
+    slow_rate: float = 0.0
+    slow_chunk_delay_ms: float = 200.0
+    response: str = "canned"  # "canned" or "echo"
+    seed: int | None = None
+    # Requests per minute allowed per API key (0 = unlimited)
+    key_rpm: int = 0
+    invalid_keys: tuple[str, ...] = ()
+
+
+class StubStats:
+    """Thread-safe request counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: dict[str, int] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._key_windows: dict[str, tuple[float, int]] = {}
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def take_key_budget(self, api_key: str, rpm: int) -> tuple[int, float]:
+        """Count a request against *api_key*'s per-minute window.
+
+        Returns (requests remaining, seconds until the window resets);
+        remaining is -1 when the budget was already used up.
+        """
+        now = time.monotonic()
+        with self._lock:
+            start, used = self._key_windows.get(api_key, (now, 0))
+            if now - start >= 60:
+                start, used = now, 0
+            reset = 60 - (now - start)
+            if used >= rpm:
+                self._key_windows[api_key] = (start, used)
+                return -1, reset
+            self._key_windows[api_key] = (start, used + 1)
+            return rpm - used - 1, reset
+
+    def enter(self, limit: int) -> bool:
+        """Claim a concurrency slot; False when *limit* (>0) is reached."""
+        with self._lock:
+            if limit and self.in_flight >= limit:
+                return False
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counts": dict(self.counts),
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once; the default backlog of 5 drops them
+    request_queue_size = 256
+
+    def __init__(self, address, config: StubConfig):
+        super().__init__(address, _StubHandler)
+        self.config = config
+        self.stats = StubStats()
+        self.rng = random.Random(config.seed)
+        self.rng_lock = threading.Lock()
+
+    def random(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def latency(self) -> float:
+        with self.rng_lock:
+            factor = self.rng.lognormvariate(0.0, self.config.jitter) if self.config.jitter else 1.0
+        return factor * self.config.latency_ms / 1000
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8100, config: StubConfig | None = None) -> StubServer:
+    """Create a StubServer bound to *host*:*port* (0 picks a free port)."""
+    return StubServer((host, port), config or StubConfig())
+
+
+# ── Request handling ──────────────────────────────────────────
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            self._send_json(HTTPStatus.OK, self.server.stats.snapshot())
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": {"message": "Invalid JSON"}})
+            return
+
+        path = self.path.split("?", 1)[0]
+        if path.rstrip("/").endswith("/chat/completions"):
+            provider, model = "openai", body.get("model", "")
+            stream = bool(body.get("stream"))
+        elif m := _GEMINI_PATH.match(path):
+            provider, model = "gemini", m.group(1)
+            stream = m.group(2) == "streamGenerateContent"
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": {"message": f"Unknown path {path}"}})
+            return
+
+        stats, config = self.server.stats, self.server.config
+        stats.incr(f"{provider}_requests")
+        api_key = self._api_key(provider)
+        if api_key in config.invalid_keys:
+            stats.incr("unauthorized")
+            self._send_error(provider, HTTPStatus.UNAUTHORIZED, "Invalid API key")
+            return
+        rate_headers = {}
+        if config.key_rpm:
+            remaining, reset = stats.take_key_budget(api_key, config.key_rpm)
+            if remaining < 0:
+                stats.incr("rate_limited")
+                self._send_error(provider, HTTPStatus.TOO_MANY_REQUESTS, "Key rate limit exceeded", retry_after=reset)
+                return
+            if provider == "openai":
+                rate_headers = {
+                    "x-ratelimit-limit-requests": str(config.key_rpm),
+                    "x-ratelimit-remaining-requests": str(remaining),
+                    "x-ratelimit-reset-requests": f"{reset:.3f}s",
+                }
+        if not stats.enter(config.max_concurrent):
+            stats.incr("rate_limited")
+            self._send_error(provider, HTTPStatus.TOO_MANY_REQUESTS, "Concurrency limit exceeded")
+            return
+        try:
+            if self.server.random() < config.rate_limit_rate:
+                stats.incr("rate_limited")
+                self._send_error(provider, HTTPStatus.TOO_MANY_REQUESTS, "Rate limit exceeded")
+                return
+            if self.server.random() < config.error_rate:
+                stats.incr("server_errors")
+                self._send_error(provider, config.error_status, "Simulated server error")
+                return
+
+            time.sleep(self.server.latency())
+            text = self._transcription(provider, body)
+            slow = self.server.random() < config.slow_rate
+            if slow:
+                stats.incr("slow_responses")
+            if stream:
+                self._send_stream(provider, model, text, slow)
+            else:
+                payload = _openai_response(model, text) if provider == "openai" else _gemini_response(model, text)
+                self._send_json(HTTPStatus.OK, payload, headers=rate_headers, slow=slow)
+            stats.incr("ok")
+        finally:
+            stats.leave()
+
+    def _api_key(self, provider: str) -> str:
+        if provider == "openai":
+            return self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        return self.headers.get("x-goog-api-key", "")
+
+    def _transcription(self, provider: str, body: dict) -> str:
+        if self.server.config.response != "echo":
+            return CANNED_MARKDOWN
+        prompt, image_chars = _summarize_request(provider, body)
+        return (
+            f"# Echo ({provider})\n\n"
+            f"Prompt: {prompt[:200]}\n\n"
+            f"Image: {image_chars * 3 // 4} bytes\n"
+        )
+
+    # ── Response writers ──
+
+    def _send_error(
+        self, provider: str, status: int, message: str, retry_after: float | None = None
+    ) -> None:
+        status = HTTPStatus(status)
+        if provider == "openai":
+            payload = {"error": {"message": message, "type": "server_error", "code": status.value}}
+        else:
+            payload = {"error": {"code": status.value, "message": message, "status": status.name}}
+        headers = {}
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            if retry_after is None:
+                retry_after = self.server.config.retry_after
+            headers["Retry-After"] = f"{retry_after:.3g}"
+        self._send_json(status, payload, headers=headers)
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None, slow: bool = False) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if slow:
+            self._trickle(data)
+        else:
+            self.wfile.write(data)
+
+    def _send_stream(self, provider: str, model: str, text: str, slow: bool) -> None:
+        """Send *text* as server-sent events, a few words per event."""
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        delay = self.server.config.slow_chunk_delay_ms / 1000 if slow else 0.0
+        words = text.split(" ")
+        for i in range(0, len(words), 8):
+            piece = " ".join(words[i : i + 8]) + (" " if i + 8 < len(words) else "")
+            if provider == "openai":
+                event = _openai_chunk(model, piece)
+            else:
+                event = _gemini_response(model, piece)
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+            if delay:
+                time.sleep(delay)
+        if provider == "openai":
+            self.wfile.write(b"data: [DONE]\n\n")
+
+    def _trickle(self, data: bytes, chunks: int = 8) -> None:
+        delay = self.server.config.slow_chunk_delay_ms / 1000
+        step = max(1, len(data) // chunks)
+        for i in range(0, len(data), step):
+            self.wfile.write(data[i : i + step])
+            self.wfile.flush()
+            time.sleep(delay)
+
+
+# ── Payloads ──────────────────────────────────────────────────
+
+
+def _summarize_request(provider: str, body: dict) -> tuple[str, int]:
+    """Return (prompt text, base64 image length) found in a request body."""
+    texts: list[str] = []
+    image_chars = 0
+    if provider == "openai":
+        for message in body.get("messages", []):
+            content = message.get("content")
+            if isinstance(content, str):
+                texts.append(content)
+                continue
+            for part in content or []:
+                if part.get("type") == "text":
+                    texts.append(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    url = (part.get("image_url") or {}).get("url", "")
+                    image_chars += len(url.partition(",")[2])
+    else:
+        for content in body.get("contents", []):
+            for part in content.get("parts", []):
+                if "text" in part:
+                    texts.append(part["text"])
+                inline = part.get("inlineData") or part.get("inline_data")
+                if inline:
+                    image_chars += len(inline.get("data", ""))
+    return " ".join(t.strip() for t in texts if t), image_chars
+
+
+def _usage(text: str) -> tuple[int, int]:
+    return 800, max(1, len(text) // 4)
+
+
+def _openai_response(model: str, text: str) -> dict:
+    prompt_tokens, completion_tokens = _usage(text)
+    return {
+        "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _openai_chunk(model: str, piece: str) -> dict:
+    return {
+        "id": "chatcmpl-stub-stream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+    }
+
+
+def _gemini_response(model: str, text: str) -> dict:
+    prompt_tokens, completion_tokens = _usage(text)
+    return {
+        "candidates": [
+            {
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }
+        ],
+        "usageMetadata": {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": completion_tokens,
+            "totalTokenCount": prompt_tokens + completion_tokens,
+        },
+        "modelVersion": model,
+    }
+
+
+def describe(config: StubConfig) -> str:
+    """One-line summary of a config for startup logs."""
+    return ", ".join(f"{k}={v}" for k, v in asdict(config).items())
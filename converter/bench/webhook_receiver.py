@@ -0,0 +1,98 @@
+"""A local HTTP server that receives completion webhooks and checks their signatures.
+
+Accepts ``POST`` on any path, verifies ``X-Converter-Signature`` against the
+configured secret and answers 200. With ``fail_first`` set, the first that
+many attempts of each delivery are answered with 500 so the retries can be
+watched. ``GET /deliveries`` returns what was received as JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import Counter
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from converter.services.webhooks import SIGNATURE_HEADER, verify
+
+
+class ReceiverServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, secret: str = "", fail_first: int = 0, on_delivery: Callable[[dict], None] | None = None):
+        super().__init__(address, _ReceiverHandler)
+        self.secret = secret
+        self.fail_first = fail_first
+        self.on_delivery = on_delivery
+        self.deliveries: list[dict] = []
+        self._attempts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, body: bytes, signature: str) -> dict:
+        """Store one received attempt and return its summary (incl. the status to answer)."""
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = {}
+        delivery = payload.get("delivery", "")
+        task = payload.get("task") or {}
+        with self._lock:
+            self._attempts[delivery] += 1
+            attempt = self._attempts[delivery]
+            entry = {
+                "received_at": time.time(),
+                "delivery": delivery,
+                "attempt": attempt,
+                "event": payload.get("event", ""),
+                "task_id": task.get("id"),
+                "task_status": task.get("status"),
+                "signature": self._check(body, signature),
+                "answered": int(HTTPStatus.INTERNAL_SERVER_ERROR if attempt <= self.fail_first else HTTPStatus.OK),
+            }
+            self.deliveries.append(entry)
+        if self.on_delivery:
+            self.on_delivery(entry)
+        return entry
+
+    def _check(self, body: bytes, signature: str) -> str:
+        if not signature:
+            return "unsigned"
+        if not self.secret:
+            return "unchecked"
+        return "valid" if verify(body, signature, self.secret) else "invalid"
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8200, secret: str = "", fail_first: int = 0, on_delivery=None) -> ReceiverServer:
+    """Create a ReceiverServer bound to *host*:*port* (0 picks a free port)."""
+    return ReceiverServer((host, port), secret=secret, fail_first=fail_first, on_delivery=on_delivery)
+
+
+class _ReceiverHandler(BaseHTTPRequestHandler):
+    server: ReceiverServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/deliveries":
+            with self.server._lock:
+                self._send_json(HTTPStatus.OK, {"deliveries": list(self.server.deliveries)})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": "Not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        entry = self.server.record(self.rfile.read(length), self.headers.get(SIGNATURE_HEADER, ""))
+        self._send_json(entry["answered"], {"received": entry["answered"] == HTTPStatus.OK})
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
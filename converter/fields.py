@@ -0,0 +1,77 @@
+"""Custom model fields."""
+
+import json
+
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from .services.compression import compress_json, decompress_json
+
+
+class _CompressedValue:
+    """Raw blob loaded from the database, decompressed on first attribute access."""
+
+    __slots__ = ("blob",)
+
+    def __init__(self, blob):
+        self.blob = blob
+
+
+class _CompressedJSONDescriptor(DeferredAttribute):
+    # A data descriptor (defines __set__), so reads always go through __get__
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if instance is not None and isinstance(value, _CompressedValue):
+            value = decompress_json(value.blob)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+
+class CompressedJSONField(models.BinaryField):
+    """JSON value stored as a compressed blob (see ``services/compression.py``).
+
+    Rows are decompressed lazily: loading a task costs nothing until the
+    attribute is read, and saving an untouched value writes the original
+    blob back without recompressing it.
+    """
+
+    descriptor_class = _CompressedJSONDescriptor
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return _CompressedValue(value)
+
+    def to_python(self, value):
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            return decompress_json(value)
+        return value
+
+    def pre_save(self, model_instance, add):
+        # Read the raw attribute so an untouched blob is not decoded just to be saved
+        return model_instance.__dict__.get(self.attname)
+
+    def get_prep_value(self, value):
+        if isinstance(value, _CompressedValue):
+            return bytes(value.blob)
+        if value is None:
+            return None
+        return compress_json(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return connection.Database.Binary(value)
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj))
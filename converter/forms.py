@@ -1,6 +1,11 @@
+import os
+
 from django import forms
 from django.conf import settings
 
+from .models import ConversionTask
+from .services import webhooks
+
 INPUT_CLASS = (
     "w-full rounded-lg border border-gray-300 px-3 py-2 "
     "text-sm focus:border-indigo-500 focus:ring-indigo-500"
@@ -62,6 +67,33 @@ class UploadForm(forms.Form):
         widget=forms.NumberInput(attrs={"class": NUMBER_CLASS, "id": "id_end_page"}),
     )
 
+    priority = forms.TypedChoiceField(
+        label="Priority",
+        choices=ConversionTask.Priority.choices,
+        coerce=int,
+        initial=ConversionTask.Priority.NORMAL,
+        required=False,
+        empty_value=ConversionTask.Priority.NORMAL,
+        help_text="Share of API capacity while other conversions are running.",
+        widget=forms.Select(
+            attrs={
+                "class": (
+                    "w-32 rounded-lg border border-gray-300 px-3 py-2 "
+                    "text-sm focus:border-indigo-500 focus:ring-indigo-500"
+                )
+            }
+        ),
+    )
+
+    profile = forms.BooleanField(
+        label="Profile this conversion",
+        required=False,
+        help_text="Record a CPU and memory profile (downloadable from the admin).",
+        widget=forms.CheckboxInput(
+            attrs={"class": "rounded border-gray-300 text-indigo-600 focus:ring-indigo-500"}
+        ),
+    )
+
     def clean_pdf_file(self):
         pdf = self.cleaned_data["pdf_file"]
 
@@ -91,6 +123,91 @@ class UploadForm(forms.Form):
         return cleaned
 
 
+def parse_priority(value) -> int:
+    """Accept a priority as its number (-1, 0, 1) or name (low, normal, high)."""
+    by_name = {label.lower(): number for number, label in ConversionTask.Priority.choices}
+    if isinstance(value, str) and value.strip().lower() in by_name:
+        return by_name[value.strip().lower()]
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = None
+    if number not in ConversionTask.Priority.values:
+        raise ValueError("priority must be one of: low, normal, high (or -1, 0, 1).")
+    return number
+
+
+class TaskApiForm(UploadForm):
+    """Task submission through the JSON API: an uploaded PDF or a server-side path.
+
+    Paths must lie under one of ``API_PATH_ROOTS``. Everything but the PDF is
+    optional and defaults like the upload form.
+    """
+
+    pdf_file = forms.FileField(required=False)
+    path = forms.CharField(required=False)
+    prompt = forms.CharField(required=False)
+    start_page = forms.IntegerField(min_value=1, required=False)
+    priority = forms.CharField(required=False)
+    webhook_url = forms.URLField(max_length=500, required=False, assume_scheme="https")
+    # Profiling is requested from the upload page or the admin
+    profile = None
+
+    def clean_pdf_file(self):
+        if not self.cleaned_data.get("pdf_file"):
+            return None
+        return super().clean_pdf_file()
+
+    def clean_path(self):
+        path = self.cleaned_data["path"].strip()
+        if not path:
+            return ""
+        roots = [os.path.realpath(root) for root in settings.API_PATH_ROOTS]
+        if not roots:
+            raise forms.ValidationError("Submitting by path is disabled (API_PATH_ROOTS is not set).")
+        real = os.path.realpath(path)
+        if not any(os.path.commonpath([real, root]) == root for root in roots):
+            raise forms.ValidationError("Path is outside the allowed directories (API_PATH_ROOTS).")
+        if not real.lower().endswith(".pdf"):
+            raise forms.ValidationError("Only PDF files are accepted.")
+        if not os.path.isfile(real):
+            raise forms.ValidationError("File not found.")
+        if os.path.getsize(real) > settings.MAX_PDF_SIZE_MB * 1024 * 1024:
+            raise forms.ValidationError(f"File too large. Max size is {settings.MAX_PDF_SIZE_MB} MB.")
+        return real
+
+    def clean_prompt(self):
+        return self.cleaned_data["prompt"].strip() or settings.DEFAULT_PROMPT
+
+    def clean_start_page(self):
+        return self.cleaned_data["start_page"] or 1
+
+    def clean_priority(self):
+        value = self.cleaned_data["priority"]
+        if value in (None, ""):
+            return ConversionTask.Priority.NORMAL
+        try:
+            return parse_priority(value)
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc)) from exc
+
+    def clean_webhook_url(self):
+        url = self.cleaned_data["webhook_url"]
+        if url:
+            try:
+                webhooks.check_url(url)
+            except ValueError as exc:
+                raise forms.ValidationError(str(exc)) from exc
+        return url
+
+    def clean(self):
+        cleaned = super().clean()
+        if not self.has_error("pdf_file") and not self.has_error("path"):
+            if bool(cleaned.get("pdf_file")) == bool(cleaned.get("path")):
+                raise forms.ValidationError("Send either a PDF file (pdf_file) or a server-side path (path).")
+        return cleaned
+
+
 # ── Settings form ─────────────────────────────────────────────
 
 OPENAI_MODEL_CHOICES = [
@@ -113,6 +230,7 @@ class SettingsForm(forms.Form):
             ("", "Use environment default"),
             ("openai", "OpenAI (GPT)"),
             ("gemini", "Google Gemini"),
+            ("multi", "Split across backends (OpenAI and Gemini)"),
         ],
         required=False,
         widget=forms.Select(attrs={"class": INPUT_CLASS}),
@@ -0,0 +1,108 @@
+"""Management command to benchmark the conversion pipeline offline."""
+
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.bench.mock_backend import parse_error_mix
+from converter.bench.pdfs import PAGE_KINDS
+from converter.bench.runner import (
+    BenchConfig,
+    bench_environment,
+    compare_reports,
+    run_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the full conversion pipeline on a synthetic PDF against a mock vision "
+        "backend and report pages/sec, per-stage time, peak RSS and DB writes. "
+        "Uses a throwaway test database; no API calls are made."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=20, help="Pages per PDF (default: 20).")
+        parser.add_argument(
+            "--kind",
+            choices=PAGE_KINDS,
+            default="text",
+            help="Synthetic page content (default: text).",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Number of runs (default: 3).")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="VISION_MAX_WORKERS for the runs (default: 4).",
+        )
+        parser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=200.0,
+            help="Median mock API latency in ms (default: 200).",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.3,
+            help="Log-normal sigma of the latency (default: 0.3).",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of mock calls that fail (default: 0).",
+        )
+        parser.add_argument(
+            "--error-mix",
+            default="server:1",
+            help="Weights of failure kinds, e.g. 'ratelimit:0.5,server:0.3,timeout:0.2'.",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+        parser.add_argument("--output", help="Write the JSON report to this file.")
+        parser.add_argument("--compare", help="Baseline JSON report to compare against.")
+
+    def handle(self, *args, **options):
+        try:
+            error_mix = parse_error_mix(options["error_mix"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        if options["pages"] < 1 or options["repeat"] < 1 or options["workers"] < 1:
+            raise CommandError("--pages, --repeat and --workers must be at least 1.")
+
+        config = BenchConfig(
+            pages=options["pages"],
+            kind=options["kind"],
+            repeat=options["repeat"],
+            workers=options["workers"],
+            latency_ms=options["latency_ms"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            error_mix=error_mix,
+            seed=options["seed"],
+        )
+        with bench_environment():
+            report = run_benchmark(config, log=self.stdout.write)
+
+        summary = report["summary"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Median: {summary['pages_per_s']:.2f} pages/s, wall {summary['wall_s']:.2f}s "
+                f"(render {summary['render_s']:.2f}s, transcribe {summary['transcribe_s']:.2f}s, "
+                f"other {summary['other_s']:.2f}s), peak RSS {summary['peak_rss_mb']:.0f} MB, "
+                f"{summary['db_writes']:.0f} DB writes"
+            )
+        )
+
+        if options["output"]:
+            path = Path(options["output"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Report written to {path}")
+
+        if options["compare"]:
+            baseline = json.loads(Path(options["compare"]).read_text())
+            for line in compare_reports(report, baseline):
+                self.stdout.write(line)
@@ -46,9 +46,16 @@ class Command(BaseCommand):
                 self.stdout.write(f"  - {task.original_filename} ({task.created_at})")
             return
 
+        # Copies and retries share the original's PDF; keep those still in use
+        kept_pdfs = set(
+            ConversionTask.objects.exclude(pk__in=tasks)
+            .filter(pdf_file__in=tasks.exclude(pdf_file="").values("pdf_file"))
+            .values_list("pdf_file", flat=True)
+        )
+
         # Delete files from disk, then delete the DB records
         for task in tasks:
-            if task.pdf_file:
+            if task.pdf_file and task.pdf_file.name not in kept_pdfs:
                 try:
                     task.pdf_file.delete(save=False)
                 except Exception:
@@ -58,6 +65,11 @@ class Command(BaseCommand):
                     task.markdown_file.delete(save=False)
                 except Exception:
                     pass
+            if task.profile_file:
+                try:
+                    task.profile_file.delete(save=False)
+                except Exception:
+                    pass
 
         tasks.delete()
 
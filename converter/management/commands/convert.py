@@ -0,0 +1,146 @@
+"""Management command to convert many PDFs without the web UI."""
+
+import json
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.models import ConversionTask
+from converter.services.bulk import BulkConverter, collect_items
+
+PRIORITIES = {
+    "low": ConversionTask.Priority.LOW,
+    "normal": ConversionTask.Priority.NORMAL,
+    "high": ConversionTask.Priority.HIGH,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the PDFs in directories, glob patterns or JSONL manifests, several at a time. "
+        "Files already converted (same content, prompt and page range) are skipped, and "
+        "interrupted or partial conversions are resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "sources",
+            nargs="+",
+            help="Directories (searched recursively), glob patterns (quote them), PDF files or .jsonl manifests.",
+        )
+        parser.add_argument(
+            "--output",
+            help="Directory for the .md files, mirroring the source layout (default: next to each PDF).",
+        )
+        parser.add_argument("--prompt", help="Transcription prompt (default: DEFAULT_PROMPT).")
+        parser.add_argument("--prompt-file", help="Read the transcription prompt from this file.")
+        parser.add_argument("--start-page", type=int, default=1, help="First page of each PDF (default: 1).")
+        parser.add_argument("--end-page", type=int, default=0, help="Last page of each PDF (default: 0 = last).")
+        parser.add_argument("--priority", choices=sorted(PRIORITIES), default="normal", help="Scheduling priority.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Documents converted at the same time (default: 4).",
+        )
+        parser.add_argument(
+            "--page-workers",
+            type=int,
+            default=None,
+            help="Vision calls in flight across all documents (default: SCHEDULER_WORKERS).",
+        )
+        parser.add_argument("--force", action="store_true", help="Convert every file again, even if converted before.")
+        parser.add_argument(
+            "--report",
+            help="Write the JSON summary report here (default: convert-report.json in --output or the current directory).",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="List the files that would be converted.")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1.")
+        prompt = options["prompt"]
+        if options["prompt_file"]:
+            prompt = Path(options["prompt_file"]).read_text(encoding="utf-8").strip()
+        try:
+            items = collect_items(
+                options["sources"],
+                output_dir=options["output"],
+                prompt=prompt,
+                start_page=options["start_page"],
+                end_page=options["end_page"],
+                priority=PRIORITIES[options["priority"]],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+        if not items:
+            self.stdout.write(self.style.WARNING("No PDF files found."))
+            return
+        if options["dry_run"]:
+            for item in items:
+                self.stdout.write(f"{item.path} → {item.output}")
+            self.stdout.write(self.style.SUCCESS(f"[DRY RUN] {len(items)} file(s)."))
+            return
+
+        # All documents share one PageScheduler, so this is the process-wide page budget
+        if options["page_workers"] is not None:
+            settings.SCHEDULER_WORKERS = options["page_workers"]
+        elif getattr(settings, "SCHEDULER_WORKERS", 8) <= 0:
+            settings.SCHEDULER_WORKERS = settings.VISION_MAX_WORKERS
+
+        stop = threading.Event()
+        converter = BulkConverter(
+            items,
+            concurrency=options["concurrency"],
+            force=options["force"],
+            stop=stop,
+            log=self.stdout.write,
+        )
+        reports = []
+        done = threading.Event()
+
+        def run():
+            try:
+                reports.append(converter.run())
+            finally:
+                done.set()
+
+        runner = threading.Thread(target=run, daemon=True, name="convert")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Converting {len(items)} file(s), {options['concurrency']} at a time, "
+                f"{settings.SCHEDULER_WORKERS} page worker(s)"
+            )
+        )
+        runner.start()
+        # Wait on an event rather than join(): a join interrupted by Ctrl-C can return early
+        try:
+            while not done.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping: cancelling running conversions (finished pages are kept)...")
+            stop.set()
+            converter.cancel_running()
+            done.wait()
+        if not reports:
+            raise CommandError("Bulk conversion stopped unexpectedly; see the log.")
+        report = reports[0]
+
+        report_path = Path(options["report"] or Path(options["output"] or ".") / "convert-report.json")
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+        self.stdout.write(
+            f"{report['converted']} converted, {report['resumed']} resumed, {report['reused']} reused, "
+            f"{report['skipped']} skipped, {report['failed']} failed, "
+            f"{report['interrupted'] + report['not_started']} interrupted in {report['wall_seconds']:.1f}s "
+            f"({report['pages']} page(s), {report['pages_per_second']:.2f} pages/s, "
+            f"{report['failed_pages']} failed page(s))"
+        )
+        self.stdout.write(f"Report written to {report_path}")
+        if stop.is_set():
+            raise CommandError("Interrupted; run the same command again to resume.", returncode=1)
+        if report["failed"] or report["failed_pages"]:
+            raise CommandError(f"{len(report['failures'])} file(s) had failures; see {report_path}.", returncode=1)
@@ -0,0 +1,38 @@
+"""Management command to (re)build the full-text index of transcribed pages."""
+
+from django.core.management.base import BaseCommand
+
+from converter.models import ConversionTask
+from converter.services.search import get_search_backend, invalidate_fts_tables, searchable_pages
+
+
+class Command(BaseCommand):
+    help = "Index the per-page Markdown of existing tasks for full-text search."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "task_ids",
+            nargs="*",
+            type=int,
+            help="Only reindex these ConversionTask primary keys (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        # The index table may have been dropped or recreated since it was last looked up
+        invalidate_fts_tables()
+        backend = get_search_backend()
+        tasks = ConversionTask.objects.only("id", "page_results", "failed_pages")
+        if options["task_ids"]:
+            tasks = tasks.filter(pk__in=options["task_ids"])
+
+        n_tasks = n_pages = 0
+        for task in tasks.iterator(chunk_size=100):
+            pages = searchable_pages(task)
+            backend.delete_task(task.pk)
+            backend.index_pages(task.pk, pages)
+            n_tasks += 1
+            n_pages += len(pages)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {n_pages} page(s) from {n_tasks} task(s).")
+        )
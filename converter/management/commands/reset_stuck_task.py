@@ -60,6 +60,8 @@ class Command(BaseCommand):
             task.status = ConversionTask.Status.FAILED
             task.error_message = STUCK_MESSAGE
             task.save(update_fields=["status", "error_message"])
+            # Shard workers drop results for shards that no longer exist
+            task.shards.all().delete()
             self.stdout.write(
                 self.style.SUCCESS(
                     f"Reset task {task.pk} ({task.original_filename}) → failed. You can retry from history."
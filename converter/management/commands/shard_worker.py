@@ -0,0 +1,77 @@
+"""Management command to process shards of large conversion tasks."""
+
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.services.sharding import default_worker_name, run_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Claim and process page-range shards of large conversion tasks (see SHARD_SIZE). "
+        "Run on any host that shares the database and MEDIA_ROOT with the web app."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=1,
+            help="Shards to process concurrently in this process (default: 1).",
+        )
+        parser.add_argument(
+            "--task",
+            type=int,
+            default=None,
+            help="Only process shards of this task.",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no shard is waiting instead of polling for new ones.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help="Seconds between polls when idle (default: SHARD_POLL_INTERVAL).",
+        )
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1:
+            raise CommandError("--threads must be at least 1.")
+
+        stop = threading.Event()
+        counts = []
+
+        def work():
+            counts.append(
+                run_worker(
+                    default_worker_name(),
+                    task_id=options["task"],
+                    stop_when_idle=options["burst"],
+                    poll_interval=options["poll_interval"],
+                    stop_event=stop,
+                )
+            )
+
+        threads = [
+            threading.Thread(target=work, daemon=True, name=f"shard-worker-{n}")
+            for n in range(options["threads"])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(
+            self.style.SUCCESS(f"Shard worker started with {len(threads)} thread(s)")
+        )
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the current shard(s)...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+        self.stdout.write(self.style.SUCCESS(f"Processed {sum(counts)} shard(s)."))
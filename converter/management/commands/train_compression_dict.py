@@ -0,0 +1,64 @@
+"""Management command to train a compression dictionary from stored page results."""
+
+import random
+
+from django.core.management.base import BaseCommand
+
+from converter.models import ConversionTask
+from converter.services.compression import (
+    ZLIB_DICT_MAX,
+    save_dictionary,
+    train_dictionary,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Train a preset dictionary on transcribed pages. New page results are "
+        "compressed with it; keep old dictionary files so older rows stay readable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=2000,
+            help="Maximum number of pages to sample (default: 2000).",
+        )
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=ZLIB_DICT_MAX,
+            help=f"Dictionary size in bytes (default: {ZLIB_DICT_MAX}).",
+        )
+        parser.add_argument(
+            "--recompress",
+            action="store_true",
+            help="Rewrite existing page results with the new dictionary.",
+        )
+
+    def handle(self, *args, **options):
+        pages: list[str] = []
+        tasks = ConversionTask.objects.only("id", "page_results").order_by("-created_at")
+        for task in tasks.iterator(chunk_size=100):
+            pages.extend(p for p in task.page_results or [] if p)
+            if len(pages) >= options["samples"] * 5:
+                break
+        if not pages:
+            self.stdout.write(self.style.WARNING("No page results to train on."))
+            return
+
+        sample = random.sample(pages, min(len(pages), options["samples"]))
+        path = save_dictionary(train_dictionary(sample, size=options["size"]))
+        self.stdout.write(
+            self.style.SUCCESS(f"Trained dictionary on {len(sample)} page(s): {path}")
+        )
+
+        if options["recompress"]:
+            count = 0
+            for task in ConversionTask.objects.only("id", "page_results").iterator(chunk_size=100):
+                # Reading decodes the blob; saving compresses it with the new dictionary
+                task.page_results = list(task.page_results or [])
+                task.save(update_fields=["page_results"])
+                count += 1
+            self.stdout.write(self.style.SUCCESS(f"Recompressed {count} task(s)."))
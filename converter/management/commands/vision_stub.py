@@ -0,0 +1,126 @@
+"""Management command to run the local OpenAI/Gemini stub server."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.bench.stub_server import StubConfig, describe, make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a local stand-in for the OpenAI chat-completions and Gemini "
+        "generateContent APIs with configurable latency, 429s, 5xx errors and "
+        "slow responses. Point the app at it with OPENAI_BASE_URL=http://HOST:PORT/v1 "
+        "or GEMINI_BASE_URL=http://HOST:PORT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1).")
+        parser.add_argument("--port", type=int, default=8100, help="Port (default: 8100).")
+        parser.add_argument(
+            "--latency-ms",
+            type=float,
+            default=500.0,
+            help="Median response latency in ms (default: 500).",
+        )
+        parser.add_argument(
+            "--jitter",
+            type=float,
+            default=0.3,
+            help="Log-normal sigma of the latency; 0 = constant (default: 0.3).",
+        )
+        parser.add_argument(
+            "--rate-limit-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests answered with 429 (default: 0).",
+        )
+        parser.add_argument(
+            "--retry-after",
+            type=float,
+            default=1.0,
+            help="Retry-After seconds sent with 429 responses (default: 1).",
+        )
+        parser.add_argument(
+            "--max-concurrent",
+            type=int,
+            default=0,
+            help="Answer 429 when more requests than this are in flight; 0 = no limit.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of requests answered with a 5xx error (default: 0).",
+        )
+        parser.add_argument(
+            "--error-status",
+            type=int,
+            default=503,
+            choices=(500, 502, 503, 504),
+            help="Status code for injected errors (default: 503).",
+        )
+        parser.add_argument(
+            "--slow-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of successful responses whose body is trickled out slowly.",
+        )
+        parser.add_argument(
+            "--slow-chunk-delay-ms",
+            type=float,
+            default=200.0,
+            help="Pause between chunks of a slow response in ms (default: 200).",
+        )
+        parser.add_argument(
+            "--response",
+            choices=("canned", "echo"),
+            default="canned",
+            help="Return fixed Markdown or echo the prompt and image size (default: canned).",
+        )
+        parser.add_argument(
+            "--key-rpm",
+            type=int,
+            default=0,
+            help="Requests per minute allowed per API key, then 429; 0 = no limit.",
+        )
+        parser.add_argument(
+            "--invalid-key",
+            action="append",
+            default=[],
+            help="API key to reject with 401 (repeatable).",
+        )
+        parser.add_argument("--seed", type=int, default=None, help="Random seed.")
+
+    def handle(self, *args, **options):
+        for name in ("rate_limit_rate", "error_rate", "slow_rate"):
+            if not 0 <= options[name] <= 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be between 0 and 1.")
+
+        config = StubConfig(
+            latency_ms=options["latency_ms"],
+            jitter=options["jitter"],
+            rate_limit_rate=options["rate_limit_rate"],
+            retry_after=options["retry_after"],
+            max_concurrent=options["max_concurrent"],
+            error_rate=options["error_rate"],
+            error_status=options["error_status"],
+            slow_rate=options["slow_rate"],
+            slow_chunk_delay_ms=options["slow_chunk_delay_ms"],
+            response=options["response"],
+            seed=options["seed"],
+            key_rpm=options["key_rpm"],
+            invalid_keys=tuple(options["invalid_key"]),
+        )
+        server = make_server(options["host"], options["port"], config)
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f"Vision stub listening on http://{host}:{port}"))
+        self.stdout.write(f"  OPENAI_BASE_URL=http://{host}:{port}/v1")
+        self.stdout.write(f"  GEMINI_BASE_URL=http://{host}:{port}")
+        self.stdout.write(f"  {describe(config)}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Stats: {server.stats.snapshot()}")
@@ -0,0 +1,57 @@
+"""Management command to run a local receiver for completion webhooks."""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from converter.bench.webhook_receiver import make_server
+
+
+class Command(BaseCommand):
+    help = (
+        "Receive completion webhooks locally and print each delivery with the result of its "
+        "signature check. Submit tasks with webhook_url=http://HOST:PORT/ to try it; the app "
+        "must list HOST in WEBHOOK_ALLOWED_HOSTS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: 127.0.0.1).")
+        parser.add_argument("--port", type=int, default=8200, help="Port (default: 8200).")
+        parser.add_argument(
+            "--secret",
+            default=None,
+            help="Secret to verify signatures with (default: WEBHOOK_SECRET).",
+        )
+        parser.add_argument(
+            "--fail-first",
+            type=int,
+            default=0,
+            help="Answer the first N attempts of each delivery with 500, to exercise retries (default: 0).",
+        )
+
+    def handle(self, *args, **options):
+        if options["fail_first"] < 0:
+            raise CommandError("--fail-first must be 0 or more.")
+        secret = settings.WEBHOOK_SECRET if options["secret"] is None else options["secret"]
+
+        def show(entry):
+            style = self.style.SUCCESS if entry["answered"] == 200 else self.style.WARNING
+            self.stdout.write(
+                style(
+                    f"{entry['event'] or '?'} task={entry['task_id']} status={entry['task_status']} "
+                    f"delivery={entry['delivery'][:12]} attempt={entry['attempt']} "
+                    f"signature={entry['signature']} → {entry['answered']}"
+                )
+            )
+
+        server = make_server(options["host"], options["port"], secret, options["fail_first"], on_delivery=show)
+        host, port = server.server_address[:2]
+        self.stdout.write(self.style.SUCCESS(f"Webhook receiver listening on http://{host}:{port}/"))
+        if not secret:
+            self.stdout.write("  No secret: signatures are not checked.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{len(server.deliveries)} attempt(s) received.")
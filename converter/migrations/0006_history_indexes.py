@@ -0,0 +1,96 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+FILENAME_FTS_TABLE = "converter_filename_fts"
+
+
+def backfill_failed_page_count(apps, schema_editor):
+    ConversionTask = apps.get_model("converter", "ConversionTask")
+    batch = []
+    for task in ConversionTask.objects.only("id", "failed_pages").iterator():
+        count = len(task.failed_pages or [])
+        if count:
+            task.failed_page_count = count
+            batch.append(task)
+        if len(batch) >= 500:
+            ConversionTask.objects.bulk_update(batch, ["failed_page_count"])
+            batch = []
+    if batch:
+        ConversionTask.objects.bulk_update(batch, ["failed_page_count"])
+
+
+def create_filename_search_index(apps, schema_editor):
+    """Trigram index for substring filename search (SQLite FTS5 or PostgreSQL pg_trgm)."""
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "sqlite":
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FILENAME_FTS_TABLE} "
+                    "USING fts5(original_filename, tokenize='trigram')"
+                )
+            except Exception:
+                # SQLite < 3.34 or built without FTS5: search falls back to LIKE
+                return
+            cursor.execute(
+                f"INSERT INTO {FILENAME_FTS_TABLE}(rowid, original_filename) "
+                "SELECT id, original_filename FROM converter_conversiontask"
+            )
+        elif vendor == "postgresql":
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            # Matches the UPPER(...) LIKE UPPER(...) that __icontains generates
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS convtask_filename_trgm_idx "
+                "ON converter_conversiontask "
+                'USING gin (UPPER("original_filename"::text) gin_trgm_ops)'
+            )
+
+
+def drop_filename_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == "sqlite":
+            cursor.execute(f"DROP TABLE IF EXISTS {FILENAME_FTS_TABLE}")
+        elif vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS convtask_filename_trgm_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0005_add_app_settings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversiontask",
+            name="failed_page_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="len(failed_pages), kept so list views can defer the JSON.",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conversiontask",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="convtask_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conversiontask",
+            index=models.Index(fields=["status"], name="convtask_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="conversiontask",
+            index=models.Index(
+                fields=["original_filename"], name="convtask_filename_idx"
+            ),
+        ),
+        migrations.RunPython(
+            backfill_failed_page_count, migrations.RunPython.noop
+        ),
+        migrations.RunPython(
+            create_filename_search_index, drop_filename_search_index
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations
+
+PAGE_FTS_TABLE = "converter_page_fts"
+
+
+def create_page_search_index(apps, schema_editor):
+    """FTS5 table over per-page Markdown (SQLite only; other databases use another backend).
+
+    rowid encodes (task_id << 20 | page). Populate existing tasks with
+    ``python manage.py rebuild_search_index``.
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {PAGE_FTS_TABLE} "
+                "USING fts5(body, tokenize='unicode61 remove_diacritics 2')"
+            )
+        except Exception:
+            # SQLite built without FTS5: content search is unavailable
+            return
+
+
+def drop_page_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {PAGE_FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0006_history_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_page_search_index, drop_page_search_index),
+    ]
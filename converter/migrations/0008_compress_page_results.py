@@ -0,0 +1,65 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations
+
+import converter.fields
+
+
+def copy_to_compressed(apps, schema_editor):
+    ConversionTask = apps.get_model("converter", "ConversionTask")
+    batch = []
+    for task in ConversionTask.objects.only("id", "page_results").iterator(chunk_size=200):
+        task.page_results_data = task.page_results or []
+        batch.append(task)
+        if len(batch) >= 200:
+            ConversionTask.objects.bulk_update(batch, ["page_results_data"])
+            batch = []
+    if batch:
+        ConversionTask.objects.bulk_update(batch, ["page_results_data"])
+
+
+def copy_from_compressed(apps, schema_editor):
+    ConversionTask = apps.get_model("converter", "ConversionTask")
+    batch = []
+    for task in ConversionTask.objects.only("id", "page_results_data").iterator(chunk_size=200):
+        task.page_results = task.page_results_data or []
+        batch.append(task)
+        if len(batch) >= 200:
+            ConversionTask.objects.bulk_update(batch, ["page_results"])
+            batch = []
+    if batch:
+        ConversionTask.objects.bulk_update(batch, ["page_results"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0007_page_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversiontask",
+            name="page_results_data",
+            field=converter.fields.CompressedJSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(copy_to_compressed, copy_from_compressed),
+        migrations.RemoveField(
+            model_name="conversiontask",
+            name="page_results",
+        ),
+        migrations.RenameField(
+            model_name="conversiontask",
+            old_name="page_results_data",
+            new_name="page_results",
+        ),
+        migrations.AlterField(
+            model_name="conversiontask",
+            name="page_results",
+            field=converter.fields.CompressedJSONField(
+                blank=True,
+                default=list,
+                help_text="Per-page Markdown strings (one per page, same order). Used to retry only failed pages. Stored compressed.",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0008_compress_page_results"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversiontask",
+            name="metrics",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Per-page timings, image sizes, retries and token usage (see services/page_metrics.py).",
+            ),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0009_conversiontask_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversiontask",
+            name="profile_requested",
+            field=models.BooleanField(
+                default=False,
+                help_text="Run the next conversion of this task under the profiler.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="conversiontask",
+            name="profile_file",
+            field=models.FileField(
+                blank=True,
+                help_text="Zip of cProfile stats, stack samples and a tracemalloc summary.",
+                null=True,
+                upload_to="profiles/",
+            ),
+        ),
+    ]
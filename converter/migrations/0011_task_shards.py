@@ -0,0 +1,87 @@
+# Generated by Django 6.0.2
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import converter.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0010_conversiontask_profiling"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveIntegerField()),
+                (
+                    "start_page",
+                    models.PositiveIntegerField(help_text="First document page (1-based)."),
+                ),
+                (
+                    "end_page",
+                    models.PositiveIntegerField(
+                        help_text="Last document page (1-based, inclusive)."
+                    ),
+                ),
+                ("first_index", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("claimed", "Claimed"),
+                            ("done", "Done"),
+                            ("merged", "Merged"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                    ),
+                ),
+                ("worker", models.CharField(blank=True, default="", max_length=100)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("claimed_at", models.DateTimeField(blank=True, null=True)),
+                ("heartbeat_at", models.DateTimeField(blank=True, null=True)),
+                ("pages_processed", models.PositiveIntegerField(default=0)),
+                ("error_message", models.TextField(blank=True, default="")),
+                (
+                    "page_results",
+                    converter.fields.CompressedJSONField(blank=True, default=list),
+                ),
+                ("failed_pages", models.JSONField(blank=True, default=list)),
+                ("metrics", models.JSONField(blank=True, default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shards",
+                        to="converter.conversiontask",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["task_id", "index"],
+                "indexes": [
+                    models.Index(fields=["status", "heartbeat_at"], name="taskshard_claim_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("task", "index"), name="taskshard_task_index_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0011_task_shards"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversiontask",
+            name="priority",
+            field=models.SmallIntegerField(
+                choices=[(-1, "Low"), (0, "Normal"), (1, "High")],
+                default=0,
+                help_text="Share of vision API capacity relative to other running tasks.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="conversiontask",
+            name="submitter",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Who uploaded the task (username or client address); used for fair sharing.",
+                max_length=150,
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0012_conversiontask_priority"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="conversiontask",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("processing", "Processing"),
+                    ("success", "Success"),
+                    ("partial_success", "Partially OK"),
+                    ("failed", "Failed"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="pending",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0013_conversiontask_cancelled"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="appsettings",
+            name="vision_backend",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Override VISION_BACKEND: 'openai', 'gemini', 'multi', or empty for env default.",
+                max_length=20,
+            ),
+        ),
+    ]
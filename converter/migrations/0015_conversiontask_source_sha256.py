@@ -0,0 +1,27 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0014_appsettings_multi_backend"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversiontask",
+            name="source_sha256",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="SHA-256 of the PDF; bulk conversion skips files already converted.",
+                max_length=64,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="conversiontask",
+            index=models.Index(fields=["source_sha256"], name="convtask_sha256_idx"),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("converter", "0015_conversiontask_source_sha256"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="conversiontask",
+            name="webhook_url",
+            field=models.URLField(
+                blank=True,
+                default="",
+                help_text="Called with the task's JSON when a run finishes (see services/webhooks.py).",
+                max_length=500,
+            ),
+        ),
+        migrations.AddField(
+            model_name="conversiontask",
+            name="webhook_status",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Outcome of the last completion webhook delivery.",
+                max_length=200,
+            ),
+        ),
+    ]
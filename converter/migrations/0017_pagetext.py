@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Plain-text page copies for the unindexed search backend.
+
+    Existing tasks are added by ``python manage.py rebuild_search_index``.
+    """
+
+    dependencies = [
+        ("converter", "0016_conversiontask_webhook"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageText",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("page", models.PositiveIntegerField(help_text="1-based position in the task's page range.")),
+                ("body", models.TextField()),
+                (
+                    "task",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="page_texts",
+                        to="converter.conversiontask",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["task_id", "page"],
+                "constraints": [
+                    models.UniqueConstraint(fields=("task", "page"), name="pagetext_task_page_uniq"),
+                ],
+            },
+        ),
+    ]
@@ -1,5 +1,13 @@
+import threading
+from typing import NamedTuple
+
+from django.core.cache import cache
 from django.db import models
 
+from .fields import CompressedJSONField
+from .services.multi_backend import MULTI_BACKEND
+from .services.telemetry import record_cache
+
 
 # Singleton primary key for app-level settings
 APP_SETTINGS_ID = 1
@@ -15,7 +23,7 @@ class AppSettings(models.Model):
         max_length=20,
         blank=True,
         default="",
-        help_text="Override VISION_BACKEND: 'openai', 'gemini', or empty for env default.",
+        help_text="Override VISION_BACKEND: 'openai', 'gemini', 'multi', or empty for env default.",
     )
     openai_model = models.CharField(
         max_length=100,
@@ -38,14 +46,84 @@ class AppSettings(models.Model):
         return "App settings"
 
 
-def get_effective_vision_config():
-    """Return (backend, openai_model, gemini_model) from DB overrides or Django settings."""
+class VisionConfig(NamedTuple):
+    """Resolved vision backend and model IDs (unpacks like the old 3-tuple)."""
+
+    backend: str
+    openai_model: str
+    gemini_model: str
+
+    @property
+    def model(self) -> str:
+        """Model ID for the selected backend (the backend name for custom backends)."""
+        if self.backend == "openai":
+            return self.openai_model
+        if self.backend == "gemini":
+            return self.gemini_model
+        if self.backend == MULTI_BACKEND:
+            return f"{self.openai_model} + {self.gemini_model}"
+        return self.backend
+
+    @classmethod
+    def for_task(cls, backend: str, model: str) -> "VisionConfig":
+        """Rebuild the config a task recorded in ``vision_backend`` / ``vision_model``."""
+        if backend == MULTI_BACKEND:
+            openai_model, _, gemini_model = model.partition(" + ")
+            return cls(backend, openai_model, gemini_model)
+        return cls(backend, model, model)
+
+
+# In-process cache of the resolved config. AppSettings saves bump a version
+# stamp in Django's cache (see converter.signals), so other processes sharing
+# that cache drop their copy too.
+_VISION_CONFIG_VERSION_KEY = "converter:vision-config-version"
+_vision_config_lock = threading.Lock()
+_vision_config_cache: dict = {"config": None, "version": None}
+
+
+def get_effective_vision_config() -> VisionConfig:
+    """Return (backend, openai_model, gemini_model) from DB overrides or Django settings.
+
+    The result is cached in-process until ``invalidate_vision_config()`` runs.
+    """
+    version = cache.get(_VISION_CONFIG_VERSION_KEY, 0)
+    with _vision_config_lock:
+        if (
+            _vision_config_cache["config"] is not None
+            and _vision_config_cache["version"] == version
+        ):
+            record_cache("vision_config", 1, 0)
+            return _vision_config_cache["config"]
+    record_cache("vision_config", 0, 1)
+
+    config, cacheable = _resolve_vision_config()
+    if cacheable:
+        with _vision_config_lock:
+            _vision_config_cache["config"] = config
+            _vision_config_cache["version"] = version
+    return config
+
+
+def invalidate_vision_config() -> None:
+    """Drop cached vision configs in this process and (via the shared cache) in others."""
+    with _vision_config_lock:
+        _vision_config_cache["config"] = None
+    try:
+        cache.incr(_VISION_CONFIG_VERSION_KEY)
+    except ValueError:
+        cache.set(_VISION_CONFIG_VERSION_KEY, 1, timeout=None)
+
+
+def _resolve_vision_config() -> tuple[VisionConfig, bool]:
+    """Read the config from the DB/settings; the flag is False if the DB read failed."""
     from django.conf import settings as django_settings
 
     try:
         app = AppSettings.objects.filter(pk=APP_SETTINGS_ID).first()
+        cacheable = True
     except Exception:
         app = None
+        cacheable = False
 
     if app and app.vision_backend.strip():
         backend = app.vision_backend.strip().lower()
@@ -55,12 +133,12 @@ def get_effective_vision_config():
         gemini_model = (app.gemini_model or "").strip() or getattr(
             django_settings, "GEMINI_VISION_MODEL", "gemini-2.0-flash"
         )
-        return (backend, openai_model, gemini_model)
+        return VisionConfig(backend, openai_model, gemini_model), cacheable
 
     backend = getattr(django_settings, "VISION_BACKEND", "openai").lower()
     openai_model = getattr(django_settings, "OPENAI_VISION_MODEL", "gpt-4o-mini")
     gemini_model = getattr(django_settings, "GEMINI_VISION_MODEL", "gemini-2.0-flash")
-    return (backend, openai_model, gemini_model)
+    return VisionConfig(backend, openai_model, gemini_model), cacheable
 
 
 class ConversionTask(models.Model):
@@ -72,6 +150,12 @@ class ConversionTask(models.Model):
         SUCCESS = "success", "Success"
         PARTIAL_SUCCESS = "partial_success", "Partially OK"
         FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
+
+    class Priority(models.IntegerChoices):
+        LOW = -1, "Low"
+        NORMAL = 0, "Normal"
+        HIGH = 1, "High"
 
     # ── Input ─────────────────────────────────────────────────
     original_filename = models.CharField(max_length=255)
@@ -87,6 +171,35 @@ class ConversionTask(models.Model):
         default=0,
         help_text="Last page to process (0 = last page of the document).",
     )
+    priority = models.SmallIntegerField(
+        choices=Priority.choices,
+        default=Priority.NORMAL,
+        help_text="Share of vision API capacity relative to other running tasks.",
+    )
+    submitter = models.CharField(
+        max_length=150,
+        blank=True,
+        default="",
+        help_text="Who uploaded the task (username or client address); used for fair sharing.",
+    )
+    source_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        help_text="SHA-256 of the PDF; bulk conversion skips files already converted.",
+    )
+    webhook_url = models.URLField(
+        max_length=500,
+        blank=True,
+        default="",
+        help_text="Called with the task's JSON when a run finishes (see services/webhooks.py).",
+    )
+    webhook_status = models.CharField(
+        max_length=200,
+        blank=True,
+        default="",
+        help_text="Outcome of the last completion webhook delivery.",
+    )
 
     # ── Output ────────────────────────────────────────────────
     markdown_file = models.FileField(
@@ -116,10 +229,32 @@ class ConversionTask(models.Model):
         blank=True,
         help_text="List of {page: int, error: str} for pages that failed transcription.",
     )
-    page_results = models.JSONField(
+    failed_page_count = models.PositiveIntegerField(
+        default=0,
+        help_text="len(failed_pages), kept so list views can defer the JSON.",
+    )
+    page_results = CompressedJSONField(
         default=list,
         blank=True,
-        help_text="Per-page Markdown strings (one per page, same order). Used to retry only failed pages.",
+        help_text="Per-page Markdown strings (one per page, same order). Used to retry only failed pages. Stored compressed.",
+    )
+
+    metrics = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Per-page timings, image sizes, retries and token usage (see services/page_metrics.py).",
+    )
+
+    # ── Profiling ─────────────────────────────────────────────
+    profile_requested = models.BooleanField(
+        default=False,
+        help_text="Run the next conversion of this task under the profiler.",
+    )
+    profile_file = models.FileField(
+        upload_to="profiles/",
+        blank=True,
+        null=True,
+        help_text="Zip of cProfile stats, stack samples and a tracemalloc summary.",
     )
 
     # ── Metadata ──────────────────────────────────────────────
@@ -130,12 +265,33 @@ class ConversionTask(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Large per-task fields that list views should not load
+    HEAVY_FIELDS = ("prompt", "failed_pages", "page_results", "metrics")
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination of the history page: (created_at, id) descending
+            models.Index(fields=["-created_at", "-id"], name="convtask_created_id_idx"),
+            models.Index(fields=["status"], name="convtask_status_idx"),
+            models.Index(fields=["original_filename"], name="convtask_filename_idx"),
+            models.Index(fields=["source_sha256"], name="convtask_sha256_idx"),
+        ]
 
     def __str__(self):
         return f"{self.original_filename} ({self.status})"
 
+    def set_failed_pages(self, failed_pages: list[dict]) -> None:
+        """Set failed_pages and keep failed_page_count in sync."""
+        self.failed_pages = failed_pages
+        self.failed_page_count = len(failed_pages)
+
+    def _failed_count(self) -> int:
+        # Avoid a per-row query when failed_pages was deferred (history/admin lists)
+        if "failed_pages" in self.get_deferred_fields():
+            return self.failed_page_count
+        return len(getattr(self, "failed_pages", None) or [])
+
     @property
     def markdown_filename(self) -> str:
         """Safe .md filename derived from original PDF name (max 200 chars before extension)."""
@@ -146,9 +302,9 @@ class ConversionTask(models.Model):
         """Status for display: treat 'success' with all pages failed as 'failed', etc."""
         if self.status != self.Status.SUCCESS:
             return self.status
-        failed = getattr(self, "failed_pages", None) or []
+        failed = self._failed_count()
         total = self.page_count or 0
-        if total and len(failed) >= total:
+        if total and failed >= total:
             return self.Status.FAILED
         if failed:
             return self.Status.PARTIAL_SUCCESS
@@ -161,8 +317,81 @@ class ConversionTask(models.Model):
             return self.error_message or ""
         if self.error_message:
             return self.error_message
-        failed = getattr(self, "failed_pages", None) or []
+        failed = self._failed_count()
         total = self.page_count or 0
-        if total and len(failed) >= total:
+        if total and failed >= total:
             return "All pages failed transcription."
         return ""
+
+
+class TaskShard(models.Model):
+    """A contiguous page range of a sharded ConversionTask, claimed by one worker at a time.
+
+    ``first_index`` is the 0-based position of ``start_page`` within the
+    task's page range, so shard results slot straight into the task's
+    ``page_results``/``failed_pages`` numbering.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        CLAIMED = "claimed", "Claimed"
+        DONE = "done", "Done"
+        MERGED = "merged", "Merged"
+
+    task = models.ForeignKey(ConversionTask, on_delete=models.CASCADE, related_name="shards")
+    index = models.PositiveIntegerField()
+    start_page = models.PositiveIntegerField(help_text="First document page (1-based).")
+    end_page = models.PositiveIntegerField(help_text="Last document page (1-based, inclusive).")
+    first_index = models.PositiveIntegerField()
+
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    pages_processed = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True, default="")
+
+    page_results = CompressedJSONField(default=list, blank=True)
+    failed_pages = models.JSONField(default=list, blank=True)
+    metrics = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["task_id", "index"]
+        constraints = [
+            models.UniqueConstraint(fields=["task", "index"], name="taskshard_task_index_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "heartbeat_at"], name="taskshard_claim_idx"),
+        ]
+
+    def __str__(self):
+        return f"Task {self.task_id} shard {self.index} (pages {self.start_page}–{self.end_page})"
+
+    @property
+    def page_total(self) -> int:
+        return self.end_page - self.start_page + 1
+
+
+class PageText(models.Model):
+    """Plain-text copy of one transcribed page, for ``PageResultsScanBackend``.
+
+    ``page_results`` is stored compressed, so the unindexed search backend
+    matches against these rows in the database instead. Only that backend
+    writes them.
+    """
+
+    task = models.ForeignKey(ConversionTask, on_delete=models.CASCADE, related_name="page_texts")
+    page = models.PositiveIntegerField(help_text="1-based position in the task's page range.")
+    body = models.TextField()
+
+    class Meta:
+        ordering = ["task_id", "page"]
+        constraints = [
+            models.UniqueConstraint(fields=["task", "page"], name="pagetext_task_page_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Task {self.task_id} page {self.page}"
@@ -0,0 +1,381 @@
+"""Convert many PDFs from the command line (``manage.py convert``).
+
+Sources are directories (searched recursively for ``*.pdf``), glob patterns,
+single PDF files or JSONL manifests with one ``{"path": ...}`` object per
+line (optional keys: ``output``, ``prompt``, ``start_page``, ``end_page``,
+``priority``). Every file becomes a ``ConversionTask`` run by the normal
+pipeline, so all documents share this process's ``PageScheduler`` slots,
+API key pools and circuit breakers.
+
+Files are identified by the SHA-256 of their content (``source_sha256``):
+
+- a file whose latest task with the same prompt and page range succeeded is
+  skipped (or its Markdown is written again if the output file is missing);
+- a partial, failed or cancelled task is resumed: only its failed pages are
+  transcribed again;
+- a task this command left ``pending``/``processing`` is run again once its
+  run is gone (the process was killed: no progress for
+  ``SHARD_LEASE_SECONDS``); while another ``convert`` process is still on it,
+  its outcome is awaited instead.
+
+Unfinished tasks submitted some other way (web, API) are left alone.
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.db.models import Q
+
+from converter.models import ConversionTask
+
+from . import processing
+from .compression import read_output_file
+from .downloads import file_digest
+from .page_metrics import summarize_metrics
+
+logger = logging.getLogger(__name__)
+
+SUBMITTER = "manage.py convert"
+
+_GLOB_CHARS = set("*?[")
+_RUNNING = (ConversionTask.Status.PENDING, ConversionTask.Status.PROCESSING)
+
+
+class BulkItem(NamedTuple):
+    """One PDF to convert and where its Markdown goes."""
+
+    path: Path
+    output: Path
+    prompt: str
+    start_page: int = 1
+    end_page: int = 0
+    priority: int = ConversionTask.Priority.NORMAL
+
+
+# ── Sources ───────────────────────────────────────────────────
+
+
+def collect_items(
+    sources: list[str],
+    output_dir: Optional[str] = None,
+    prompt: Optional[str] = None,
+    start_page: int = 1,
+    end_page: int = 0,
+    priority: int = ConversionTask.Priority.NORMAL,
+) -> list[BulkItem]:
+    """Expand *sources* into one ``BulkItem`` per distinct PDF, in a stable order.
+
+    Outputs go next to each PDF (``name.md``), or under *output_dir* keeping
+    the path relative to the directory or glob root the PDF was found in.
+    Raises ValueError for a missing source or an invalid manifest line.
+    """
+    defaults = {
+        "prompt": prompt or settings.DEFAULT_PROMPT,
+        "start_page": start_page,
+        "end_page": end_page,
+        "priority": priority,
+    }
+    out = Path(output_dir) if output_dir else None
+    items: dict[Path, BulkItem] = {}
+    for source in sources:
+        if source.endswith(".jsonl"):
+            found = _manifest_items(Path(source), out, defaults)
+        elif _GLOB_CHARS & set(source):
+            root = Path(_glob_root(source))
+            paths = sorted(Path(p) for p in glob.glob(source, recursive=True) if p.lower().endswith(".pdf"))
+            found = [_item(p, root, out, defaults) for p in paths]
+        elif os.path.isdir(source):
+            root = Path(source)
+            paths = sorted(p for p in root.rglob("*") if p.suffix.lower() == ".pdf" and p.is_file())
+            found = [_item(p, root, out, defaults) for p in paths]
+        elif os.path.isfile(source):
+            found = [_item(Path(source), None, out, defaults)]
+        else:
+            raise ValueError(f"No such file or directory: {source}")
+        for item in found:
+            items.setdefault(item.path.resolve(), item)
+    return list(items.values())
+
+
+def _manifest_items(manifest: Path, out: Optional[Path], defaults: dict) -> list[BulkItem]:
+    if not manifest.is_file():
+        raise ValueError(f"No such manifest: {manifest}")
+    base = manifest.parent
+    items = []
+    with manifest.open(encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                path = base / entry["path"]
+            except (ValueError, KeyError, TypeError) as exc:
+                raise ValueError(f"{manifest}:{lineno}: expected a JSON object with a 'path' ({exc})") from exc
+            if not path.is_file():
+                raise ValueError(f"{manifest}:{lineno}: no such file: {path}")
+            options = {**defaults, **{k: entry[k] for k in defaults if entry.get(k) not in (None, "")}}
+            item = _item(path, base, out, options)
+            if entry.get("output"):
+                item = item._replace(output=base / entry["output"])
+            items.append(item)
+    return items
+
+
+def _item(path: Path, root: Optional[Path], out: Optional[Path], options: dict) -> BulkItem:
+    if out is None:
+        output = path.with_suffix(".md")
+    else:
+        relative = path.relative_to(root) if root is not None else Path(path.name)
+        output = out / relative.with_suffix(".md")
+    return BulkItem(
+        path=path,
+        output=output,
+        prompt=options["prompt"],
+        start_page=int(options["start_page"]),
+        end_page=int(options["end_page"]),
+        priority=int(options["priority"]),
+    )
+
+
+def _glob_root(pattern: str) -> str:
+    """The directory part of *pattern* before its first wildcard."""
+    parts = []
+    for part in Path(pattern).parts:
+        if _GLOB_CHARS & set(part):
+            break
+        parts.append(part)
+    return os.path.join(*parts) if parts else "."
+
+
+# ── Conversion ────────────────────────────────────────────────
+
+
+class BulkConverter:
+    """Convert ``BulkItem``s with up to *concurrency* documents in flight.
+
+    ``run()`` returns the summary report. Setting *stop* (e.g. on Ctrl-C)
+    starts no further files and cancels the running tasks, keeping their
+    finished pages for the next run.
+    """
+
+    def __init__(
+        self,
+        items: list[BulkItem],
+        concurrency: int = 4,
+        force: bool = False,
+        stop: Optional[threading.Event] = None,
+        log: Optional[Callable[[str], None]] = None,
+    ):
+        self.items = items
+        self.concurrency = max(1, concurrency)
+        self.force = force
+        self.stop = stop or threading.Event()
+        self.log = log or logger.info
+        self._lock = threading.Lock()
+        self._running: set[int] = set()
+        self._hashes: dict[str, threading.Lock] = {}
+        self._converted: set[tuple] = set()
+        self._done = 0
+
+    def run(self) -> dict:
+        started_at = datetime.now(timezone.utc)
+        origin = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="convert") as pool:
+            results = list(pool.map(self._convert_safely, self.items))
+        return _report(results, started_at, time.perf_counter() - origin)
+
+    def cancel_running(self) -> None:
+        """Cancel the tasks currently being converted (their finished pages are kept)."""
+        with self._lock:
+            running = list(self._running)
+        for task_id in running:
+            processing.cancel_processing(task_id)
+
+    def _convert_safely(self, item: BulkItem) -> dict:
+        result = {"path": str(item.path), "output": str(item.output), "task": None, "pages": 0, "seconds": 0.0}
+        started = time.perf_counter()
+        try:
+            if self.stop.is_set():
+                result["result"] = "not_started"
+                return result
+            self._convert(item, result)
+        except Exception as exc:
+            logger.exception("Bulk conversion of %s failed", item.path)
+            result.update(result="failed", error=str(exc))
+        finally:
+            result["seconds"] = round(time.perf_counter() - started, 2)
+            if result["result"] != "not_started":
+                with self._lock:
+                    self._done += 1
+                    done = self._done
+                self.log(_progress_line(done, len(self.items), result))
+        return result
+
+    def _convert(self, item: BulkItem, result: dict) -> None:
+        sha = file_digest(str(item.path))
+        result["sha256"] = sha
+        # Copies of one file are converted once; the others then reuse the result
+        with self._lock:
+            same_content = self._hashes.setdefault(sha, threading.Lock())
+        with same_content:
+            self._convert_content(item, sha, result)
+
+    def _convert_content(self, item: BulkItem, sha: str, result: dict) -> None:
+        key = (sha, item.prompt, item.start_page, item.end_page)
+        task = None if self.force and key not in self._converted else _previous_task(item, sha)
+        if task is not None and task.status in _RUNNING and not processing.claim_abandoned_run(task):
+            # Another convert process is still on it: use its outcome
+            result["task"] = task.pk
+            task = self._wait(task)
+            if task.status in _RUNNING:
+                result["result"] = "interrupted"
+                return
+        retry = False
+        pending_pages = None
+        if task is not None:
+            result["task"] = task.pk
+            if task.effective_status == ConversionTask.Status.SUCCESS:
+                if item.output.exists():
+                    result.update(result="skipped", status=task.status)
+                    return
+                _write_output(task, item.output)
+                result.update(result="reused", status=task.status)
+                return
+            page_results = getattr(task, "page_results", None) or []
+            retry = bool(page_results and task.failed_pages and len(page_results) == (task.page_count or 0))
+            if retry:
+                pending_pages = len(task.failed_pages)
+            else:
+                task.status = ConversionTask.Status.PENDING
+                task.error_message = ""
+                task.save(update_fields=["status", "error_message"])
+            result["result"] = "resumed"
+        else:
+            task = processing.create_task_from_path(
+                str(item.path),
+                prompt=item.prompt,
+                start_page=item.start_page,
+                end_page=item.end_page,
+                priority=item.priority,
+                submitter=SUBMITTER,
+            )
+            result.update(task=task.pk, result="converted")
+
+        with self._lock:
+            if self.stop.is_set():
+                result["result"] = "interrupted"
+                return
+            self._running.add(task.pk)
+        try:
+            processing.run_task(task.pk, retry_failed_only=retry)
+            task = self._wait(task)
+        finally:
+            with self._lock:
+                self._running.discard(task.pk)
+
+        result["status"] = task.effective_status
+        # Pages transcribed by this run
+        if pending_pages is None:
+            pending_pages = task.page_count or 0
+        result["pages"] = max(0, pending_pages - len(task.failed_pages or []))
+        summary = summarize_metrics(task.metrics)
+        result["input_tokens"] = summary.get("input_tokens", 0)
+        result["output_tokens"] = summary.get("output_tokens", 0)
+        if task.failed_pages:
+            result["failed_pages"] = [fp["page"] for fp in task.failed_pages]
+        if task.status == ConversionTask.Status.CANCELLED:
+            result.update(result="interrupted", error=task.error_message)
+        elif task.effective_status == ConversionTask.Status.FAILED:
+            result.update(result="failed", error=task.effective_error_message)
+        elif task.markdown_file:
+            _write_output(task, item.output)
+            self._converted.add(key)
+
+    def _wait(self, task: ConversionTask) -> ConversionTask:
+        """Reload *task*, waiting while shard workers elsewhere are still on it."""
+        interval = getattr(settings, "SHARD_POLL_INTERVAL", 2)
+        while True:
+            task.refresh_from_db()
+            if task.status not in _RUNNING or self.stop.is_set():
+                return task
+            time.sleep(interval)
+
+
+def _previous_task(item: BulkItem, sha: str) -> Optional[ConversionTask]:
+    """The latest task for the same content, prompt and page range, if any.
+
+    Other submitters' tasks count only once they succeeded; the rest are theirs to retry.
+    """
+    task = (
+        ConversionTask.objects.filter(
+            Q(submitter=SUBMITTER) | Q(status=ConversionTask.Status.SUCCESS),
+            source_sha256=sha,
+            prompt=item.prompt,
+            start_page=item.start_page,
+            end_page=item.end_page,
+        )
+        .order_by("-created_at", "-id")
+        .first()
+    )
+    if task is not None and task.submitter != SUBMITTER and task.effective_status != ConversionTask.Status.SUCCESS:
+        # Another submitter's partial success is theirs to retry
+        return None
+    return task
+
+
+def _write_output(task: ConversionTask, output: Path) -> None:
+    """Write the task's Markdown to *output* atomically."""
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_name(output.name + ".part")
+    partial.write_text(read_output_file(task.markdown_file), encoding="utf-8")
+    os.replace(partial, output)
+
+
+# ── Report ────────────────────────────────────────────────────
+
+
+def _progress_line(done: int, total: int, result: dict) -> str:
+    line = f"[{done}/{total}] {result['result']}: {result['path']}"
+    if result["result"] in ("converted", "resumed"):
+        line += f" ({result['pages']} page(s), {result['seconds']:.1f}s)"
+    if result.get("error"):
+        line += f" — {result['error']}"
+    return line
+
+
+def _report(results: list[dict], started_at: datetime, wall_seconds: float) -> dict:
+    counts = {
+        name: sum(1 for r in results if r["result"] == name)
+        for name in ("converted", "resumed", "reused", "skipped", "failed", "interrupted", "not_started")
+    }
+    pages = sum(r["pages"] for r in results)
+    transcribed = counts["converted"] + counts["resumed"]
+    return {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "wall_seconds": round(wall_seconds, 2),
+        "files": len(results),
+        **counts,
+        "pages": pages,
+        "failed_pages": sum(len(r.get("failed_pages", [])) for r in results),
+        "pages_per_second": round(pages / wall_seconds, 2) if wall_seconds else 0.0,
+        "files_per_minute": round(transcribed * 60 / wall_seconds, 2) if wall_seconds else 0.0,
+        "input_tokens": sum(r.get("input_tokens", 0) for r in results),
+        "output_tokens": sum(r.get("output_tokens", 0) for r in results),
+        "failures": [
+            {key: r[key] for key in ("path", "task", "error", "failed_pages") if r.get(key) is not None}
+            for r in results
+            if r["result"] in ("failed", "interrupted") or r.get("failed_pages")
+        ],
+        "items": results,
+    }
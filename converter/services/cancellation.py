@@ -0,0 +1,62 @@
+"""Cancellation signals for running conversions.
+
+Cancelling a task sets its status to ``cancelled`` in the database (see
+``processing.cancel_processing()``). Code running the task in the same
+process is told at once through a ``threading.Event`` from ``cancel_scope()``;
+runs in other processes notice when their next progress update matches no
+``processing`` row and set their own event. The pipeline passes the event to
+``transcribe_images_to_markdown()``, which drops queued pages and abandons
+in-flight calls after ``CANCEL_GRACE_SECONDS``.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+
+from .scheduler import get_scheduler
+
+CANCELLED_PAGE_ERROR = "Cancelled before this page was transcribed."
+
+_lock = threading.Lock()
+# task_id -> events of the runs of that task in this process
+_events: dict[int, set[threading.Event]] = {}
+
+
+@contextlib.contextmanager
+def cancel_scope(task_id: int):
+    """Yield a cancel event for one run of *task_id*; ``signal_cancel()`` sets it.
+
+    Each run gets its own event, so a run started after a cancel is not
+    born cancelled while an older run of the task is still winding down.
+    """
+    event = threading.Event()
+    with _lock:
+        _events.setdefault(task_id, set()).add(event)
+    try:
+        yield event
+    finally:
+        with _lock:
+            events = _events.get(task_id)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del _events[task_id]
+
+
+def cancelled_message(failed: int = 0, total: int = 0) -> str:
+    """Error message for a cancelled task with *failed* of *total* pages not transcribed."""
+    if not total:
+        return "Cancelled."
+    return f"Cancelled after {max(total - failed, 0)} of {total} page(s) were transcribed."
+
+
+def signal_cancel(task_id: int) -> None:
+    """Stop this process's work on *task_id*: set its runs' events and drop its queued pages."""
+    with _lock:
+        events = list(_events.get(task_id, ()))
+    for event in events:
+        event.set()
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        scheduler.cancel(f"task:{task_id}")
@@ -0,0 +1,252 @@
+"""Model cascade: a cheap model for every page, the configured model for hard ones.
+
+With ``OPENAI_CASCADE_MODEL`` / ``GEMINI_CASCADE_MODEL`` set, pages are first
+transcribed with that (fast, cheap) model. Each result is scored locally
+against the page's PyMuPDF text layer and rendered image:
+
+- empty output, or a refusal ("I'm sorry, I can't ...") instead of a
+  transcription, scores 0;
+- with a text layer, the score is the fraction of its distinct words that
+  appear in the output, or the output's share of its letters if lower;
+- without one (scanned pages), output much shorter than the page's ink
+  coverage suggests lowers the score;
+- a Markdown table whose rows disagree on the number of columns, or that
+  lacks its header separator, scores 0.5.
+
+Pages scoring below ``CASCADE_MIN_SCORE``, and pages whose first-pass call
+failed, are transcribed again with the task's configured model; if that call
+fails the cheap result (or the failure) is kept.
+Per-page metrics record ``score``, ``escalated`` and the ``model`` used.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import time
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+from converter.models import VisionConfig
+from converter.services import telemetry
+from converter.services.multi_backend import MULTI_BACKEND
+from converter.services.vision import transcribe_images_to_markdown
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"[^\W\d_]{4,}")
+_REFUSAL = re.compile(
+    r"\b(?:I'?m sorry|I am sorry|I (?:can(?:no|')t|am unable to|'m unable to|'m not able to)"
+    r" (?:help|assist|transcribe|process|read)|as an AI)\b",
+    re.IGNORECASE,
+)
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$")
+
+# Refusals are short; a long transcription that quotes one is not a refusal
+_REFUSAL_MAX_CHARS = 600
+# Text layers with fewer distinct words than this are not compared
+_MIN_LAYER_WORDS = 15
+# Output characters expected per percent of a page's pixels that are ink,
+# about an eighth of a dense text page so figures and photos pass
+_MIN_CHARS_PER_INK_PERCENT = 40
+_MIN_INK = 0.02
+
+
+class PageScore(NamedTuple):
+    """Heuristic quality of a page transcription (0–1) and why it lost points."""
+
+    score: float
+    reasons: tuple[str, ...] = ()
+
+
+def first_pass_config(config: VisionConfig) -> Optional[VisionConfig]:
+    """The config for the cheap first pass, or None if *config* has no cascade."""
+    openai_model = getattr(settings, "OPENAI_CASCADE_MODEL", "") or config.openai_model
+    gemini_model = getattr(settings, "GEMINI_CASCADE_MODEL", "") or config.gemini_model
+    if config.backend not in ("openai", "gemini", MULTI_BACKEND):
+        return None
+    first = config._replace(openai_model=openai_model, gemini_model=gemini_model)
+    return first if first.model != config.model else None
+
+
+def cascade_enabled(config: VisionConfig) -> bool:
+    return first_pass_config(config) is not None
+
+
+def score_page(markdown: str, text_layer: dict | None = None) -> PageScore:
+    """Score *markdown* for one page; *text_layer* is ``{"text": ..., "ink": ...}``."""
+    text = (markdown or "").strip()
+    if not text:
+        return PageScore(0.0, ("empty",))
+    if len(text) <= _REFUSAL_MAX_CHARS and _REFUSAL.search(text):
+        return PageScore(0.0, ("refusal",))
+
+    scores = {}
+    layer_text = (text_layer or {}).get("text") or ""
+    layer_words = {w.lower() for w in _WORD.findall(layer_text)}
+    if len(layer_words) >= _MIN_LAYER_WORDS:
+        output_words = {w.lower() for w in _WORD.findall(text)}
+        recall = len(layer_words & output_words) / len(layer_words)
+        volume = _letters(text) / max(1, _letters(layer_text))
+        scores["low_coverage"] = min(recall, volume, 1.0)
+    else:
+        ink = (text_layer or {}).get("ink") or 0.0
+        expected = ink * 100 * _MIN_CHARS_PER_INK_PERCENT
+        if ink >= _MIN_INK and len(text) < expected:
+            scores["little_text"] = len(text) / expected
+    if _has_broken_table(text):
+        scores["broken_table"] = 0.5
+
+    if not scores:
+        return PageScore(1.0)
+    score = min(scores.values())
+    threshold = getattr(settings, "CASCADE_MIN_SCORE", 0.7)
+    return PageScore(round(score, 3), tuple(name for name, value in scores.items() if value < threshold))
+
+
+def transcribe_with_cascade(
+    base64_images: list[str],
+    prompt: str,
+    text_layers: list[dict] | None,
+    config: VisionConfig,
+    page_metrics: Optional[dict[int, dict]] = None,
+    on_page_result=None,
+    **kwargs,
+) -> tuple[str | None, list[str]]:
+    """``transcribe_images_to_markdown()`` with the cheap-model cascade, if configured.
+
+    *text_layers* holds one ``{"text", "ink"}`` dict per image (see
+    ``pdf_to_base64_images``). Other arguments are passed through; the
+    escalation pass reports no progress (its pages were already counted).
+    """
+    first = first_pass_config(config)
+    if first is None:
+        return transcribe_images_to_markdown(
+            base64_images,
+            prompt,
+            config=config,
+            page_metrics=page_metrics,
+            on_page_result=on_page_result,
+            **kwargs,
+        )
+
+    metrics: dict[int, dict] = {}
+    first_started = time.perf_counter()
+    full_markdown, results = transcribe_images_to_markdown(
+        base64_images,
+        prompt,
+        config=first,
+        page_metrics=metrics,
+        on_page_result=on_page_result,
+        **kwargs,
+    )
+    indices = kwargs.get("indices_to_process")
+    indices = sorted(set(indices)) if indices is not None else list(range(len(base64_images)))
+    failed_pages = kwargs.get("failed_pages")
+    failed = {fp["page"] - 1 for fp in failed_pages or []}
+
+    scores: dict[int, PageScore] = {}
+    for pos, idx in enumerate(indices):
+        if pos >= len(results):
+            continue
+        if idx in failed:
+            # The cheap model could not do it; the configured one may
+            scores[idx] = PageScore(0.0, ("failed",))
+        else:
+            layer = text_layers[idx] if text_layers and idx < len(text_layers) else None
+            scores[idx] = score_page(results[pos], layer)
+        if idx in metrics:
+            metrics[idx].update(score=scores[idx].score, escalated=False)
+    threshold = getattr(settings, "CASCADE_MIN_SCORE", 0.7)
+    hard = [idx for idx, s in scores.items() if s.score < threshold]
+    for idx, s in scores.items():
+        telemetry.CASCADE_PAGES.inc(backend=config.backend, result="escalated" if idx in hard else "accepted")
+        for reason in s.reasons if idx in hard else ():
+            telemetry.CASCADE_ESCALATIONS.inc(backend=config.backend, reason=reason)
+
+    cancel_event = kwargs.get("cancel_event")
+    if hard and not (cancel_event is not None and cancel_event.is_set()):
+        logger.info(
+            "Cascade: escalating %d of %d page(s) from %s to %s",
+            len(hard),
+            len(scores),
+            first.model,
+            config.model,
+        )
+        escalated_metrics: dict[int, dict] = {}
+        escalation_failed: list[dict] = []
+        escalation_started = time.perf_counter()
+        _, escalated = transcribe_images_to_markdown(
+            base64_images,
+            prompt,
+            indices_to_process=hard,
+            config=config,
+            page_metrics=escalated_metrics,
+            failed_pages=escalation_failed,
+            on_page_result=on_page_result,
+            flow=kwargs.get("flow"),
+            cancel_event=cancel_event,
+        )
+        still_cheap = {fp["page"] - 1 for fp in escalation_failed}
+        recovered: set[int] = set()
+        position = {idx: pos for pos, idx in enumerate(indices)}
+        for pos, idx in enumerate(hard):
+            if idx in metrics:
+                metrics[idx]["escalated"] = True
+            if idx in still_cheap or pos >= len(escalated):
+                if idx in failed:
+                    logger.warning("Cascade: page %d failed with %s too", idx + 1, config.model)
+                else:
+                    logger.warning("Cascade: page %d kept the %s result", idx + 1, first.model)
+                continue
+            results[position[idx]] = escalated[pos]
+            recovered.add(idx)
+            if idx in metrics:
+                metrics[idx] = _merge_call_metrics(
+                    metrics[idx], escalated_metrics.get(idx), (escalation_started - first_started) * 1000
+                )
+        if failed_pages and recovered & failed:
+            # The caller's list: pages the escalation transcribed are no longer failed
+            failed_pages[:] = [fp for fp in failed_pages if fp["page"] - 1 not in recovered]
+        if full_markdown is not None:
+            full_markdown = "\n\n".join(r for r in results if r is not None)
+
+    if page_metrics is not None:
+        page_metrics.update(metrics)
+    return full_markdown, results
+
+
+def _merge_call_metrics(first: dict, second: dict | None, offset_ms: float) -> dict:
+    """Metrics of an escalated page: the second call's timing, both calls' tokens."""
+    if not second:
+        return first
+    merged = dict(second, start_ms=second["start_ms"] + offset_ms)
+    for key in ("input_tokens", "output_tokens"):
+        if first.get(key) is not None or second.get(key) is not None:
+            merged[key] = (first.get(key) or 0) + (second.get(key) or 0)
+    merged["retries"] = (first.get("retries") or 0) + (second.get("retries") or 0)
+    merged["attempts"] = (first.get("attempts") or 1) + (second.get("attempts") or 1)
+    merged["score"] = first.get("score")
+    merged["escalated"] = True
+    return merged
+
+
+def _letters(text: str) -> int:
+    return sum(1 for ch in text if ch.isalnum())
+
+
+def _has_broken_table(markdown: str) -> bool:
+    """True if a pipe table has rows of different widths or no header separator."""
+    table: list[str] = []
+    for line in markdown.splitlines() + [""]:
+        stripped = line.strip()
+        if stripped.startswith("|"):
+            table.append(stripped)
+            continue
+        if len(table) >= 2:
+            widths = {row.strip("|").count("|") + 1 for row in table}
+            if len(widths) > 1 or not _TABLE_SEPARATOR.match(table[1]):
+                return True
+        table = []
+    return False
@@ -0,0 +1,160 @@
+"""Record and replay vision API calls ("cassettes").
+
+With ``VISION_CASSETTE_MODE=record`` every page transcription is passed
+through to the real backend and the outcome (Markdown or error) is stored
+with its wall time under ``VISION_CASSETTE_DIR``, one JSON file per request
+fingerprint. With ``VISION_CASSETTE_MODE=replay`` the backend is never
+called: the stored outcome is returned after sleeping for the recorded
+latency (``VISION_CASSETTE_LATENCY=original``) or immediately (``zero``).
+
+The fingerprint is a SHA-256 over backend, model, prompt and image, so a
+replay only matches when the render layer produces byte-identical images.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MODES = ("record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """Replay mode found no recording for a request."""
+
+
+class ReplayedAPIError(RuntimeError):
+    """A recorded backend error, raised again on replay."""
+
+    def __init__(self, error_type: str, message: str):
+        super().__init__(message)
+        self.error_type = error_type
+
+
+# ── Public API ────────────────────────────────────────────────
+
+
+def cassette_mode() -> str:
+    """Return ``"record"``, ``"replay"`` or ``""`` (off)."""
+    mode = (getattr(settings, "VISION_CASSETTE_MODE", "") or "").lower()
+    if mode and mode not in MODES:
+        raise ValueError(f"Unknown VISION_CASSETTE_MODE: {mode!r}")
+    return mode
+
+
+def request_fingerprint(backend: str, model: str, prompt: str, base64_image: str) -> str:
+    """Stable hash identifying one page request."""
+    h = hashlib.sha256()
+    for part in (backend, model, prompt):
+        h.update(part.encode())
+        h.update(b"\x00")
+    h.update(hashlib.sha256(base64_image.encode()).digest())
+    return h.hexdigest()
+
+
+def wrap_transcribe_fn(transcribe_fn: Callable, backend: str, mode: str) -> Callable:
+    """Return *transcribe_fn* wrapped to record to, or replay from, the cassette store."""
+    store = CassetteStore(Path(settings.VISION_CASSETTE_DIR))
+
+    if mode == "record":
+
+        def recording(base64_image: str, prompt: str, model: str):
+            key = request_fingerprint(backend, model, prompt, base64_image)
+            start = time.perf_counter()
+            try:
+                result = transcribe_fn(base64_image, prompt, model)
+            except Exception as exc:
+                store.save(key, backend, model, time.perf_counter() - start, error=exc)
+                raise
+            store.save(key, backend, model, time.perf_counter() - start, result=result)
+            return result
+
+        return recording
+
+    zero_latency = getattr(settings, "VISION_CASSETTE_LATENCY", "original") == "zero"
+
+    def replaying(base64_image: str, prompt: str, model: str):
+        key = request_fingerprint(backend, model, prompt, base64_image)
+        entry = store.load(key)
+        if entry is None:
+            raise CassetteMissError(f"No cassette recording for request {key[:12]} ({backend}/{model})")
+        if not zero_latency:
+            time.sleep(entry.get("elapsed_s", 0.0))
+        if "error" in entry:
+            raise ReplayedAPIError(entry["error"]["type"], entry["error"]["message"])
+        from converter.services.vision import PageTranscription
+
+        return PageTranscription(
+            entry["text"],
+            input_tokens=entry.get("input_tokens"),
+            output_tokens=entry.get("output_tokens"),
+            retries=entry.get("retries", 0),
+        )
+
+    return replaying
+
+
+# ── Storage ───────────────────────────────────────────────────
+
+
+class CassetteStore:
+    """One JSON file per fingerprint, sharded by its first two hex digits."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def load(self, key: str) -> dict | None:
+        try:
+            return json.loads(self.path(key).read_text())
+        except FileNotFoundError:
+            return None
+
+    def save(
+        self,
+        key: str,
+        backend: str,
+        model: str,
+        elapsed_s: float,
+        result=None,
+        error: Exception | None = None,
+    ) -> None:
+        """Store a backend outcome: *result* (str or PageTranscription) or *error*."""
+        entry = {
+            "fingerprint": key,
+            "backend": backend,
+            "model": model,
+            "elapsed_s": round(elapsed_s, 4),
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if error is not None:
+            entry["error"] = {"type": type(error).__name__, "message": str(error) or type(error).__name__}
+        elif isinstance(result, str):
+            entry["text"] = result
+        else:
+            entry.update(result._asdict())
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so concurrent replays never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as fh:
+                json.dump(entry, fh)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        logger.debug("Recorded cassette %s (%s/%s, %.2fs)", key[:12], backend, model, elapsed_s)
@@ -0,0 +1,219 @@
+"""Circuit breakers per backend/model, so a provider outage fails fast.
+
+Every vision call goes through ``guard(backend, model)``. A breaker is
+*closed* while calls mostly succeed. When at least ``BREAKER_MIN_CALLS``
+calls were made in the last ``BREAKER_WINDOW_SECONDS`` and
+``BREAKER_ERROR_RATE`` of them failed with a server-side error (5xx, 429,
+timeouts, connection errors, or any error of a registered backend), it
+*opens*: calls raise ``CircuitOpen`` at once instead of reaching the
+provider. After ``BREAKER_OPEN_SECONDS`` it is *half-open* and lets one probe
+call through; the probe closes it on success or reopens it on failure.
+
+What happens to a page whose call is refused depends on ``BREAKER_MODE``
+(``transcribe_images_to_markdown()`` handles it): ``fail`` records the page
+as failed, ``park`` keeps it out of the queue until the breaker lets calls
+through again, for at most ``BREAKER_PARK_SECONDS``.
+
+State is per process.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from converter.services import telemetry
+from converter.services.key_pool import status_of
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """A call was refused because its backend/model's breaker is open."""
+
+    def __init__(self, backend: str, model: str, retry_in: float):
+        self.backend = backend
+        self.model = model
+        self.retry_in = retry_in
+        super().__init__(
+            f"Circuit open for {backend} / {model} after repeated errors; next probe in {retry_in:.0f}s."
+        )
+
+
+def breakers_enabled() -> bool:
+    return getattr(settings, "BREAKER_ERROR_RATE", 0.5) > 0
+
+
+def park_pages() -> bool:
+    """True if refused pages wait for the breaker instead of failing (``BREAKER_MODE=park``)."""
+    return (getattr(settings, "BREAKER_MODE", "park") or "park").lower() == "park"
+
+
+def counts_as_outage(exc: BaseException) -> bool:
+    """Whether *exc* says the provider is unwell, not that this request or key was bad."""
+    status = status_of(exc)
+    # No status: timeout, connection error, all keys quarantined, registered backend
+    return status is None or status == 429 or status >= 500
+
+
+# ── Breaker ───────────────────────────────────────────────────
+
+
+class _Breaker:
+    def __init__(self, backend: str, model: str):
+        self.backend = backend
+        self.model = model
+        self.state = CLOSED
+        # (monotonic time, failed) of recent calls
+        self.outcomes: deque[tuple[float, bool]] = deque()
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = 0
+
+    def error_rate(self, now: float) -> tuple[int, float]:
+        window = getattr(settings, "BREAKER_WINDOW_SECONDS", 60)
+        while self.outcomes and now - self.outcomes[0][0] > window:
+            self.outcomes.popleft()
+        calls = len(self.outcomes)
+        return calls, (sum(failed for _, failed in self.outcomes) / calls if calls else 0.0)
+
+    def retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + getattr(settings, "BREAKER_OPEN_SECONDS", 30) - now)
+
+    def current_state(self, now: float) -> str:
+        """CLOSED, OPEN, or HALF_OPEN when a probe may be sent now."""
+        if self.state == OPEN and not self.retry_in(now):
+            return OPEN if self.probing else HALF_OPEN
+        return self.state
+
+
+class _Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._breakers: dict[tuple[str, str], _Breaker] = {}
+
+    def _get(self, backend: str, model: str) -> _Breaker:
+        breaker = self._breakers.get((backend, model))
+        if breaker is None:
+            breaker = self._breakers[(backend, model)] = _Breaker(backend, model)
+        return breaker
+
+    def state(self, backend: str, model: str) -> str:
+        with self._lock:
+            return self._get(backend, model).current_state(time.monotonic())
+
+    def admit(self, backend: str, model: str) -> bool:
+        """Let a call through, or raise CircuitOpen; True if the call is the half-open probe."""
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._get(backend, model)
+            state = breaker.current_state(now)
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN:
+                breaker.probing = True
+                return True
+            raise CircuitOpen(backend, model, breaker.retry_in(now))
+
+    def record(self, backend: str, model: str, failed: bool, probe: bool) -> None:
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._get(backend, model)
+            if probe:
+                breaker.probing = False
+                breaker.outcomes.clear()
+                if failed:
+                    breaker.opened_at = now
+                    transition = "reopened"
+                else:
+                    breaker.state = CLOSED
+                    transition = "closed"
+            else:
+                breaker.outcomes.append((now, failed))
+                if breaker.state != CLOSED or not failed:
+                    return
+                calls, rate = breaker.error_rate(now)
+                if calls < getattr(settings, "BREAKER_MIN_CALLS", 10):
+                    return
+                if rate < getattr(settings, "BREAKER_ERROR_RATE", 0.5):
+                    return
+                breaker.state = OPEN
+                breaker.opened_at = now
+                breaker.trips += 1
+                transition = "opened"
+        telemetry.BREAKER_TRANSITIONS.inc(backend=backend, model=model, transition=transition)
+        if transition == "closed":
+            logger.info("Circuit for %s / %s closed: probe succeeded", backend, model)
+        else:
+            logger.warning(
+                "Circuit for %s / %s %s for %gs",
+                backend,
+                model,
+                transition,
+                getattr(settings, "BREAKER_OPEN_SECONDS", 30),
+            )
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            rows = []
+            for breaker in self._breakers.values():
+                calls, rate = breaker.error_rate(now)
+                rows.append(
+                    {
+                        "backend": breaker.backend,
+                        "model": breaker.model,
+                        "state": breaker.current_state(now),
+                        "calls": calls,
+                        "error_rate": rate,
+                        "retry_in": breaker.retry_in(now) if breaker.state == OPEN else 0.0,
+                        "trips": breaker.trips,
+                    }
+                )
+        return sorted(rows, key=lambda r: (r["backend"], r["model"]))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+
+registry = _Registry()
+
+
+def state(backend: str, model: str) -> str:
+    """The breaker state of *backend*/*model*: CLOSED, OPEN or HALF_OPEN (probe due)."""
+    if not breakers_enabled():
+        return CLOSED
+    return registry.state(backend, model)
+
+
+@contextlib.contextmanager
+def guard(backend: str, model: str):
+    """Wrap one vision call: refuse it with CircuitOpen or record its outcome."""
+    if not breakers_enabled():
+        yield
+        return
+    probe = registry.admit(backend, model)
+    failed = True
+    try:
+        yield
+        failed = False
+    except Exception as exc:
+        failed = counts_as_outage(exc)
+        raise
+    finally:
+        registry.record(backend, model, failed, probe)
+
+
+def open_breakers() -> list[dict]:
+    """Breakers not currently closed, for display."""
+    return [row for row in registry.stats() if row["state"] != CLOSED]
@@ -0,0 +1,217 @@
+"""Transparent compression for stored page results and output files.
+
+Blobs start with a 5-byte header: one codec byte (``j`` plain JSON,
+``z`` zlib, ``s`` zstd) followed by the big-endian CRC-32 of the preset
+dictionary used (0 = none).  The built-in dictionary holds Markdown syntax
+common to our transcriptions; ``manage.py train_compression_dict`` writes
+corpus-trained dictionaries to ``COMPRESSION_DICT_DIR``.  New blobs use
+the most recent trained dictionary, and old dictionaries stay readable as
+long as their files are kept.
+
+zstd needs the optional ``zstandard`` package; without it ``zlib`` is used.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import struct
+import threading
+import zlib
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_JSON = b"j"
+CODEC_ZLIB = b"z"
+CODEC_ZSTD = b"s"
+_HEADER = struct.Struct(">cI")
+
+# zlib only looks back 32 KB, so a larger preset dictionary is wasted
+ZLIB_DICT_MAX = 32 * 1024
+
+BUILTIN_DICT = (
+    "<!-- [Page : transcription failed] -->\n"
+    "| --- | --- | --- |\n|---|---|---|\n| :--- | ---: |\n"
+    "```\n\n> **Note:** \n\n---\n\n"
+    "1. 2. 3. - [ ] - [x] * **Total** **Date:** **Name:** **Address:** "
+    "![image](image.png) [link](http "
+    "\n\n#### \n\n### \n\n## \n\n# \n\n- **"
+).encode("utf-8")
+
+_dicts_lock = threading.Lock()
+_dicts: dict[int, bytes] | None = None
+_write_dict_id = 0
+
+
+# ── JSON blobs (page_results) ─────────────────────────────────
+
+
+def compress_json(value) -> bytes:
+    """Serialize *value* as JSON and compress it with the configured codec."""
+    data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return compress_bytes(data)
+
+
+def decompress_json(blob):
+    """Inverse of ``compress_json()``; also accepts legacy plain JSON strings."""
+    if blob is None:
+        return None
+    if isinstance(blob, str):
+        return json.loads(blob)
+    return json.loads(decompress_bytes(bytes(blob)))
+
+
+def compress_bytes(data: bytes) -> bytes:
+    codec = getattr(settings, "PAGE_RESULTS_CODEC", "zlib").lower()
+    if codec == "zstd" and zstandard is None:
+        logger.warning("PAGE_RESULTS_CODEC=zstd but 'zstandard' is not installed; using zlib")
+        codec = "zlib"
+    if codec == "none":
+        return _HEADER.pack(CODEC_JSON, 0) + data
+
+    dict_id, zdict = _write_dictionary()
+    if codec == "zstd":
+        cctx = zstandard.ZstdCompressor(
+            level=9, dict_data=zstandard.ZstdCompressionDict(zdict)
+        )
+        return _HEADER.pack(CODEC_ZSTD, dict_id) + cctx.compress(data)
+    comp = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS, zdict=zdict[-ZLIB_DICT_MAX:])
+    return _HEADER.pack(CODEC_ZLIB, dict_id) + comp.compress(data) + comp.flush()
+
+
+def decompress_bytes(blob: bytes) -> bytes:
+    if not blob:
+        return b"[]"
+    if blob[:1] in (b"[", b"{", b'"'):
+        # Plain JSON written before compression was introduced
+        return blob
+    codec, dict_id = _HEADER.unpack_from(blob)
+    payload = blob[_HEADER.size:]
+    if codec == CODEC_JSON:
+        return payload
+    zdict = _dictionary(dict_id) if dict_id else b""
+    if codec == CODEC_ZLIB:
+        if zdict:
+            decomp = zlib.decompressobj(zlib.MAX_WBITS, zdict=zdict[-ZLIB_DICT_MAX:])
+        else:
+            decomp = zlib.decompressobj(zlib.MAX_WBITS)
+        return decomp.decompress(payload) + decomp.flush()
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed data requires the 'zstandard' package.")
+        dctx = zstandard.ZstdDecompressor(
+            dict_data=zstandard.ZstdCompressionDict(zdict) if zdict else None
+        )
+        return dctx.decompress(payload)
+    raise ValueError(f"Unknown compression codec {codec!r}")
+
+
+# ── Output files ──────────────────────────────────────────────
+
+
+def output_file_content(name: str, text: str) -> tuple[str, bytes]:
+    """Return (storage name, bytes) for an output file, gzipped if enabled."""
+    data = text.encode("utf-8")
+    if getattr(settings, "COMPRESS_OUTPUT_FILES", False):
+        return name + ".gz", gzip.compress(data, compresslevel=9, mtime=0)
+    return name, data
+
+
+def read_output_file(field_file) -> str:
+    """Read an output file written by ``output_file_content()`` as text."""
+    with field_file.open("rb") as fh:
+        data = fh.read()
+    if field_file.name.endswith(".gz"):
+        data = gzip.decompress(data)
+    return data.decode("utf-8")
+
+
+# ── Dictionaries ──────────────────────────────────────────────
+
+
+def train_dictionary(samples: list[str], size: int = ZLIB_DICT_MAX) -> bytes:
+    """Build a preset dictionary from sample pages.
+
+    Uses zstd's trainer when ``zstandard`` is installed; otherwise collects
+    lines that recur across pages, most frequent last (zlib favours the end
+    of its dictionary).
+    """
+    encoded = [s.encode("utf-8") for s in samples if s]
+    if zstandard is not None and len(encoded) >= 8:
+        try:
+            return zstandard.train_dictionary(size, encoded).as_bytes()
+        except zstandard.ZstdError:
+            logger.info("zstd dictionary training failed; using line frequencies")
+
+    counts: Counter[bytes] = Counter()
+    for sample in encoded:
+        counts.update({line + b"\n" for line in sample.splitlines() if line.strip()})
+    frequent = [line for line, n in counts.most_common() if n > 1]
+    out = bytearray()
+    for line in frequent:
+        if len(out) + len(line) > size:
+            break
+        out[:0] = line
+    return bytes(out) or BUILTIN_DICT
+
+
+def save_dictionary(zdict: bytes) -> Path:
+    """Store a trained dictionary; it becomes the one used for new blobs."""
+    directory = Path(settings.COMPRESSION_DICT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{zlib.crc32(zdict):08x}.dict"
+    path.write_bytes(zdict)
+    reset_dictionaries()
+    return path
+
+
+def reset_dictionaries() -> None:
+    """Forget loaded dictionaries so they are re-read from disk."""
+    global _dicts
+    with _dicts_lock:
+        _dicts = None
+
+
+def _load_dictionaries() -> dict[int, bytes]:
+    global _dicts, _write_dict_id
+    with _dicts_lock:
+        if _dicts is None:
+            dicts = {zlib.crc32(BUILTIN_DICT): BUILTIN_DICT}
+            write_id = zlib.crc32(BUILTIN_DICT)
+            directory = Path(getattr(settings, "COMPRESSION_DICT_DIR", ""))
+            if directory.is_dir():
+                for path in sorted(directory.glob("*.dict"), key=lambda p: p.stat().st_mtime):
+                    data = path.read_bytes()
+                    dicts[zlib.crc32(data)] = data
+                    write_id = zlib.crc32(data)
+            _dicts = dicts
+            _write_dict_id = write_id
+        return _dicts
+
+
+def _write_dictionary() -> tuple[int, bytes]:
+    dicts = _load_dictionaries()
+    return _write_dict_id, dicts[_write_dict_id]
+
+
+def _dictionary(dict_id: int) -> bytes:
+    dicts = _load_dictionaries()
+    if dict_id not in dicts:
+        # Possibly trained by another process after this one loaded the directory
+        reset_dictionaries()
+        dicts = _load_dictionaries()
+    if dict_id not in dicts:
+        raise ValueError(
+            f"Compression dictionary {dict_id:08x} not found in COMPRESSION_DICT_DIR."
+        )
+    return dicts[dict_id]
@@ -0,0 +1,219 @@
+"""Serving task files with HTTP caching, compression and byte ranges.
+
+``serve_file()`` adds a content-hash ``ETag`` and ``Last-Modified`` header,
+answers conditional requests with 304, optionally compresses the body
+(brotli when the ``brotli`` package is installed, otherwise gzip) and
+optionally honours single ``Range: bytes=`` requests with 206 responses.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import re
+
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import telemetry
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+_DIGEST_KEY = "converter:file-digest:{}:{}:{}"
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CHUNK_SIZE = 64 * 1024
+# Bodies smaller than this are not worth compressing
+_MIN_COMPRESS_SIZE = 200
+
+
+# ── Public API ────────────────────────────────────────────────
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 hex digest of *path*, cached by path, size and mtime."""
+    st = os.stat(path)
+    key = _DIGEST_KEY.format(
+        hashlib.sha1(path.encode("utf-8")).hexdigest(), st.st_size, st.st_mtime_ns
+    )
+    digest = cache.get(key)
+    telemetry.record_cache("file_digest", int(digest is not None), int(digest is None))
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        cache.set(key, digest, timeout=None)
+    return digest
+
+
+def serve_file(
+    request,
+    field_file,
+    content_type: str,
+    filename: str,
+    compress: bool = False,
+    ranges: bool = False,
+) -> HttpResponse:
+    """Serve *field_file* as an attachment with conditional-GET support.
+
+    Args:
+        request: The current ``HttpRequest``.
+        field_file: A ``FieldFile`` stored on the local filesystem.
+        content_type: Value for the ``Content-Type`` header.
+        filename: Download name for ``Content-Disposition``.
+        compress: Compress the body when the client accepts br/gzip.
+        ranges: Honour ``Range`` requests (206 Partial Content) for files
+            not stored gzipped.
+    """
+    path = field_file.path
+    # Output files may be stored gzipped (COMPRESS_OUTPUT_FILES); they are then
+    # sent as-is to gzip-capable clients and decompressed for everyone else.
+    stored_gzip = path.endswith(".gz")
+    st = os.stat(path)
+    digest = file_digest(path)
+    last_modified = int(st.st_mtime)
+
+    encoding = None
+    if compress and (stored_gzip or st.st_size >= _MIN_COMPRESS_SIZE):
+        encoding = _choose_encoding(request)
+    # Each representation gets its own validator
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if not_modified is not None:
+        _set_validators(not_modified, etag, last_modified, vary=compress)
+        return not_modified
+
+    byte_range = None
+    if ranges and not stored_gzip and request.method in ("GET", "HEAD"):
+        byte_range = _requested_range(request, st.st_size, etag, last_modified)
+        if byte_range == "unsatisfiable":
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{st.st_size}"
+            _set_validators(response, etag, last_modified, vary=compress)
+            return response
+
+    if encoding:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        if not (stored_gzip and encoding == "gzip"):
+            data = _compress(gzip.decompress(data) if stored_gzip else data, encoding)
+        response = HttpResponse(data, content_type=content_type)
+        response["Content-Encoding"] = encoding
+        response["Content-Length"] = str(len(data))
+    elif stored_gzip:
+        with open(path, "rb") as fh:
+            response = HttpResponse(gzip.decompress(fh.read()), content_type=content_type)
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _read_range(path, start, end), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+        response["Content-Length"] = str(end - start + 1)
+    else:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+
+    if ranges:
+        response["Accept-Ranges"] = "bytes"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    _set_validators(response, etag, last_modified, vary=compress)
+    return response
+
+
+# ── Helpers ───────────────────────────────────────────────────
+
+
+def _set_validators(response, etag: str, last_modified: int, vary: bool) -> None:
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # Clients may store the file but must revalidate before reusing it
+    response["Cache-Control"] = "private, no-cache"
+    if vary:
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+
+def _choose_encoding(request) -> str | None:
+    """Pick the best content coding the client accepts (br > gzip)."""
+    accepted = {}
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, mode=brotli.MODE_TEXT)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _requested_range(request, size: int, etag: str, last_modified: int):
+    """Return ``(start, end)`` for a satisfiable single range, ``"unsatisfiable"``, or None.
+
+    Multi-range requests and stale ``If-Range`` validators fall back to a
+    full response, as RFC 9110 allows; so do invalid ranges such as ``5-2``
+    (RFC 9110 §14.1.1). Only a range starting past the end is unsatisfiable.
+    """
+    header = request.headers.get("Range", "")
+    match = _RANGE_RE.match(header.replace(" ", ""))
+    if not match:
+        return None
+
+    if_range = request.headers.get("If-Range")
+    if if_range:
+        if if_range.startswith(('"', "W/")):
+            if if_range != etag:
+                return None
+        elif parse_http_date_safe(if_range) != last_modified:
+            return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            return "unsatisfiable"
+        return (max(size - length, 0), size - 1)
+    start = int(first)
+    end = int(last) if last else size - 1
+    if end < start:
+        # Last byte before the first: an invalid range, so the header is ignored
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    return (start, min(end, size - 1))
+
+
+def _read_range(path: str, start: int, end: int):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fh.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
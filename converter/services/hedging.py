@@ -0,0 +1,87 @@
+"""Hedged requests: a second call for pages slower than the observed p95.
+
+Every successful vision call records its latency in a per-backend/model
+window of the last ``HEDGE_WINDOW`` calls in this process. When a page has
+been running longer than the ``HEDGE_PERCENTILE`` of that window,
+``transcribe_images_to_markdown()`` sends a hedge — to the same backend or
+to the other one (``HEDGE_BACKEND``) — and uses whichever answer arrives
+first; the other call is abandoned.
+
+Extra spend is capped with a token bucket: each first call earns
+``HEDGE_MAX_EXTRA_PERCENT / 100`` of a hedge and each hedge spends one, so
+hedges never exceed that percentage of calls, even across tasks.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+
+from django.conf import settings
+
+from converter.services import key_pool
+
+# Hedge credits that can be saved up while latencies are normal
+_MAX_CREDITS = 10.0
+
+_lock = threading.Lock()
+_latencies: dict[tuple[str, str], deque[float]] = {}
+_credits = {"value": 0.0}
+
+
+def hedging_enabled() -> bool:
+    return bool(getattr(settings, "HEDGE_ENABLED", False)) and _extra_fraction() > 0
+
+
+def observe(backend: str, model: str, seconds: float) -> None:
+    """Record the latency of a successful call."""
+    window = getattr(settings, "HEDGE_WINDOW", 200)
+    with _lock:
+        samples = _latencies.get((backend, model))
+        if samples is None or samples.maxlen != window:
+            samples = _latencies[(backend, model)] = deque(samples or (), maxlen=window)
+        samples.append(seconds)
+
+
+def hedge_after(backend: str, model: str) -> float | None:
+    """Seconds after which a call to *backend*/*model* should be hedged (None: too few samples)."""
+    with _lock:
+        samples = sorted(_latencies.get((backend, model), ()))
+    if len(samples) < getattr(settings, "HEDGE_MIN_SAMPLES", 20):
+        return None
+    pct = getattr(settings, "HEDGE_PERCENTILE", 95)
+    rank = max(1, math.ceil(pct / 100 * len(samples)))
+    return samples[rank - 1]
+
+
+def earn() -> None:
+    """Credit the budget for one first (unhedged) call."""
+    with _lock:
+        _credits["value"] = min(_credits["value"] + _extra_fraction(), _MAX_CREDITS)
+
+
+def try_spend() -> bool:
+    """Take one hedge from the budget; False if the extra-spend cap is reached."""
+    with _lock:
+        if _credits["value"] < 1:
+            return False
+        _credits["value"] -= 1
+        return True
+
+
+def hedge_backend(backend: str) -> str:
+    """Backend to send hedges to for pages of *backend*, per ``HEDGE_BACKEND``."""
+    choice = (getattr(settings, "HEDGE_BACKEND", "same") or "same").lower()
+    if choice == "same":
+        return backend
+    if choice == "other":
+        other = {"openai": "gemini", "gemini": "openai"}.get(backend)
+        if other and key_pool.has_keys(other):
+            return other
+        return backend
+    return choice
+
+
+def _extra_fraction() -> float:
+    return max(0.0, getattr(settings, "HEDGE_MAX_EXTRA_PERCENT", 5) / 100)
@@ -0,0 +1,289 @@
+"""Pools of API keys per provider, balanced by remaining rate budget.
+
+``OPENAI_API_KEYS`` / ``GEMINI_API_KEYS`` list several keys (comma-separated;
+``OPENAI_API_KEY`` / ``GEMINI_API_KEY`` are included too). Each call borrows
+the key with the most headroom:
+
+- the remaining request budget the provider last reported for the key
+  (OpenAI's ``x-ratelimit-remaining-requests``, until its reset time), minus
+  the calls it has in flight; keys without a reported budget are balanced by
+  in-flight calls alone;
+- after a 429 the key's budget counts as zero until ``Retry-After`` passes;
+- keys whose last answers were 429/401/403 are used only when no other key is
+  free of failures.
+
+A call answered with 429/401/403 is repeated once on each other key. Callers
+may also have the pool repeat connection errors and 408/409/5xx answers (on
+whichever key then has the most headroom) in place of their SDK's retries. After
+``KEY_QUARANTINE_AFTER`` such answers in a row a key is quarantined for
+``KEY_QUARANTINE_SECONDS`` and not used unless every key is quarantined.
+
+State is per process.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from typing import Callable, TypeVar
+
+from django.conf import settings
+
+from converter.services import telemetry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Status codes that are the key's fault rather than the request's
+KEY_ERROR_STATUSES = (401, 403, 429)
+
+# Backoff before repeating a transient failure: _RETRY_DELAY * 2**n, at most _RETRY_DELAY_MAX
+_RETRY_DELAY = 0.5
+_RETRY_DELAY_MAX = 8.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class KeysUnavailable(RuntimeError):
+    """Every key of a provider is quarantined."""
+
+
+def provider_keys(provider: str) -> list[str]:
+    """Configured keys for *provider* ("openai" or "gemini"), single key first."""
+    prefix = provider.upper()
+    keys = [getattr(settings, f"{prefix}_API_KEY", "")]
+    keys += getattr(settings, f"{prefix}_API_KEYS", None) or []
+    return list(dict.fromkeys(k for k in keys if k))
+
+
+def has_keys(provider: str) -> bool:
+    return bool(provider_keys(provider))
+
+
+def mask(key: str) -> str:
+    """Printable form of a key: its last four characters."""
+    return f"…{key[-4:]}" if key else "(none)"
+
+
+# ── Pool ──────────────────────────────────────────────────────
+
+
+class _Key:
+    def __init__(self, value: str):
+        self.value = value
+        self.label = mask(value)
+        self.in_flight = 0
+        self.remaining: int | None = None
+        self.reset_at = 0.0
+        self.strikes = 0
+        self.quarantined_until = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+
+    def headroom(self, now: float) -> float:
+        if self.remaining is None or now >= self.reset_at:
+            return float("inf")
+        return self.remaining - self.in_flight
+
+
+class KeyPool:
+    """The keys of one provider and what is known about their rate budgets."""
+
+    def __init__(self, provider: str, keys: list[str]):
+        self.provider = provider
+        self._lock = threading.Lock()
+        # An empty key keeps the SDK's own "no API key" error
+        self._keys = [_Key(k) for k in keys] or [_Key("")]
+
+    @property
+    def size(self) -> int:
+        return len(self._keys)
+
+    def acquire(self, exclude: set[str] = frozenset()) -> _Key:
+        """Borrow the key with the most headroom, skipping *exclude* (key values).
+
+        Keys whose last answers were 429/401/403 come last.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [k for k in self._keys if k.value not in exclude]
+            healthy = [k for k in candidates if k.quarantined_until <= now]
+            if not healthy:
+                raise KeysUnavailable(
+                    f"All {len(self._keys)} {self.provider} API key(s) are quarantined after repeated 429/401 responses."
+                )
+            key = min(healthy, key=lambda k: (k.strikes, -k.headroom(now), k.in_flight, k.last_used))
+            key.in_flight += 1
+            key.requests += 1
+            key.last_used = now
+            return key
+
+    def release(self, key: _Key, status: int | None, headers=None) -> None:
+        """Return *key* with the call's HTTP status (None if unknown) and response headers."""
+        now = time.monotonic()
+        remaining, reset = _rate_budget(headers)
+        quarantined = False
+        with self._lock:
+            key.in_flight -= 1
+            if remaining is not None:
+                key.remaining, key.reset_at = remaining, now + reset
+            if status == 429:
+                key.remaining = 0
+                key.reset_at = now + (_retry_after(headers) or 1.0)
+            if status in KEY_ERROR_STATUSES and key.quarantined_until <= now:
+                # (Answers to calls sent before a quarantine do not extend it)
+                key.strikes += 1
+                if key.strikes >= getattr(settings, "KEY_QUARANTINE_AFTER", 3):
+                    key.quarantined_until = now + getattr(settings, "KEY_QUARANTINE_SECONDS", 60)
+                    key.strikes = 0
+                    quarantined = True
+            elif status is not None and status < 400:
+                key.strikes = 0
+        telemetry.API_KEY_REQUESTS.inc(
+            provider=self.provider, key=key.label, status=str(status) if status else "error"
+        )
+        if quarantined:
+            telemetry.API_KEY_QUARANTINES.inc(provider=self.provider, key=key.label)
+            logger.warning(
+                "%s API key %s quarantined for %gs after repeated %s responses",
+                self.provider,
+                key.label,
+                getattr(settings, "KEY_QUARANTINE_SECONDS", 60),
+                status,
+            )
+
+    def stats(self) -> list[dict]:
+        """Per-key state for display (keys masked)."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": k.label,
+                    "in_flight": k.in_flight,
+                    "requests": k.requests,
+                    "remaining": max(0, k.remaining) if k.remaining is not None and now < k.reset_at else None,
+                    "quarantined_for": max(0.0, k.quarantined_until - now),
+                }
+                for k in self._keys
+            ]
+
+
+_pools_lock = threading.Lock()
+_pools: dict[str, KeyPool] = {}
+
+
+def get_pool(provider: str) -> KeyPool:
+    """This process's pool for *provider*, rebuilt when the configured keys change."""
+    keys = provider_keys(provider)
+    with _pools_lock:
+        pool = _pools.get(provider)
+        if pool is None or [k.value for k in pool._keys if k.value] != keys:
+            pool = _pools[provider] = KeyPool(provider, keys)
+        return pool
+
+
+def pool_stats() -> dict[str, list[dict]]:
+    """Per-key state of every provider with more than one key, for display."""
+    return {
+        provider: get_pool(provider).stats()
+        for provider in ("openai", "gemini")
+        if len(provider_keys(provider)) > 1
+    }
+
+
+def call_with_key(
+    provider: str,
+    call: Callable[[str], T],
+    headers_of: Callable[[T], object],
+    retries: int = 0,
+) -> T:
+    """Run ``call(api_key)`` with a pooled key, moving to another key on 429/401/403.
+
+    *headers_of* extracts the response headers from a successful result.
+    Up to *retries* transient failures (connection errors, 408/409/5xx) are
+    repeated with backoff, for callers that turn their SDK's own retries off
+    so they do not hammer one key.
+    """
+    pool = get_pool(provider)
+    tried: set[str] = set()
+    transient = 0
+    while True:
+        key = pool.acquire(exclude=tried)
+        try:
+            result = call(key.value)
+        except Exception as exc:
+            status = status_of(exc)
+            pool.release(key, status, _exception_headers(exc))
+            if status in KEY_ERROR_STATUSES:
+                tried.add(key.value)
+                if len(tried) < pool.size:
+                    logger.info("%s API key %s got %s; trying another key", provider, key.label, status)
+                    continue
+            elif transient < retries and _is_transient(status):
+                delay = min(_RETRY_DELAY * 2**transient, _RETRY_DELAY_MAX)
+                transient += 1
+                logger.info("%s API call failed (%s); retrying in %gs", provider, status or exc, delay)
+                time.sleep(delay)
+                continue
+            raise
+        pool.release(key, 200, headers_of(result))
+        return result
+
+
+def status_of(exc: BaseException) -> int | None:
+    """HTTP status of an SDK exception (OpenAI ``status_code``, google-genai ``code``)."""
+    for attr in ("status_code", "code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _is_transient(status: int | None) -> bool:
+    """Connection errors (no status), timeouts, conflicts and server errors."""
+    return status is None or status in (408, 409) or status >= 500
+
+
+# ── Header parsing ────────────────────────────────────────────
+
+
+def _exception_headers(exc: BaseException):
+    response = getattr(exc, "response", None)
+    return getattr(response, "headers", None)
+
+
+def _header(headers, name: str) -> str | None:
+    if headers is None:
+        return None
+    try:
+        return headers.get(name)
+    except AttributeError:
+        return None
+
+
+def _rate_budget(headers) -> tuple[int | None, float]:
+    """(remaining requests, seconds until reset) from OpenAI-style headers."""
+    remaining = _header(headers, "x-ratelimit-remaining-requests")
+    if remaining is None:
+        return None, 0.0
+    try:
+        return int(remaining), _parse_duration(_header(headers, "x-ratelimit-reset-requests") or "")
+    except ValueError:
+        return None, 0.0
+
+
+def _retry_after(headers) -> float | None:
+    value = _header(headers, "retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _parse_duration(value: str) -> float:
+    """Parse durations like ``1s``, ``6m0s`` or ``20ms`` into seconds."""
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in _DURATION_PART.findall(value))
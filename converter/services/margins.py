@@ -0,0 +1,211 @@
+"""Detect letterheads and footers repeated across a PDF, so they can be cropped.
+
+``detect_margins()`` samples up to ``_MAX_SAMPLE_PAGES`` pages of the document
+and looks at the top and bottom ``CROP_MAX_FRACTION`` of each page in two
+ways:
+
+- **Text blocks** (PyMuPDF ``get_text("blocks")``): a block at the same
+  position with the same text (digits ignored, so "Page 3 of 9" matches) on
+  at least ``CROP_MIN_REPEAT`` of the sampled pages is part of a header or
+  footer.
+- **Pixel rows** of a small grayscale rendering: rows that look the same
+  on most pages and contain ink form a repeated band (logos, rules,
+  scanned letterheads). The band ends at the first row that varies between
+  pages.
+
+A page is cropped only below/above what repeats *on that page*, and never
+past its first non-repeated text block or a row that differs from the
+repeated band, so page content is not cut.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from collections import Counter
+from statistics import median
+from typing import NamedTuple
+
+import pymupdf
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_SAMPLE_PAGES = 40
+_MIN_PAGES = 3
+# Grayscale rendering used for the row statistics
+_PROFILE_SCALE = 0.25
+_DARK = 160
+# Two rows are "the same" if at most _ROW_TOLERANCE of their pixels differ
+# by more than _PIXEL_TOLERANCE gray levels (scans are never identical)
+_PIXEL_TOLERANCE = 64
+_ROW_TOLERANCE = 0.01
+# Share of a page's rows above/below the cut that must match the repeated band
+_PAGE_MATCH = 0.95
+# Space (points) kept between the cut and the content it protects
+_PADDING = 2.0
+
+_DIGITS = re.compile(r"\d+")
+_SPACE = re.compile(r"\s+")
+
+
+class Margins(NamedTuple):
+    """Fractions of a page's height to crop from the top and the bottom."""
+
+    top: float = 0.0
+    bottom: float = 0.0
+
+    def clip(self, rect: pymupdf.Rect) -> pymupdf.Rect | None:
+        if self.top <= 0 and self.bottom <= 0:
+            return None
+        height = rect.height
+        return pymupdf.Rect(rect.x0, rect.y0 + self.top * height, rect.x1, rect.y1 - self.bottom * height)
+
+
+def cropping_enabled() -> bool:
+    return bool(getattr(settings, "CROP_MARGINS", False))
+
+
+def detect_margins(doc: pymupdf.Document, first: int, last: int) -> dict[int, Margins]:
+    """Return the margins to crop for the 0-based pages ``first..last-1`` (others: none)."""
+    total = len(doc)
+    if total < _MIN_PAGES:
+        return {}
+    step = max(1, math.ceil(total / _MAX_SAMPLE_PAGES))
+    sample = list(range(0, total, step))
+    max_fraction = getattr(settings, "CROP_MAX_FRACTION", 0.2)
+    needed = max(2, math.ceil(getattr(settings, "CROP_MIN_REPEAT", 0.6) * len(sample)))
+
+    blocks = {i: _band_blocks(doc.load_page(i), max_fraction) for i in sample}
+    repeated_keys = {}
+    for band in ("top", "bottom"):
+        counts = Counter(key for i in sample for key in {b[0] for b in blocks[i][band]} if key is not None)
+        repeated_keys[band] = {key for key, count in counts.items() if count >= needed}
+    profiles = {i: _rows(_profile(doc.load_page(i))) for i in sample}
+    bands = _pixel_bands(list(profiles.values()), max_fraction, needed)
+
+    margins = {}
+    for i in range(first, last):
+        page = doc.load_page(i)
+        page_blocks = blocks[i] if i in blocks else _band_blocks(page, max_fraction)
+        rows = profiles[i] if i in profiles else _rows(_profile(page)) if bands else []
+        top = _page_cut(page, page_blocks["top"], repeated_keys["top"], bands.get("top"), rows, from_top=True)
+        bottom = _page_cut(page, page_blocks["bottom"], repeated_keys["bottom"], bands.get("bottom"), rows, from_top=False)
+        if top or bottom:
+            margins[i] = Margins(round(top, 4), round(bottom, 4))
+    if margins:
+        logger.info("Cropping repeated headers/footers on %d of %d page(s)", len(margins), last - first)
+    return margins
+
+
+# ── Text blocks ───────────────────────────────────────────────
+
+
+def _band_blocks(page: pymupdf.Page, max_fraction: float) -> dict[str, list[tuple]]:
+    """Blocks in the top and bottom bands as (key, y0, y1) in fractions of the page height.
+
+    Blocks of the page body are listed too, with key None, as the limit of any cut.
+    """
+    rect = page.rect
+    bands: dict[str, list[tuple]] = {"top": [], "bottom": []}
+    for x0, y0, x1, y1, text, _, kind in page.get_text("blocks"):
+        top, bottom = (y0 - rect.y0) / rect.height, (y1 - rect.y0) / rect.height
+        key = (
+            kind,
+            round((x0 - rect.x0) / rect.width, 2),
+            round(top, 2),
+            _SPACE.sub(" ", _DIGITS.sub("#", text)).strip().lower(),
+        )
+        if bottom <= max_fraction:
+            bands["top"].append((key, top, bottom))
+        elif top >= 1 - max_fraction:
+            bands["bottom"].append((key, top, bottom))
+        else:
+            bands["top"].append((None, top, bottom))
+            bands["bottom"].append((None, top, bottom))
+    return bands
+
+
+def _page_cut(page, band_blocks, repeated_keys, pixel_band, rows, from_top: bool) -> float:
+    """Fraction of *page* to crop on one side (0 if nothing repeats there)."""
+    pad = _PADDING / page.rect.height
+    # Distance from the page edge, so both sides are handled alike
+    def depth(top, bottom):
+        return (bottom, top) if from_top else (1 - top, 1 - bottom)
+
+    repeated = [depth(t, b)[0] for key, t, b in band_blocks if key in repeated_keys]
+    content = [depth(t, b)[1] for key, t, b in band_blocks if key not in repeated_keys]
+    cut = max(repeated, default=0.0)
+    if pixel_band is not None and _matches_band(rows, pixel_band, from_top):
+        cut = max(cut, pixel_band.depth)
+    if not cut:
+        return 0.0
+    limit = min(content, default=1.0)
+    if cut >= limit:
+        return 0.0
+    return min(cut + pad, (cut + limit) / 2)
+
+
+# ── Pixel rows ────────────────────────────────────────────────
+
+
+class _Band(NamedTuple):
+    """A repeated band of pixel rows at one edge of the common page size."""
+
+    size: tuple[int, int]
+    rows: list[bytes]
+    depth: float
+
+
+def _profile(page: pymupdf.Page) -> pymupdf.Pixmap:
+    return page.get_pixmap(matrix=pymupdf.Matrix(_PROFILE_SCALE, _PROFILE_SCALE), colorspace=pymupdf.csGRAY)
+
+
+def _rows(pix: pymupdf.Pixmap) -> list[bytes]:
+    samples = pix.samples
+    return [samples[r * pix.stride : r * pix.stride + pix.width] for r in range(pix.height)]
+
+
+def _same_row(a: bytes, b: bytes) -> bool:
+    allowed = max(1, int(len(a) * _ROW_TOLERANCE))
+    return sum(1 for x, y in zip(a, b) if abs(x - y) > _PIXEL_TOLERANCE) <= allowed
+
+
+def _size(rows: list[bytes]) -> tuple[int, int]:
+    return len(rows), len(rows[0]) if rows else 0
+
+
+def _pixel_bands(profiles: list[list[bytes]], max_fraction: float, needed: int) -> dict[str, _Band]:
+    """Repeated top/bottom row bands across the sampled pages of the most common size."""
+    size, count = Counter(_size(rows) for rows in profiles).most_common(1)[0]
+    if count < needed or not size[0]:
+        return {}
+    pages = [rows for rows in profiles if _size(rows) == size]
+    height = size[0]
+    limit = int(height * max_fraction)
+    bands = {}
+    for name, order in (("top", range(limit)), ("bottom", range(height - 1, height - 1 - limit, -1))):
+        reference: list[bytes] = []
+        end = 0
+        for depth, r in enumerate(order):
+            row = bytes(int(median(column)) for column in zip(*(rows[r] for rows in pages)))
+            same = sum(1 for rows in pages if _same_row(rows[r], row))
+            if same < needed:
+                break
+            reference.append(row)
+            if min(row, default=255) < _DARK:
+                end = depth + 1
+        if end:
+            bands[name] = _Band(size, reference, end / height)
+    return bands
+
+
+def _matches_band(rows: list[bytes], band: _Band, from_top: bool) -> bool:
+    """True if a page's *rows* show the repeated band (and nothing else) above/below its cut."""
+    if _size(rows) != band.size:
+        return False
+    depth = round(band.depth * len(rows))
+    mine = rows[:depth] if from_top else rows[::-1][:depth]
+    same = sum(1 for a, b in zip(mine, band.rows) if _same_row(a, b))
+    return same >= _PAGE_MATCH * depth
@@ -0,0 +1,86 @@
+"""Multi-backend mode: spread one task's pages over several providers.
+
+With ``VISION_BACKEND=multi`` (or "Split across backends" on the settings
+page), every configured backend listed in ``VISION_MULTI_WEIGHTS`` takes
+pages at the same time. The backend for a page is picked when its call
+starts, by weighted least outstanding requests: the member with the fewest
+calls in flight per unit of weight, process-wide. A slower or rate-limited
+provider therefore accumulates in-flight calls and receives fewer new pages.
+
+A call that raises is retried on the next member (failover); members whose
+last call failed are picked only when no healthy member is left, and members
+whose circuit breaker is open only when all are (see ``circuit_breaker.py``). Each page's
+metrics record the backend that produced it.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import Counter
+from typing import Iterable
+
+from django.conf import settings
+
+from converter.services import circuit_breaker, key_pool
+
+MULTI_BACKEND = "multi"
+
+# Built-in providers are members only when they have an API key
+_BUILTIN = ("openai", "gemini")
+
+
+def member_weights(registered: Iterable[str] = ()) -> dict[str, float]:
+    """Usable members of the multi backend and their weights.
+
+    *registered* names extra backends (see ``vision.register_backend``) that
+    may be listed in ``VISION_MULTI_WEIGHTS``.
+    """
+    registered = set(registered)
+    weights = getattr(settings, "VISION_MULTI_WEIGHTS", None) or {"openai": 1.0, "gemini": 1.0}
+    members = {}
+    for name, weight in weights.items():
+        if weight <= 0:
+            continue
+        if name in _BUILTIN:
+            if key_pool.has_keys(name):
+                members[name] = float(weight)
+        elif name in registered:
+            members[name] = float(weight)
+    return members
+
+
+class _Balancer:
+    """Process-wide in-flight counts and failure streaks per member backend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Counter[str] = Counter()
+        self._failures: Counter[str] = Counter()
+
+    def pick(self, members, exclude=()):
+        """Return the member (anything with ``backend`` and ``weight``) to send the next call to."""
+        candidates = [m for m in members if m.backend not in exclude]
+        states = {m.backend: circuit_breaker.state(m.backend, m.model) for m in candidates}
+        with self._lock:
+            return min(
+                candidates,
+                key=lambda m: (
+                    states[m.backend] == circuit_breaker.OPEN,
+                    # A member due for a half-open probe gets one despite its failures
+                    self._failures[m.backend] > 0 and states[m.backend] != circuit_breaker.HALF_OPEN,
+                    (self._in_flight[m.backend] + 1) / m.weight,
+                    m.backend,
+                ),
+            )
+
+    def started(self, backend: str) -> None:
+        with self._lock:
+            self._in_flight[backend] += 1
+
+    def finished(self, backend: str, ok: bool) -> None:
+        with self._lock:
+            self._in_flight[backend] -= 1
+            self._failures[backend] = 0 if ok else self._failures[backend] + 1
+
+
+balancer = _Balancer()
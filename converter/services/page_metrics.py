@@ -0,0 +1,136 @@
+"""Per-page timing and size metrics stored on ``ConversionTask.metrics``.
+
+``_process_task`` collects raw measurements from ``pdf_to_base64_images()``
+(render/encode time, image size) and ``transcribe_images_to_markdown()``
+(queue wait, API latency, retries, tokens) and turns them into::
+
+    {
+        "stages": {"render_ms": ..., "transcribe_ms": ..., "progress_db_ms": ...,
+                   "index_ms": ..., "write_ms": ..., "total_ms": ...},
+        "pages": [{"page": 1, "render_start_ms": ..., "render_ms": ..., "encode_ms": ...,
+                   "image_bytes": ..., "api_start_ms": ..., "queue_ms": ..., "api_ms": ...,
+                   "retries": ..., "input_tokens": ..., "output_tokens": ...,
+                   "failed": ..., "attempts": ..., "backend": ..., "model": ...,
+                   "score": ..., "escalated": ..., "crop": ...}, ...],
+    }
+
+``score`` and ``escalated`` are only present for pages of a model cascade
+(see ``services/cascade.py``), ``crop`` (fraction of the page height cut
+off) only for pages whose margins were cropped (``services/margins.py``).
+
+All ``*_start_ms`` offsets are relative to the start of the run that
+produced the page, so the result page can draw a waterfall.
+"""
+
+from __future__ import annotations
+
+import math
+from collections import Counter
+
+_PAGE_TIME_KEYS = ("render_start_ms", "render_ms", "encode_ms", "api_start_ms", "queue_ms", "api_ms")
+
+
+def build_task_metrics(
+    render_metrics: list[dict],
+    call_metrics: dict[int, dict],
+    stages: dict[str, float],
+    render_offset_ms: float,
+    transcribe_offset_ms: float,
+) -> dict:
+    """Combine raw per-stage measurements into the stored metrics structure.
+
+    Args:
+        render_metrics: One dict per rendered page, as filled in by
+            ``pdf_to_base64_images(page_metrics=...)``.
+        call_metrics: Page index -> dict, as filled in by
+            ``transcribe_images_to_markdown(page_metrics=...)``. Pages not
+            transcribed in this run are left out of the result.
+        stages: Stage name -> milliseconds for the whole task.
+        render_offset_ms: When rendering started, relative to the run start.
+        transcribe_offset_ms: When transcription started, relative to the run start.
+    """
+    pages = []
+    for idx, call in sorted(call_metrics.items()):
+        render = render_metrics[idx] if idx < len(render_metrics) else {}
+        pages.append(
+            {
+                "page": idx + 1,
+                "render_start_ms": render_offset_ms + render.get("start_ms", 0.0),
+                "render_ms": render.get("render_ms", 0.0),
+                "encode_ms": render.get("encode_ms", 0.0),
+                "image_bytes": render.get("image_bytes", 0),
+                "api_start_ms": transcribe_offset_ms + call["start_ms"],
+                "queue_ms": call["queue_ms"],
+                "api_ms": call["api_ms"],
+                "retries": call.get("retries", 0),
+                "input_tokens": call.get("input_tokens"),
+                "output_tokens": call.get("output_tokens"),
+                "failed": call.get("failed", False),
+                "attempts": call.get("attempts", 1),
+                "backend": call.get("backend", ""),
+                "model": call.get("model", ""),
+            }
+        )
+        if "score" in call:
+            pages[-1].update(score=call["score"], escalated=call.get("escalated", False))
+        if "crop" in render:
+            pages[-1]["crop"] = render["crop"]
+    for page in pages:
+        for key in _PAGE_TIME_KEYS:
+            page[key] = round(page[key], 1)
+    return {
+        "stages": {name: round(ms, 1) for name, ms in stages.items()},
+        "pages": pages,
+    }
+
+
+def merge_task_metrics(previous: dict | None, current: dict) -> dict:
+    """Replace the pages re-run in *current* (a retry) and keep the rest of *previous*."""
+    if not previous or not previous.get("pages"):
+        return current
+    by_page = {p["page"]: p for p in previous["pages"]}
+    by_page.update({p["page"]: p for p in current["pages"]})
+    return {
+        "stages": current["stages"],
+        "pages": [by_page[n] for n in sorted(by_page)],
+    }
+
+
+def summarize_metrics(metrics: dict | None) -> dict:
+    """Aggregate per-page metrics (totals, means and latency percentiles)."""
+    pages = (metrics or {}).get("pages") or []
+    if not pages:
+        return {}
+    api = sorted(p["api_ms"] for p in pages)
+    queue = [p["queue_ms"] for p in pages]
+    image_bytes = sum(p["image_bytes"] for p in pages)
+    return {
+        "pages": len(pages),
+        "failed": sum(1 for p in pages if p.get("failed")),
+        "render_ms_total": round(sum(p["render_ms"] for p in pages), 1),
+        "encode_ms_total": round(sum(p["encode_ms"] for p in pages), 1),
+        "image_bytes_total": image_bytes,
+        "image_bytes_mean": image_bytes // len(pages),
+        "queue_ms_mean": round(sum(queue) / len(queue), 1),
+        "queue_ms_max": round(max(queue), 1),
+        "api_ms_mean": round(sum(api) / len(api), 1),
+        "api_ms_p50": _percentile(api, 50),
+        "api_ms_p95": _percentile(api, 95),
+        "api_ms_max": api[-1],
+        "retries": sum(p.get("retries") or 0 for p in pages),
+        "resubmitted": sum(1 for p in pages if (p.get("attempts") or 1) > 1),
+        "backends": dict(Counter(p["backend"] for p in pages if p.get("backend"))),
+        "models": dict(Counter(p["model"] for p in pages if p.get("model"))),
+        "scored": sum(1 for p in pages if "score" in p),
+        "escalated": sum(1 for p in pages if p.get("escalated")),
+        "cropped": sum(1 for p in pages if p.get("crop")),
+        "input_tokens": sum(p.get("input_tokens") or 0 for p in pages),
+        "output_tokens": sum(p.get("output_tokens") or 0 for p in pages),
+        "stages": (metrics or {}).get("stages", {}),
+    }
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
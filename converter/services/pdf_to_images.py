@@ -2,16 +2,32 @@
 
 import base64
 import logging
+import time
 
 import pymupdf
 
+from .margins import cropping_enabled, detect_margins
+
 logger = logging.getLogger(__name__)
 
 
+def pdf_page_range(pdf_path: str, start_page: int = 1, end_page: int = 0) -> tuple[int, int]:
+    """Return the 1-based inclusive (first, last) pages that *start_page*/*end_page* select.
+
+    Applies the same clamping as ``pdf_to_base64_images()`` without rendering.
+    """
+    with pymupdf.open(pdf_path) as doc:
+        first, last = _clamp_range(len(doc), start_page, end_page)
+    return first + 1, last
+
+
 def pdf_to_base64_images(
     pdf_path: str,
     start_page: int = 1,
     end_page: int = 0,
+    page_metrics: list[dict] | None = None,
+    text_layers: list[dict] | None = None,
+    crop_margins: bool | None = None,
 ) -> tuple[list[str], int]:
     """Open *pdf_path*, render selected pages to PNG and return base64 strings.
 
@@ -20,21 +36,21 @@ def pdf_to_base64_images(
         start_page: First page to process (1-based). Defaults to 1.
         end_page: Last page to process (1-based). 0 means the last page
             of the document.
+        page_metrics: Optional mutable list; one dict per rendered page is
+            appended with ``start_ms`` (offset from the call), ``render_ms``,
+            ``encode_ms`` and ``image_bytes``, plus ``crop`` (the fraction of
+            the page height cut off) for cropped pages.
+        text_layers: Optional mutable list; one dict per rendered page is
+            appended with ``text`` (the PDF's text layer) and ``ink`` (the
+            fraction of pixels not in the page's dominant colour).
+        crop_margins: Crop headers and footers repeated across the document
+            (see ``services/margins.py``). None uses ``CROP_MARGINS``.
 
     Returns:
         A tuple of (list_of_base64_strings, total_pages_processed).
     """
     doc = pymupdf.open(pdf_path)
-    total_doc_pages = len(doc)
-
-    # Clamp to valid range (convert 1-based to 0-based)
-    first = max(start_page - 1, 0)
-    last = total_doc_pages if end_page <= 0 else min(end_page, total_doc_pages)
-
-    if first >= last:
-        first = 0
-        last = total_doc_pages
-
+    first, last = _clamp_range(len(doc), start_page, end_page)
     pages_to_process = last - first
 
     logger.info(
@@ -46,13 +62,44 @@ def pdf_to_base64_images(
     )
 
     images: list[str] = []
+    origin = time.perf_counter()
+    if crop_margins is None:
+        crop_margins = cropping_enabled()
+    margins = detect_margins(doc, first, last) if crop_margins else {}
     for i in range(first, last):
+        t0 = time.perf_counter()
         page = doc.load_page(i)
-        pix = page.get_pixmap()
+        clip = margins[i].clip(page.rect) if i in margins else None
+        pix = page.get_pixmap(clip=clip)
+        t1 = time.perf_counter()
         # Direct PNG bytes from pixmap — no temp files, no PIL needed
         png_bytes = pix.tobytes("png")
         images.append(base64.b64encode(png_bytes).decode("ascii"))
+        if page_metrics is not None:
+            page_metrics.append(
+                {
+                    "start_ms": (t0 - origin) * 1000,
+                    "render_ms": (t1 - t0) * 1000,
+                    "encode_ms": (time.perf_counter() - t1) * 1000,
+                    "image_bytes": len(png_bytes),
+                }
+            )
+            if clip is not None:
+                page_metrics[-1]["crop"] = round(margins[i].top + margins[i].bottom, 3)
+        if text_layers is not None:
+            text_layers.append({"text": page.get_text(clip=clip), "ink": 1 - pix.color_topusage()[0]})
 
     doc.close()
     logger.info("Converted %d page(s) to base64 images", len(images))
     return images, pages_to_process
+
+
+def _clamp_range(total_doc_pages: int, start_page: int, end_page: int) -> tuple[int, int]:
+    """Clamp a 1-based page range to the document; returns 0-based [first, last)."""
+    first = max(start_page - 1, 0)
+    last = total_doc_pages if end_page <= 0 else min(end_page, total_doc_pages)
+
+    if first >= last:
+        first = 0
+        last = total_doc_pages
+    return first, last
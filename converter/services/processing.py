@@ -6,16 +6,33 @@ the HTTP request/response cycle.
 
 from __future__ import annotations
 
+import hashlib
 import logging
+import os
 import threading
 import time
+from datetime import timedelta
 
+from django.conf import settings
+from django.core.files import File
 from django.core.files.base import ContentFile
+from django.utils import timezone
 
 from converter.models import ConversionTask, get_effective_vision_config
 
+from . import telemetry
+from .cancellation import cancel_scope, cancelled_message, signal_cancel
+from .cascade import cascade_enabled, transcribe_with_cascade
+from .compression import output_file_content
+from .downloads import file_digest
+from .page_metrics import build_task_metrics, merge_task_metrics
 from .pdf_to_images import pdf_to_base64_images
-from .vision import transcribe_images_to_markdown
+from .profiling import profile_task, should_profile
+from .rendering import invalidate_task_render
+from .scheduler import task_flow
+from .search import index_task_pages
+from .sharding import cancel_pending_shards, has_live_shard, plan_shards, run_worker, should_shard
+from .webhooks import task_finished
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +58,111 @@ def start_processing(task_id: int, retry_failed_only: bool = False) -> None:
     )
 
 
+def run_task(task_id: int, retry_failed_only: bool = False) -> None:
+    """Run the conversion pipeline in the calling thread; see ``start_processing()``."""
+    _process_task(task_id, retry_failed_only)
+
+
+def claim_abandoned_run(task: ConversionTask) -> bool:
+    """Take over a pending or processing *task* whose run is gone; True if claimed.
+
+    A run counts as gone when the task has not been updated (unsharded runs
+    touch ``updated_at`` as each page finishes) and no worker has reported
+    progress on one of its shards for ``SHARD_LEASE_SECONDS``. The claim is a
+    conditional UPDATE, so of several callers only one gets the task; its
+    leftover shards are deleted and the caller runs it again.
+    """
+    if task.status not in (ConversionTask.Status.PENDING, ConversionTask.Status.PROCESSING):
+        return False
+    lease = timedelta(seconds=getattr(settings, "SHARD_LEASE_SECONDS", 300))
+    now = timezone.now()
+    if task.updated_at >= now - lease or has_live_shard(task.pk):
+        return False
+    claimed = ConversionTask.objects.filter(
+        pk=task.pk, status=task.status, updated_at=task.updated_at
+    ).update(updated_at=now)
+    if not claimed:
+        return False
+    task.updated_at = now
+    task.shards.all().delete()
+    logger.info("Task %d: taking over an abandoned run", task.pk)
+    return True
+
+
+def create_task_from_upload(uploaded_file, **fields) -> ConversionTask:
+    """Create a pending task for an uploaded PDF, recording its SHA-256.
+
+    *fields* are further model fields (prompt, page range, priority, ...).
+    """
+    h = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        h.update(chunk)
+    uploaded_file.seek(0)
+    return ConversionTask.objects.create(
+        original_filename=uploaded_file.name, pdf_file=uploaded_file, source_sha256=h.hexdigest(), **fields
+    )
+
+
+def create_task_from_path(path: str, **fields) -> ConversionTask:
+    """Create a pending task for the PDF at *path* (copied into ``MEDIA_ROOT``), recording its SHA-256.
+
+    *fields* are further model fields, as for ``create_task_from_upload()``.
+    """
+    name = os.path.basename(path)
+    with open(path, "rb") as fh:
+        return ConversionTask.objects.create(
+            original_filename=name, pdf_file=File(fh, name=name), source_sha256=file_digest(path), **fields
+        )
+
+
+def copy_task(task: ConversionTask, **fields) -> ConversionTask:
+    """Create a new pending task converting the same PDF with the same options.
+
+    *fields* override the copied values (e.g. ``profile_requested=True``).
+    """
+    values = {
+        "original_filename": task.original_filename,
+        "pdf_file": task.pdf_file,
+        "prompt": task.prompt,
+        "start_page": task.start_page,
+        "end_page": task.end_page,
+        "priority": task.priority,
+        "submitter": task.submitter,
+        "source_sha256": task.source_sha256,
+        "webhook_url": task.webhook_url,
+    }
+    values.update(fields)
+    return ConversionTask.objects.create(**values)
+
+
+def profiling_supported(task: ConversionTask) -> bool:
+    """False for tasks that will be sharded: shard workers run unprofiled."""
+    try:
+        return not should_shard(task)
+    except Exception:
+        # An unreadable PDF fails in the pipeline, which reports it
+        return True
+
+
+def cancel_processing(task_id: int) -> bool:
+    """Cancel a pending or processing task; return False if it was not running.
+
+    Queued pages are dropped at once and in-flight API calls get
+    ``CANCEL_GRACE_SECONDS`` to finish. Pages completed so far are kept and
+    the task ends up ``cancelled``; retrying it transcribes the rest.
+    """
+    cancelled = ConversionTask.objects.filter(
+        pk=task_id,
+        status__in=(ConversionTask.Status.PENDING, ConversionTask.Status.PROCESSING),
+    ).update(status=ConversionTask.Status.CANCELLED, error_message=cancelled_message())
+    if not cancelled:
+        return False
+    signal_cancel(task_id)
+    cancel_pending_shards(task_id)
+    logger.info("Task %d cancelled", task_id)
+    return True
+
+
 def _process_task(task_id: int, retry_failed_only: bool = False) -> None:
     """Execute the pipeline: PDF -> images -> vision API -> .md file.
 
@@ -52,22 +174,91 @@ def _process_task(task_id: int, retry_failed_only: bool = False) -> None:
     except ConversionTask.DoesNotExist:
         logger.error("Task %d not found — aborting", task_id)
         return
+    if task.status == ConversionTask.Status.CANCELLED and not retry_failed_only:
+        logger.info("Task %d was cancelled before it started", task_id)
+        task_finished(task_id)
+        return
+
+    # Retrying failed pages re-transcribes only those pages, so it stays on one thread
+    if not (retry_failed_only and task.failed_pages and task.page_results):
+        try:
+            sharded = should_shard(task)
+        except Exception as exc:
+            logger.exception("Task %d: could not read page range", task_id)
+            task.status = ConversionTask.Status.FAILED
+            task.error_message = str(exc)
+            task.save(update_fields=["status", "error_message"])
+            task_finished(task_id)
+            return
+        if sharded:
+            if task.profile_requested:
+                # Callers check profiling_supported() first; SHARD_SIZE may have changed since
+                logger.warning("Task %d is sharded and cannot be profiled; running unprofiled", task_id)
+                task.profile_requested = False
+                task.save(update_fields=["profile_requested"])
+            _run_sharded(task)
+            return
+
+    if not should_profile(task):
+        _run_pipeline(task, retry_failed_only)
+        return
+    if task.profile_requested:
+        # One-shot: a later retry is not profiled unless requested again
+        task.profile_requested = False
+        task.save(update_fields=["profile_requested"])
+    with profile_task(task):
+        _run_pipeline(task, retry_failed_only)
+
+
+def _run_pipeline(task: ConversionTask, retry_failed_only: bool) -> None:
+    """Run the conversion for an already-loaded *task* (see ``_process_task``)."""
+    with cancel_scope(task.pk) as cancel:
+        _run_cancellable_pipeline(task, retry_failed_only, cancel)
+
 
-    backend, openai_model, gemini_model = get_effective_vision_config()
+def _run_cancellable_pipeline(
+    task: ConversionTask, retry_failed_only: bool, cancel: threading.Event
+) -> None:
+    task_id = task.pk
+
+    # Snapshot once: the whole task uses one backend/model even if settings change
+    config = get_effective_vision_config()
+    # Conditional on the status we loaded, so a cancel in between is not overwritten
+    started = ConversionTask.objects.filter(pk=task_id, status=task.status).update(
+        status=ConversionTask.Status.PROCESSING,
+        vision_backend=config.backend,
+        vision_model=config.model,
+        updated_at=timezone.now(),
+    )
+    if not started:
+        logger.info("Task %d was cancelled before it started", task_id)
+        task_finished(task_id)
+        return
     task.status = ConversionTask.Status.PROCESSING
-    task.vision_backend = backend
-    task.vision_model = openai_model if backend == "openai" else gemini_model
-    task.save(update_fields=["status", "vision_backend", "vision_model"])
+    task.vision_backend = config.backend
+    task.vision_model = config.model
 
     start = time.time()
+    origin = time.perf_counter()
+    stages = {"render_ms": 0.0, "transcribe_ms": 0.0, "progress_db_ms": 0.0, "index_ms": 0.0}
+    render_metrics: list[dict] = []
+    call_metrics: dict[int, dict] = {}
+    telemetry.TASKS_IN_PROGRESS.inc()
 
     try:
         # 1. PDF -> base64 images
+        render_offset = time.perf_counter()
+        text_layers: list[dict] | None = [] if cascade_enabled(config) else None
         images, page_count = pdf_to_base64_images(
             task.pdf_file.path,
             start_page=task.start_page,
             end_page=task.end_page,
+            page_metrics=render_metrics,
+            text_layers=text_layers,
         )
+        stages["render_ms"] = (time.perf_counter() - render_offset) * 1000
+        for page in render_metrics:
+            telemetry.RENDER_SECONDS.observe((page["render_ms"] + page["encode_ms"]) / 1000)
         task.page_count = page_count
         task.save(update_fields=["page_count"])
 
@@ -86,12 +277,21 @@ def _process_task(task_id: int, retry_failed_only: bool = False) -> None:
             task.pages_processed = initial_processed
             task.save(update_fields=["pages_processed"])
             failed_pages = []
-            _, subset_results = transcribe_images_to_markdown(
+            transcribe_offset = time.perf_counter()
+            _, subset_results = transcribe_with_cascade(
                 images,
                 task.prompt,
-                on_page_done=_make_progress_callback(task_id, initial=initial_processed),
+                text_layers,
+                on_page_done=_make_progress_callback(
+                    task_id, initial=initial_processed, timings=stages, cancel=cancel
+                ),
                 failed_pages=failed_pages,
                 indices_to_process=failed_indices,
+                on_page_result=_make_index_callback(task_id, timings=stages),
+                config=config,
+                page_metrics=call_metrics,
+                flow=task_flow(task),
+                cancel_event=cancel,
             )
             for i, idx in enumerate(failed_indices):
                 if i < len(subset_results):
@@ -100,27 +300,67 @@ def _process_task(task_id: int, retry_failed_only: bool = False) -> None:
         else:
             # Full run
             failed_pages = []
-            markdown_text, page_results = transcribe_images_to_markdown(
+            transcribe_offset = time.perf_counter()
+            markdown_text, page_results = transcribe_with_cascade(
                 images,
                 task.prompt,
-                on_page_done=_make_progress_callback(task_id),
+                text_layers,
+                on_page_done=_make_progress_callback(task_id, timings=stages, cancel=cancel),
                 failed_pages=failed_pages,
+                on_page_result=_make_index_callback(task_id, timings=stages),
+                config=config,
+                page_metrics=call_metrics,
+                flow=task_flow(task),
+                cancel_event=cancel,
             )
+        stages["transcribe_ms"] = (time.perf_counter() - transcribe_offset) * 1000
+        if _was_deleted(task_id, cancel):
+            return
 
         # 3. Save Markdown file and per-page results
-        task.markdown_file.save(
-            task.markdown_filename,
-            ContentFile(markdown_text.encode("utf-8")),
-            save=False,
+        write_start = time.perf_counter()
+        output_name, output_bytes = output_file_content(
+            task.markdown_filename, markdown_text
         )
+        task.markdown_file.save(output_name, ContentFile(output_bytes), save=False)
+        stages["write_ms"] = (time.perf_counter() - write_start) * 1000
 
         task.processing_time_seconds = time.time() - start
-        task.failed_pages = failed_pages
+        task.set_failed_pages(failed_pages)
         task.page_results = page_results
+        stages["total_ms"] = (time.perf_counter() - origin) * 1000
+        run_metrics = build_task_metrics(
+            render_metrics,
+            call_metrics,
+            stages,
+            render_offset_ms=(render_offset - origin) * 1000,
+            transcribe_offset_ms=(transcribe_offset - origin) * 1000,
+        )
+        task.metrics = (
+            merge_task_metrics(task.metrics, run_metrics) if failed_indices else run_metrics
+        )
 
         # Document status: all pages failed -> FAILED; some failed -> Partially OK
         total_pages = len(images)
-        if total_pages and len(failed_pages) >= total_pages:
+        if cancel.is_set():
+            # Keep what was transcribed; "Retry" re-runs the cancelled pages
+            task.status = ConversionTask.Status.CANCELLED
+            task.error_message = cancelled_message(task.failed_page_count, total_pages)
+            task.save(
+                update_fields=[
+                    "markdown_file",
+                    "status",
+                    "error_message",
+                    "processing_time_seconds",
+                    "failed_pages",
+                    "failed_page_count",
+                    "page_results",
+                    "metrics",
+                    # Part of the result page's cache keys
+                    "updated_at",
+                ]
+            )
+        elif total_pages and len(failed_pages) >= total_pages:
             task.status = ConversionTask.Status.FAILED
             task.error_message = "All pages failed transcription."
             task.save(
@@ -130,7 +370,10 @@ def _process_task(task_id: int, retry_failed_only: bool = False) -> None:
                     "error_message",
                     "processing_time_seconds",
                     "failed_pages",
+                    "failed_page_count",
                     "page_results",
+                    "metrics",
+                    "updated_at",
                 ]
             )
         else:
@@ -144,31 +387,116 @@ def _process_task(task_id: int, retry_failed_only: bool = False) -> None:
                     "status",
                     "processing_time_seconds",
                     "failed_pages",
+                    "failed_page_count",
                     "page_results",
+                    "metrics",
+                    "updated_at",
                 ]
             )
+        # Retries merge new pages into the same task: drop stale cached HTML
+        invalidate_task_render(task_id)
+        telemetry.TASKS_FINISHED.inc(status=task.status)
         logger.info("Task %d completed in %.1fs", task_id, task.processing_time_seconds)
+        task_finished(task_id)
 
     except Exception as exc:
+        if _was_deleted(task_id, cancel):
+            return
         logger.exception("Task %d failed", task_id)
-        task.status = ConversionTask.Status.FAILED
         task.error_message = str(exc)
         task.processing_time_seconds = time.time() - start
-        task.save(
-            update_fields=["status", "error_message", "processing_time_seconds"]
+        # Conditional, so a cancel that landed meanwhile is not overwritten
+        failed = ConversionTask.objects.filter(
+            pk=task_id, status=ConversionTask.Status.PROCESSING
+        ).update(
+            status=ConversionTask.Status.FAILED,
+            error_message=task.error_message,
+            processing_time_seconds=task.processing_time_seconds,
+            updated_at=timezone.now(),
+        )
+        if failed:
+            task.status = ConversionTask.Status.FAILED
+            telemetry.TASKS_FINISHED.inc(status=task.status)
+        else:
+            logger.info("Task %d was no longer processing; keeping its status", task_id)
+        task_finished(task_id)
+    finally:
+        telemetry.TASKS_IN_PROGRESS.dec()
+
+
+def _was_deleted(task_id: int, cancel: threading.Event) -> bool:
+    """True (and logged) if the task row was deleted while it was running."""
+    if not cancel.is_set() or ConversionTask.objects.filter(pk=task_id).exists():
+        return False
+    logger.info("Task %d was deleted while running; discarding its result", task_id)
+    return True
+
+
+def _run_sharded(task: ConversionTask) -> None:
+    """Split *task* into shards and work on them with ``SHARD_LOCAL_WORKERS`` threads.
+
+    Shards not taken by the local threads are left to ``manage.py shard_worker``
+    processes; whichever worker finishes the last shard merges the result.
+    """
+    plan_shards(task, get_effective_vision_config())
+    workers = [
+        threading.Thread(
+            target=run_worker,
+            kwargs={"task_id": task.pk},
+            daemon=True,
+            name=f"converter-task-{task.pk}-shard-{n}",
         )
+        for n in range(1, getattr(settings, "SHARD_LOCAL_WORKERS", 2))
+    ]
+    for thread in workers:
+        thread.start()
+    if getattr(settings, "SHARD_LOCAL_WORKERS", 2) > 0:
+        run_worker(task_id=task.pk)
+    for thread in workers:
+        thread.join()
 
 
-def _make_progress_callback(task_id: int, initial: int = 0):
-    """Return a thread-safe callback that sets pages_processed = initial + n."""
+def _make_progress_callback(
+    task_id: int,
+    initial: int = 0,
+    timings: dict | None = None,
+    cancel: threading.Event | None = None,
+):
+    """Return a thread-safe callback that sets pages_processed = initial + n.
+
+    Time spent in the DB update is added to ``timings["progress_db_ms"]``.
+    If the task is no longer processing (cancelled or deleted, possibly from
+    another process), *cancel* is set.
+    """
     lock = threading.Lock()
     counter = {"n": 0}
 
     def callback(page_idx: int) -> None:
         with lock:
+            t0 = time.perf_counter()
             counter["n"] += 1
-            ConversionTask.objects.filter(pk=task_id).update(
-                pages_processed=initial + counter["n"]
-            )
+            # updated_at doubles as the heartbeat claim_abandoned_run() checks
+            updated = ConversionTask.objects.filter(
+                pk=task_id, status=ConversionTask.Status.PROCESSING
+            ).update(pages_processed=initial + counter["n"], updated_at=timezone.now())
+            if not updated and cancel is not None:
+                cancel.set()
+            if timings is not None:
+                timings["progress_db_ms"] += (time.perf_counter() - t0) * 1000
+
+    return callback
+
+
+def _make_index_callback(task_id: int, timings: dict | None = None):
+    """Return a callback that adds each finished page to the content search index.
+
+    Time spent indexing is added to ``timings["index_ms"]``.
+    """
+
+    def callback(page_idx: int, markdown_text: str) -> None:
+        t0 = time.perf_counter()
+        index_task_pages(task_id, {page_idx + 1: markdown_text})
+        if timings is not None:
+            timings["index_ms"] += (time.perf_counter() - t0) * 1000
 
     return callback
@@ -0,0 +1,206 @@
+"""Opt-in profiling of conversion tasks.
+
+A task is profiled when ``ConversionTask.profile_requested`` is set or it is
+picked by ``PROFILE_SAMPLE_RATE``. The pipeline then runs under:
+
+- ``cProfile`` on the orchestrating thread (rendering, DB writes, merging),
+- a statistical stack sampler over *all* threads (including the vision
+  worker threads), every ``PROFILE_SAMPLE_INTERVAL_MS``,
+- ``tracemalloc`` for allocation sites and peak traced memory.
+
+The results are zipped and stored in ``ConversionTask.profile_file``
+(downloadable from the admin). Unprofiled tasks never enter this module
+beyond ``should_profile()``, so they pay no overhead.
+
+Only one task is profiled at a time per process: tracemalloc is global and
+concurrent profiles would blur each other. A task picked while another is
+being profiled runs unprofiled.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+_active = threading.Lock()
+
+
+# ── Public API ────────────────────────────────────────────────
+
+
+def should_profile(task) -> bool:
+    """True if *task* asked for profiling or is picked by ``PROFILE_SAMPLE_RATE``."""
+    if task.profile_requested:
+        return True
+    rate = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+    return rate > 0 and random.random() < rate
+
+
+@contextlib.contextmanager
+def profile_task(task):
+    """Profile the enclosed block and attach the artifacts to *task*."""
+    if not _active.acquire(blocking=False):
+        logger.warning("Task %d: another task is being profiled, running unprofiled", task.pk)
+        yield
+        return
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(getattr(settings, "PROFILE_TRACEMALLOC_FRAMES", 10))
+    tracemalloc.reset_peak()
+    sampler = _StackSampler(getattr(settings, "PROFILE_SAMPLE_INTERVAL_MS", 5) / 1000)
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        elapsed = time.perf_counter() - start
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_tracemalloc:
+                tracemalloc.stop()
+            _active.release()
+        try:
+            _save_artifacts(task, profiler, sampler, snapshot, current, peak, elapsed)
+        except Exception:
+            logger.exception("Task %d: could not save profile", task.pk)
+
+
+# ── Artifacts ─────────────────────────────────────────────────
+
+
+def _save_artifacts(task, profiler, sampler, snapshot, current, peak, elapsed) -> None:
+    from converter.models import ConversionTask
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("summary.txt", _summary(task, sampler, current, peak, elapsed))
+        zf.writestr("cprofile.txt", _pstats_text(profiler))
+        # Binary stats for snakeviz / `python -m pstats` (what dump_stats() writes)
+        profiler.create_stats()
+        zf.writestr("cprofile.prof", marshal.dumps(profiler.stats))
+        zf.writestr("samples.folded", sampler.folded())
+        zf.writestr("memory.txt", _memory_text(snapshot, current, peak))
+
+    name = f"task-{task.pk}-{time.strftime('%Y%m%d-%H%M%S')}.zip"
+    task.profile_file.save(name, ContentFile(buf.getvalue()), save=False)
+    ConversionTask.objects.filter(pk=task.pk).update(profile_file=task.profile_file.name)
+    logger.info("Task %d: profile saved to %s", task.pk, task.profile_file.name)
+
+
+def _summary(task, sampler, current, peak, elapsed) -> str:
+    lines = [
+        f"Task {task.pk}: {task.original_filename}",
+        f"Wall time: {elapsed:.2f}s",
+        f"Stack samples: {sampler.samples} (interval {sampler.interval * 1000:.0f} ms)",
+        f"Traced memory: {current / 1048576:.1f} MiB at end, {peak / 1048576:.1f} MiB peak",
+        "",
+        "Top functions by samples (self, all threads):",
+    ]
+    for frame, count in sampler.top_self(25):
+        lines.append(f"  {count:7d}  {frame}")
+    return "\n".join(lines) + "\n"
+
+
+def _pstats_text(profiler) -> str:
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(60)
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(30)
+    return out.getvalue()
+
+
+def _memory_text(snapshot, current, peak) -> str:
+    lines = [
+        f"Traced memory at end: {current / 1048576:.1f} MiB",
+        f"Peak traced memory:   {peak / 1048576:.1f} MiB",
+        "",
+        "Top allocation sites still alive at end (by size):",
+    ]
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        )
+    )
+    for stat in snapshot.statistics("lineno")[:30]:
+        frame = stat.traceback[0]
+        lines.append(f"  {stat.size / 1024:10.1f} KiB  {stat.count:7d} blocks  {frame.filename}:{frame.lineno}")
+    lines += ["", "Largest tracebacks:"]
+    for stat in snapshot.statistics("traceback")[:5]:
+        lines.append(f"  {stat.size / 1024:.1f} KiB in {stat.count} blocks")
+        lines.extend(f"    {line}" for line in stat.traceback.format())
+    return "\n".join(lines) + "\n"
+
+
+# ── Statistical sampler ───────────────────────────────────────
+
+
+class _StackSampler:
+    """Periodically record the Python stack of every thread.
+
+    Stacks are kept in collapsed form (``thread;outer;...;inner``) for
+    flame graph tools such as speedscope or ``flamegraph.pl``.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = max(interval, 0.001)
+        self.samples = 0
+        self._stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="profile-sampler")
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            names.update({t.ident: t.name for t in threading.enumerate()})
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def top_self(self, n: int) -> list[tuple[str, int]]:
+        leaves: Counter[str] = Counter()
+        for stack, count in self._stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
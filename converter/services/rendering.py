@@ -0,0 +1,294 @@
+"""Markdown → HTML rendering for the result page, cached per page.
+
+Rendering a long document with python-markdown costs seconds of CPU, so each
+page is rendered once and stored in Django's cache.  Keys combine the task,
+a per-task render version (bumped by ``invalidate_task_render()`` when a
+retry merges new pages), a hash of the page Markdown and the page's
+failed-page state.
+
+Pages are rendered separately, so two things differ from rendering the
+joined document: heading ids are prefixed with the page (``p3-summary``) so
+they stay unique across pages, and a fenced code block or table cut by a
+page break is closed at the end of the page and reopened (fence line, or the
+table's header row) at the start of the next one.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import logging
+import re
+from typing import NamedTuple
+
+import markdown as md
+from markdown.extensions.toc import slugify
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from . import telemetry
+from .compression import read_output_file
+from .vision import FAILED_PAGE_PLACEHOLDER_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+MARKDOWN_EXTENSIONS = ["tables", "fenced_code", "toc"]
+
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})(.*)$")
+_TABLE_ROW = re.compile(r"^\s*\|")
+_TABLE_DELIMITER = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+
+_VERSION_KEY = "converter:render-version:{}"
+_PAGE_KEY = "converter:render:{}:{}:{}"
+# Per-page Markdown (task, version, content stamp, page) and page count (task,
+# version, content stamp), so fetching one page does not load and decompress
+# every page of the task. The stamp changes whenever a run saves results, so
+# an evicted version counter cannot bring back pages cached before a retry.
+_SOURCE_KEY = "converter:page-source:{}:{}:{}:{}"
+_TOTAL_KEY = "converter:page-total:{}:{}:{}"
+
+
+class TaskPage(NamedTuple):
+    markdown: str
+    html: str
+    total: int
+
+
+# ── Public API ────────────────────────────────────────────────
+
+
+def task_pages_markdown(task) -> list[str]:
+    """Return the per-page Markdown of *task*.
+
+    Tasks created before per-page results were stored only have the ``.md``
+    file; for those the whole document is returned as a single page.
+    """
+    page_results = getattr(task, "page_results", None) or []
+    if page_results:
+        return [p or "" for p in page_results]
+    if not task.markdown_file:
+        return []
+    return [read_output_file(task.markdown_file)]
+
+
+def render_task_pages(task, pages: list[str] | None = None) -> list[str]:
+    """Return rendered HTML for each page of *task*, using the cache.
+
+    Args:
+        task: The ``ConversionTask`` to render.
+        pages: Optional per-page Markdown (as returned by
+            ``task_pages_markdown()``) when the caller already has it.
+    """
+    if pages is None:
+        pages = task_pages_markdown(task)
+    return _render_pages(task, pages, range(1, len(pages) + 1))
+
+
+def task_page_total(task) -> int:
+    """Number of result pages of *task*; loads its pages only on a cache miss."""
+    version = _render_version(task.pk)
+    total = cache.get(_TOTAL_KEY.format(task.pk, version, _content_stamp(task)))
+    if total is None:
+        total = len(_cache_page_sources(task, version))
+    return total
+
+
+def task_page(task, page_num: int) -> TaskPage | None:
+    """Markdown and rendered HTML of one 1-based page of *task* (None if out of range).
+
+    Pass *task* with ``page_results`` and ``failed_pages`` deferred: they are
+    loaded only when the page sources are not cached, and then cached for
+    every page at once.
+    """
+    version = _render_version(task.pk)
+    stamp = _content_stamp(task)
+    source = cache.get(_SOURCE_KEY.format(task.pk, version, stamp, page_num))
+    if source is None:
+        total = cache.get(_TOTAL_KEY.format(task.pk, version, stamp))
+        if total is not None and not 1 <= page_num <= total:
+            return None
+        sources = _cache_page_sources(task, version)
+        if not 1 <= page_num <= len(sources):
+            return None
+        source = sources[page_num - 1]
+    page_html = _render_sources(task.pk, version, [(page_num, source)])[0]
+    return TaskPage(source["markdown"], page_html, source["total"])
+
+
+def render_task_html(task) -> str:
+    """Return the full rendered HTML document for *task*."""
+    return "\n".join(render_task_pages(task))
+
+
+def invalidate_task_render(task_id: int) -> None:
+    """Drop every cached page rendering of a task (e.g. after a retry merge)."""
+    key = _VERSION_KEY.format(task_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+# ── Helpers ───────────────────────────────────────────────────
+
+
+def _render_version(task_id: int) -> int:
+    return cache.get(_VERSION_KEY.format(task_id)) or 0
+
+
+def _content_stamp(task) -> str:
+    """Short digest of what changes whenever a run saves new results (output file, ``updated_at``)."""
+    updated_at = task.updated_at.isoformat() if task.updated_at else ""
+    return hashlib.sha1(f"{task.markdown_file.name or ''}\0{updated_at}".encode("utf-8")).hexdigest()[:12]
+
+
+def _render_pages(task, pages: list[str], page_nums) -> list[str]:
+    """Render the given 1-based pages, serving cached HTML where possible."""
+    sources = _page_sources(task, pages)
+    return _render_sources(task.pk, _render_version(task.pk), [(n, sources[n - 1]) for n in page_nums])
+
+
+def _page_sources(task, pages: list[str]) -> list[dict]:
+    """What rendering each page needs: its Markdown, completed text and failed-page errors."""
+    errors = _failed_page_errors(task)
+    # A legacy single-page document holds every failed page's placeholder
+    legacy = len(pages) == 1 and not getattr(task, "page_results", None)
+    sources = []
+    for page_num, (markdown_text, (prefix, suffix)) in enumerate(zip(pages, _page_contexts(pages)), start=1):
+        if legacy:
+            page_errors = errors
+        else:
+            page_errors = {page_num: errors[page_num]} if page_num in errors else {}
+        sources.append(
+            {
+                "markdown": markdown_text,
+                "text": prefix + markdown_text + suffix,
+                "errors": page_errors,
+                "total": len(pages),
+            }
+        )
+    return sources
+
+
+def _cache_page_sources(task, version: int) -> list[dict]:
+    sources = _page_sources(task, task_pages_markdown(task))
+    stamp = _content_stamp(task)
+    entries = {_SOURCE_KEY.format(task.pk, version, stamp, n): source for n, source in enumerate(sources, start=1)}
+    entries[_TOTAL_KEY.format(task.pk, version, stamp)] = len(sources)
+    cache.set_many(entries, timeout=settings.RENDER_CACHE_TIMEOUT)
+    return sources
+
+
+def _render_sources(task_id: int, version: int, numbered: list[tuple[int, dict]]) -> list[str]:
+    items = []
+    for page_num, source in numbered:
+        text, page_errors = source["text"], source["errors"]
+        key = _PAGE_KEY.format(task_id, version, _page_digest(f"{page_num}\0{text}", page_errors))
+        items.append((key, page_num, text, page_errors))
+
+    cached = cache.get_many([key for key, _, _, _ in items])
+    rendered: list[str] = []
+    missing: dict[str, str] = {}
+    for key, page_num, text, page_errors in items:
+        page_html = cached.get(key)
+        if page_html is None:
+            page_html = _render_page(task_id, page_num, text, page_errors)
+            missing[key] = page_html
+        rendered.append(page_html)
+
+    telemetry.record_cache("render", len(items) - len(missing), len(missing))
+    if missing:
+        cache.set_many(missing, timeout=settings.RENDER_CACHE_TIMEOUT)
+        logger.debug(
+            "Rendered %d/%d page(s) for task %d", len(missing), len(items), task_id
+        )
+    return rendered
+
+
+def _page_contexts(pages: list[str]) -> list[tuple[str, str]]:
+    """(prefix, suffix) per page that complete fences and tables cut by a page break."""
+    contexts = []
+    fence = None  # (marker, opening line) of a code block still open
+    header: list[str] = []  # header + delimiter rows of a table ending the previous page
+    for text in pages:
+        lines = text.splitlines()
+        prefix = ""
+        if fence:
+            prefix = fence[1] + "\n"
+        elif header and _continues_table(lines):
+            prefix = "\n".join(header) + "\n"
+        for line in lines:
+            match = _FENCE.match(line)
+            if not match:
+                continue
+            marker, rest = match.groups()
+            if fence is None:
+                fence = (marker, line)
+            elif marker[0] == fence[0][0] and len(marker) >= len(fence[0]) and not rest.strip():
+                fence = None
+        suffix = "\n" + fence[0] + "\n" if fence else ""
+        # A page that only continues the table passes the header on through its prefix
+        header = [] if fence else _trailing_table_header((prefix + text).splitlines())
+        contexts.append((prefix, suffix))
+    return contexts
+
+
+def _continues_table(lines: list[str]) -> bool:
+    """True if a page starts with table rows that have no header of their own."""
+    body = [line for line in lines if line.strip()][:2]
+    return bool(body) and _TABLE_ROW.match(body[0]) is not None and not (
+        len(body) > 1 and _TABLE_DELIMITER.match(body[1])
+    )
+
+
+def _trailing_table_header(lines: list[str]) -> list[str]:
+    """Header and delimiter rows of the table that ends the page, if one does."""
+    body = [line for line in lines if line.strip()]
+    start = len(body)
+    while start and _TABLE_ROW.match(body[start - 1]):
+        start -= 1
+    table = body[start:]
+    if len(table) >= 2 and _TABLE_DELIMITER.match(table[1]):
+        return table[:2]
+    return []
+
+
+def _failed_page_errors(task) -> dict[int, str]:
+    """Map failed page number -> error message from ``task.failed_pages``."""
+    errors: dict[int, str] = {}
+    for fp in getattr(task, "failed_pages", None) or []:
+        page_num = fp.get("page")
+        if page_num is not None:
+            errors[page_num] = fp.get("error", "Unknown error")
+    return errors
+
+
+def _page_digest(text: str, page_errors: dict[int, str]) -> str:
+    h = hashlib.sha256(text.encode("utf-8"))
+    for page_num in sorted(page_errors):
+        h.update(f"\0{page_num}\0{page_errors[page_num]}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _render_page(task_id: int, page_num: int, text: str, page_errors: dict[int, str]) -> str:
+    """Render one page, replacing transcription-failed placeholders with error UI."""
+    retry_url = reverse("converter:retry_task", kwargs={"pk": task_id})
+    # Not page_num: the slugify below still needs this page's number
+    for err_page, err_msg in page_errors.items():
+        placeholder = FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(err_page)
+        safe_error = html.escape(err_msg)
+        replacement = (
+            f'<div class="transcription-failed-box" data-page="{err_page}">'
+            f'<p class="transcription-failed-title">Page {err_page}: transcription failed</p>'
+            f'<pre class="transcription-failed-error">{safe_error}</pre>'
+            f'<a href="{retry_url}" class="transcription-failed-retry">Retry conversion</a>'
+            "</div>"
+        )
+        text = text.replace(placeholder, replacement, 1)
+    # Page-scoped heading ids: python-markdown only de-duplicates them within one call
+    return md.markdown(
+        text,
+        extensions=MARKDOWN_EXTENSIONS,
+        extension_configs={"toc": {"slugify": lambda value, sep: f"p{page_num}-" + slugify(value, sep)}},
+    )
@@ -0,0 +1,282 @@
+"""Process-wide page scheduler shared by all running tasks.
+
+Instead of every task opening its own thread pool, page transcriptions are
+submitted to one ``PageScheduler`` with ``SCHEDULER_WORKERS`` threads. Each
+task is a *flow*; whenever a worker frees up, the scheduler starts the next
+page of the flow that is furthest behind its fair share (start-time fair
+queuing):
+
+- every flow has a virtual ``pass``; starting one of its pages advances it by
+  ``1 / weight``, and the flow with the lowest pass goes next;
+- a flow's weight comes from its task's priority (``SCHEDULER_PRIORITY_WEIGHTS``)
+  and is divided among the active flows of the same owner, so with
+  ``SCHEDULER_FAIR_SHARE=submitter`` a submitter with ten tasks gets the same
+  share as one with a single task;
+- a flow that becomes active starts at the current virtual time, so a small
+  upload is served right away instead of queuing behind a large one.
+
+A flow never has more than ``VISION_MAX_WORKERS`` pages in flight.
+``SCHEDULER_WORKERS=0`` disables the scheduler and restores one thread pool
+per task.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Same values as ConversionTask.Priority
+PRIORITY_LOW = -1
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 1
+
+DEFAULT_PRIORITY_WEIGHTS = {PRIORITY_LOW: 1, PRIORITY_NORMAL: 4, PRIORITY_HIGH: 16}
+
+_anonymous_ids = itertools.count(1)
+
+
+class PageFlow(NamedTuple):
+    """Identifies whose pages these are: scheduling key, fair-share owner and priority."""
+
+    key: str
+    owner: str
+    priority: int = PRIORITY_NORMAL
+
+
+def task_flow(task) -> PageFlow:
+    """Return the flow for a ConversionTask's pages."""
+    key = f"task:{task.pk}"
+    owner = key
+    if getattr(settings, "SCHEDULER_FAIR_SHARE", "task") == "submitter" and task.submitter:
+        owner = f"submitter:{task.submitter}"
+    return PageFlow(key, owner, task.priority)
+
+
+def anonymous_flow() -> PageFlow:
+    """A flow of its own, for callers that are not processing a task."""
+    key = f"call:{next(_anonymous_ids)}"
+    return PageFlow(key, key)
+
+
+def priority_weight(priority: int) -> float:
+    weights = getattr(settings, "SCHEDULER_PRIORITY_WEIGHTS", None) or DEFAULT_PRIORITY_WEIGHTS
+    return float(weights.get(priority, weights.get(PRIORITY_NORMAL, 1)))
+
+
+# ── Scheduler ─────────────────────────────────────────────────
+
+
+class _Job(NamedTuple):
+    future: Future
+    fn: Callable
+    args: tuple
+
+
+class _Flow:
+    def __init__(self, flow: PageFlow, max_in_flight: int):
+        self.key = flow.key
+        self.owner = flow.owner
+        self.priority = flow.priority
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue: deque[_Job] = deque()
+        self.in_flight = 0
+        self.vpass = 0.0
+        self.started = 0
+
+    @property
+    def runnable(self) -> bool:
+        return bool(self.queue) and self.in_flight < self.max_in_flight
+
+    @property
+    def idle(self) -> bool:
+        return not self.queue and not self.in_flight
+
+
+class PageScheduler:
+    """Fair-share dispatcher of page jobs onto a fixed set of worker threads."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._flows: dict[str, _Flow] = {}
+        self._vtime = 0.0
+        self._threads: list[threading.Thread] = []
+        self._running: dict[Future, _Flow] = {}
+        self._abandoned: set[Future] = set()
+        # Threads still busy with abandoned calls, on top of ``workers``
+        self._surplus = 0
+
+    def submit(
+        self, flow: PageFlow, fn: Callable, *args, max_in_flight: int = 4, front: bool = False
+    ) -> Future:
+        """Queue ``fn(*args)`` for *flow* and return a Future for its result.
+
+        With *front*, the job goes ahead of the flow's other queued jobs.
+        """
+        future: Future = Future()
+        with self._cond:
+            self._ensure_threads()
+            state = self._flows.get(flow.key)
+            if state is None:
+                state = self._flows[flow.key] = _Flow(flow, max_in_flight)
+            if state.idle:
+                # (Re)joining flows start at the current virtual time: no banked credit
+                state.vpass = max(state.vpass, self._vtime)
+            job = _Job(future, fn, args)
+            if front:
+                state.queue.appendleft(job)
+            else:
+                state.queue.append(job)
+            self._cond.notify()
+        return future
+
+    def set_priority(self, key: str, priority: int) -> int:
+        """Change the priority of flow *key* and its sub-flows (``key:...``); return how many."""
+        with self._cond:
+            changed = 0
+            for state in self._flows.values():
+                if state.key == key or state.key.startswith(key + ":"):
+                    state.priority = priority
+                    changed += 1
+            return changed
+
+    def cancel(self, key: str) -> int:
+        """Cancel the queued (not yet started) pages of flow *key* and its sub-flows."""
+        jobs: list[_Job] = []
+        with self._cond:
+            for state in list(self._flows.values()):
+                if state.key == key or state.key.startswith(key + ":"):
+                    jobs.extend(state.queue)
+                    state.queue.clear()
+                    self._forget_if_idle(state)
+        cancelled = 0
+        for job in jobs:
+            if job.future.cancel():
+                # Nobody will start these jobs: wake wait()/as_completed() callers
+                job.future.set_running_or_notify_cancel()
+                cancelled += 1
+        return cancelled
+
+    def abandon(self, futures) -> None:
+        """Stop waiting for running jobs: free their flow slots and add a replacement worker each.
+
+        The abandoned calls keep running to completion in the background; their
+        threads exit afterwards, so the pool returns to ``workers`` threads.
+        """
+        with self._cond:
+            for future in futures:
+                state = self._running.get(future)
+                if state is None or future in self._abandoned:
+                    continue
+                self._abandoned.add(future)
+                state.in_flight -= 1
+                self._forget_if_idle(state)
+                self._surplus += 1
+            self._ensure_threads()
+            self._cond.notify_all()
+
+    def stats(self) -> list[dict]:
+        """Active flows, highest priority first, for display."""
+        with self._cond:
+            rows = [
+                {
+                    "key": s.key,
+                    "owner": s.owner,
+                    "priority": s.priority,
+                    "queued": len(s.queue),
+                    "in_flight": s.in_flight,
+                    "started": s.started,
+                }
+                for s in self._flows.values()
+            ]
+        return sorted(rows, key=lambda r: (-r["priority"], r["key"]))
+
+    # ── Internals ─────────────────────────────────────────────
+
+    def _ensure_threads(self) -> None:
+        self._threads = [t for t in self._threads if t.is_alive()]
+        for n in range(len(self._threads), self.workers + self._surplus):
+            thread = threading.Thread(target=self._work, daemon=True, name=f"page-scheduler-{n}")
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_job(self) -> tuple[_Flow, _Job]:
+        """Block until a job can start; caller holds ``self._cond``."""
+        while True:
+            runnable = [s for s in self._flows.values() if s.runnable]
+            if runnable:
+                owners: dict[str, int] = {}
+                for state in self._flows.values():
+                    owners[state.owner] = owners.get(state.owner, 0) + 1
+                state = min(runnable, key=lambda s: (s.vpass, s.key))
+                job = state.queue.popleft()
+                if not job.future.set_running_or_notify_cancel():
+                    self._forget_if_idle(state)
+                    continue
+                self._vtime = state.vpass
+                state.vpass += owners[state.owner] / priority_weight(state.priority)
+                state.in_flight += 1
+                state.started += 1
+                self._running[job.future] = state
+                return state, job
+            self._cond.wait()
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                state, job = self._next_job()
+            try:
+                result = job.fn(*job.args)
+            except BaseException as exc:
+                job.future.set_exception(exc)
+            else:
+                job.future.set_result(result)
+            with self._cond:
+                del self._running[job.future]
+                if job.future in self._abandoned:
+                    # A replacement was started when this call was abandoned
+                    self._abandoned.discard(job.future)
+                    self._surplus -= 1
+                    self._threads.remove(threading.current_thread())
+                    return
+                state.in_flight -= 1
+                self._forget_if_idle(state)
+                self._cond.notify()
+
+    def _forget_if_idle(self, state: _Flow) -> None:
+        if state.idle and self._flows.get(state.key) is state:
+            del self._flows[state.key]
+
+
+_scheduler_lock = threading.Lock()
+_scheduler: dict = {"instance": None, "pid": None}
+
+
+def get_scheduler() -> PageScheduler | None:
+    """Return this process's scheduler, or None when ``SCHEDULER_WORKERS`` is 0."""
+    workers = getattr(settings, "SCHEDULER_WORKERS", 8)
+    if workers <= 0:
+        return None
+    with _scheduler_lock:
+        # After a fork the parent's worker threads do not exist in the child
+        if _scheduler["pid"] != os.getpid() or _scheduler["instance"].workers != workers:
+            _scheduler["instance"] = PageScheduler(workers)
+            _scheduler["pid"] = os.getpid()
+            logger.info("Page scheduler started with %d worker(s)", workers)
+        return _scheduler["instance"]
+
+
+def set_task_priority(task_id: int, priority: int) -> None:
+    """Apply a task's new priority to its pages still waiting in this process."""
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        scheduler.set_priority(f"task:{task_id}", priority)
@@ -0,0 +1,317 @@
+"""Search over conversion tasks: filenames and transcribed page content.
+
+Filename search uses a trigram index so substring matches stay fast on
+large histories: an FTS5 ``trigram`` table on SQLite (kept in sync by the
+signals in ``converter.signals``) or a ``pg_trgm`` GIN index on PostgreSQL,
+which ``__icontains`` uses directly.  Both are created by migration 0006;
+when unavailable, search falls back to a plain ``__icontains`` scan.
+
+Content search goes through a pluggable ``SearchBackend`` chosen by the
+``SEARCH_BACKEND`` setting.  The default on SQLite is ``SQLiteFTSBackend``
+(an FTS5 table created by migration 0007); other databases fall back to
+``PageResultsScanBackend``, a substring scan over uncompressed ``PageText``
+copies.  Pages are indexed as they finish transcribing.
+"""
+
+from __future__ import annotations
+
+import html
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+FILENAME_FTS_TABLE = "converter_filename_fts"
+PAGE_FTS_TABLE = "converter_page_fts"
+
+# Page rows are keyed by rowid = task_id << _PAGE_BITS | page, so a task's
+# pages form one contiguous rowid range (cheap to delete or replace).
+_PAGE_BITS = 20
+
+# The trigram tokenizer cannot match queries shorter than one trigram
+_MIN_TRIGRAM_QUERY = 3
+
+# Tables of each SQLite database, as (time read, names). Re-read after
+# _FTS_TABLES_TTL seconds, after a migration in this process, and when an FTS
+# statement fails, so tables created or dropped by another process are noticed.
+_FTS_TABLES_TTL = 60.0
+_fts_tables: dict[str, tuple[float, set[str]]] = {}
+
+
+# ── Filename search ───────────────────────────────────────────
+
+
+def filter_by_filename(queryset, query: str):
+    """Filter *queryset* to tasks whose filename contains *query* (case-insensitive)."""
+    if len(query) >= _MIN_TRIGRAM_QUERY and _fts_table_exists(FILENAME_FTS_TABLE):
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FILENAME_FTS_TABLE} "
+                f"WHERE {FILENAME_FTS_TABLE} MATCH %s",
+                [_fts_phrase(query)],
+            )
+        )
+    return queryset.filter(original_filename__icontains=query)
+
+
+def index_filename(task_id: int, filename: str) -> None:
+    """Add or replace a task's filename in the trigram index (SQLite only)."""
+    if not _fts_table_exists(FILENAME_FTS_TABLE):
+        return
+    with _fts_statement(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FILENAME_FTS_TABLE} WHERE rowid = %s", [task_id])
+        cursor.execute(
+            f"INSERT INTO {FILENAME_FTS_TABLE}(rowid, original_filename) VALUES (%s, %s)",
+            [task_id, filename],
+        )
+
+
+def unindex_filename(task_id: int) -> None:
+    """Remove a task from the filename index."""
+    if not _fts_table_exists(FILENAME_FTS_TABLE):
+        return
+    with _fts_statement(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FILENAME_FTS_TABLE} WHERE rowid = %s", [task_id])
+
+
+# ── Content search ────────────────────────────────────────────
+
+
+@dataclass
+class SearchHit:
+    """One matching page. Lower ``rank`` is a better match."""
+
+    task_id: int
+    page: int
+    snippet: str
+    rank: float
+
+
+class SearchBackend(ABC):
+    """Interface for full-text indexes over per-page transcriptions."""
+
+    @abstractmethod
+    def index_pages(self, task_id: int, pages: dict[int, str]) -> None:
+        """Add or replace pages (1-based page number -> Markdown) of a task."""
+
+    @abstractmethod
+    def delete_task(self, task_id: int) -> None:
+        """Remove every indexed page of a task."""
+
+    @abstractmethod
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> list[SearchHit]:
+        """Return the best-matching pages of finished tasks for *query*; snippets are safe HTML."""
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 index with bm25 ranking and highlighted snippets."""
+
+    snippet_tokens = 16
+
+    def index_pages(self, task_id: int, pages: dict[int, str]) -> None:
+        if not pages or not _fts_table_exists(PAGE_FTS_TABLE):
+            return
+        with _fts_statement(), connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {PAGE_FTS_TABLE} WHERE rowid = %s",
+                [(_page_rowid(task_id, page),) for page in pages],
+            )
+            cursor.executemany(
+                f"INSERT INTO {PAGE_FTS_TABLE}(rowid, body) VALUES (%s, %s)",
+                [(_page_rowid(task_id, page), text) for page, text in pages.items()],
+            )
+
+    def delete_task(self, task_id: int) -> None:
+        if not _fts_table_exists(PAGE_FTS_TABLE):
+            return
+        with _fts_statement(), connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {PAGE_FTS_TABLE} WHERE rowid BETWEEN %s AND %s",
+                [_page_rowid(task_id, 0), _page_rowid(task_id + 1, 0) - 1],
+            )
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> list[SearchHit]:
+        match = _fts_terms(query)
+        if not match or not _fts_table_exists(PAGE_FTS_TABLE):
+            return []
+        from converter.models import ConversionTask
+
+        statuses = _searchable_statuses()
+        with _fts_statement(), connection.cursor() as cursor:
+            # \x02 / \x03 mark highlights so the text can be escaped first.
+            # Status is filtered before LIMIT so pages hold `limit` shown hits.
+            cursor.execute(
+                f"SELECT rowid, snippet({PAGE_FTS_TABLE}, 0, char(2), char(3), '…', %s), rank "
+                f"FROM {PAGE_FTS_TABLE} WHERE {PAGE_FTS_TABLE} MATCH %s "
+                f"AND (rowid >> {_PAGE_BITS}) IN ("
+                f"SELECT id FROM {ConversionTask._meta.db_table} "
+                f"WHERE status IN ({', '.join(['%s'] * len(statuses))})) "
+                "ORDER BY rank LIMIT %s OFFSET %s",
+                [self.snippet_tokens, match, *statuses, limit, offset],
+            )
+            rows = cursor.fetchall()
+        return [
+            SearchHit(
+                task_id=rowid >> _PAGE_BITS,
+                page=rowid & ((1 << _PAGE_BITS) - 1),
+                snippet=_highlight(snippet),
+                rank=rank,
+            )
+            for rowid, snippet, rank in rows
+        ]
+
+
+class PageResultsScanBackend(SearchBackend):
+    """Unindexed fallback: substring match over plain-text page copies. Fine for small databases.
+
+    ``page_results`` is stored compressed, so pages are copied uncompressed
+    into ``PageText`` rows as they are indexed, and the database scans those
+    (only as far as the requested results) instead of every task being
+    decompressed in Python.
+    """
+
+    context_chars = 80
+
+    def index_pages(self, task_id: int, pages: dict[int, str]) -> None:
+        from converter.models import PageText
+
+        if not pages:
+            return
+        with transaction.atomic():
+            PageText.objects.filter(task_id=task_id, page__in=list(pages)).delete()
+            PageText.objects.bulk_create(
+                [PageText(task_id=task_id, page=page, body=text) for page, text in pages.items()]
+            )
+
+    def delete_task(self, task_id: int) -> None:
+        from converter.models import PageText
+
+        PageText.objects.filter(task_id=task_id).delete()
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> list[SearchHit]:
+        from converter.models import PageText
+
+        needle = query.strip()
+        if not needle:
+            return []
+        rows = (
+            PageText.objects.filter(body__icontains=needle, task__status__in=_searchable_statuses())
+            .order_by("task_id", "page")
+            .values_list("task_id", "page", "body")[offset:offset + limit]
+        )
+        return [SearchHit(task_id, page, self._snippet(body, needle), 0.0) for task_id, page, body in rows]
+
+    def _snippet(self, text: str, needle: str) -> str:
+        pos = text.lower().find(needle.lower())
+        if pos < 0:
+            # The database matched case-insensitively in a way str.lower() does not
+            return _highlight(text[: 2 * self.context_chars])
+        start = max(pos - self.context_chars, 0)
+        end = pos + len(needle) + self.context_chars
+        return _highlight(
+            text[start:pos]
+            + "\x02" + text[pos:pos + len(needle)] + "\x03"
+            + text[pos + len(needle):end]
+        )
+
+
+@lru_cache(maxsize=1)
+def get_search_backend() -> SearchBackend:
+    """Return the configured content search backend (``SEARCH_BACKEND`` setting)."""
+    path = getattr(settings, "SEARCH_BACKEND", "")
+    if path:
+        return import_string(path)()
+    if connection.vendor == "sqlite":
+        return SQLiteFTSBackend()
+    return PageResultsScanBackend()
+
+
+def index_task_pages(task_id: int, pages: dict[int, str]) -> None:
+    """Index finished pages of a task; errors are logged, never raised."""
+    try:
+        get_search_backend().index_pages(task_id, pages)
+    except Exception:
+        logger.exception("Failed to index %d page(s) of task %d", len(pages), task_id)
+
+
+def searchable_pages(task) -> dict[int, str]:
+    """Return the successfully transcribed pages of *task* (page number -> Markdown)."""
+    failed = {fp.get("page") for fp in task.failed_pages or []}
+    return {
+        page: text
+        for page, text in enumerate(task.page_results or [], start=1)
+        if text and page not in failed
+    }
+
+
+# ── Helpers ───────────────────────────────────────────────────
+
+
+def _fts_phrase(query: str) -> str:
+    """Quote *query* as a single FTS5 phrase so operators are matched literally."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _fts_terms(query: str) -> str:
+    """Turn user input into an FTS5 query: every word must match, ``word*`` is a prefix."""
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append(_fts_phrase(word) + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+def _highlight(snippet: str) -> str:
+    """Escape *snippet* and turn \\x02/\\x03 markers into ``<mark>`` tags."""
+    return html.escape(snippet).replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+
+def _searchable_statuses() -> list[str]:
+    """Task statuses whose pages are returned by content search (every backend)."""
+    from converter.models import ConversionTask
+
+    return [ConversionTask.Status.SUCCESS, ConversionTask.Status.PARTIAL_SUCCESS]
+
+
+def _page_rowid(task_id: int, page: int) -> int:
+    return (task_id << _PAGE_BITS) | page
+
+
+def _fts_table_exists(table: str) -> bool:
+    """True when *table* exists on the default SQLite database (cached per database)."""
+    if connection.vendor != "sqlite":
+        return False
+    db_name = str(connection.settings_dict["NAME"])
+    cached = _fts_tables.get(db_name)
+    if cached is None or time.monotonic() - cached[0] > _FTS_TABLES_TTL:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            cached = (time.monotonic(), {row[0] for row in cursor.fetchall()})
+        _fts_tables[db_name] = cached
+    return table in cached[1]
+
+
+def invalidate_fts_tables() -> None:
+    """Forget which FTS tables exist (after migrations or rebuilding an index)."""
+    _fts_tables.clear()
+
+
+@contextmanager
+def _fts_statement():
+    """Re-check the FTS tables next time if a statement fails (e.g. the table was dropped)."""
+    try:
+        yield
+    except OperationalError:
+        invalidate_fts_tables()
+        raise
@@ -0,0 +1,511 @@
+"""Sharded processing of large PDFs.
+
+When a task's page range is longer than ``SHARD_SIZE`` pages, it is split
+into ``TaskShard`` rows of at most that many pages instead of running on one
+thread. Workers — the local threads started by ``start_processing()`` and any
+number of ``manage.py shard_worker`` processes on other hosts sharing the
+database and ``MEDIA_ROOT`` — claim shards one at a time, render and
+transcribe their page range, and store the per-page results on the shard.
+
+A claimed shard carries a heartbeat, refreshed after every page. A shard
+whose heartbeat is older than ``SHARD_LEASE_SECONDS`` is treated as
+abandoned (its worker died) and can be claimed again, up to
+``SHARD_MAX_ATTEMPTS`` times; after that its pages are recorded as failed.
+
+The worker that finishes the last shard merges: it concatenates the shard
+results in page order, writes the Markdown file, sets the final status and
+deletes the shards. Progress is aggregated by incrementing
+``ConversionTask.pages_processed`` atomically from every worker.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from converter.models import ConversionTask, TaskShard, VisionConfig
+
+from . import telemetry, webhooks
+from .cancellation import CANCELLED_PAGE_ERROR, cancel_scope, cancelled_message
+from .cascade import cascade_enabled, transcribe_with_cascade
+from .compression import output_file_content
+from .page_metrics import build_task_metrics
+from .pdf_to_images import pdf_page_range, pdf_to_base64_images
+from .rendering import invalidate_task_render
+from .scheduler import PageFlow, task_flow
+from .search import index_task_pages
+from .vision import FAILED_PAGE_PLACEHOLDER_TEMPLATE
+
+logger = logging.getLogger(__name__)
+
+
+# ── Planning ──────────────────────────────────────────────────
+
+
+def should_shard(task: ConversionTask) -> bool:
+    """True if *task*'s page range is longer than ``SHARD_SIZE`` (0 disables sharding)."""
+    size = getattr(settings, "SHARD_SIZE", 0)
+    if size <= 0:
+        return False
+    first, last = pdf_page_range(task.pdf_file.path, task.start_page, task.end_page)
+    return last - first + 1 > size
+
+
+def plan_shards(task: ConversionTask, config: VisionConfig) -> list[TaskShard]:
+    """Replace any existing shards of *task* with fresh ones and mark it processing.
+
+    The vision backend/model snapshot in *config* is stored on the task; every
+    worker uses it, so all shards run against the same model.
+    """
+    size = settings.SHARD_SIZE
+    first, last = pdf_page_range(task.pdf_file.path, task.start_page, task.end_page)
+    shards = [
+        TaskShard(
+            task=task,
+            index=i,
+            start_page=start,
+            end_page=min(start + size - 1, last),
+            first_index=start - first,
+        )
+        for i, start in enumerate(range(first, last + 1, size))
+    ]
+    with transaction.atomic():
+        task.shards.all().delete()
+        TaskShard.objects.bulk_create(shards)
+        task.status = ConversionTask.Status.PROCESSING
+        task.vision_backend = config.backend
+        task.vision_model = config.model
+        task.page_count = last - first + 1
+        task.pages_processed = 0
+        task.error_message = ""
+        task.save(
+            update_fields=[
+                "status",
+                "vision_backend",
+                "vision_model",
+                "page_count",
+                "pages_processed",
+                "error_message",
+            ]
+        )
+    logger.info(
+        "Task %d: split pages %d–%d into %d shard(s) of up to %d pages",
+        task.pk,
+        first,
+        last,
+        len(shards),
+        size,
+    )
+    return shards
+
+
+# ── Workers ───────────────────────────────────────────────────
+
+
+def default_worker_name() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+
+
+def claim_shard(worker: str, task_id: int | None = None) -> TaskShard | None:
+    """Claim the next pending (or abandoned) shard, or return None if there is none.
+
+    The claim is a conditional UPDATE, so concurrent workers never get the
+    same shard even without row locks.
+    """
+    lease = timedelta(seconds=getattr(settings, "SHARD_LEASE_SECONDS", 300))
+    max_attempts = getattr(settings, "SHARD_MAX_ATTEMPTS", 3)
+    while True:
+        now = timezone.now()
+        claimable = Q(status=TaskShard.Status.PENDING) | Q(
+            status=TaskShard.Status.CLAIMED, heartbeat_at__lt=now - lease
+        )
+        qs = TaskShard.objects.filter(claimable)
+        if task_id is not None:
+            qs = qs.filter(task_id=task_id)
+        candidate = (
+            qs.order_by("-task__priority", "task_id", "index")
+            .values("pk", "status", "heartbeat_at", "task__status")
+            .first()
+        )
+        if candidate is None:
+            return None
+        if candidate["task__status"] == ConversionTask.Status.CANCELLED:
+            # Cancelled while this shard was waiting (or its worker died): nothing to do
+            _finish_as_failed(
+                TaskShard.objects.get(pk=candidate["pk"]),
+                CANCELLED_PAGE_ERROR,
+                status=candidate["status"],
+            )
+            continue
+        if candidate["status"] == TaskShard.Status.CLAIMED:
+            if _give_up_if_exhausted(candidate["pk"], max_attempts):
+                continue
+        claimed = TaskShard.objects.filter(
+            pk=candidate["pk"],
+            status=candidate["status"],
+            heartbeat_at=candidate["heartbeat_at"],
+        ).update(
+            status=TaskShard.Status.CLAIMED,
+            worker=worker,
+            claimed_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return TaskShard.objects.select_related("task").get(pk=candidate["pk"])
+        # Another worker won the race; look again
+
+
+def process_shard(shard: TaskShard, worker: str) -> None:
+    """Render and transcribe *shard*, store its results, and merge if it was the last one."""
+    with cancel_scope(shard.task_id) as cancel:
+        _process_shard(shard, worker, cancel)
+
+
+def cancel_pending_shards(task_id: int) -> None:
+    """Finish the not yet claimed shards of a cancelled task; claimed ones stop on their own."""
+    for shard in TaskShard.objects.filter(task_id=task_id, status=TaskShard.Status.PENDING):
+        _finish_as_failed(shard, CANCELLED_PAGE_ERROR, status=TaskShard.Status.PENDING)
+
+
+def has_live_shard(task_id: int) -> bool:
+    """True if a worker holds a shard of *task_id* and reported progress within ``SHARD_LEASE_SECONDS``."""
+    lease = timedelta(seconds=getattr(settings, "SHARD_LEASE_SECONDS", 300))
+    return TaskShard.objects.filter(
+        task_id=task_id, status=TaskShard.Status.CLAIMED, heartbeat_at__gte=timezone.now() - lease
+    ).exists()
+
+
+def _process_shard(shard: TaskShard, worker: str, cancel: threading.Event) -> None:
+    task = shard.task
+    config = VisionConfig.for_task(task.vision_backend, task.vision_model)
+    origin = time.perf_counter()
+    stages = {"render_ms": 0.0, "transcribe_ms": 0.0, "progress_db_ms": 0.0, "index_ms": 0.0}
+    render_metrics: list[dict] = []
+    call_metrics: dict[int, dict] = {}
+    # Pages this attempt added to the task's progress (only while it was processing)
+    counted = {"task_pages": 0}
+    telemetry.TASKS_IN_PROGRESS.inc()
+    try:
+        text_layers: list[dict] | None = [] if cascade_enabled(config) else None
+        images, _ = pdf_to_base64_images(
+            task.pdf_file.path,
+            start_page=shard.start_page,
+            end_page=shard.end_page,
+            page_metrics=render_metrics,
+            text_layers=text_layers,
+        )
+        stages["render_ms"] = (time.perf_counter() - origin) * 1000
+        for page in render_metrics:
+            telemetry.RENDER_SECONDS.observe((page["render_ms"] + page["encode_ms"]) / 1000)
+
+        failed_pages: list[dict] = []
+        transcribe_offset = time.perf_counter()
+        _, page_results = transcribe_with_cascade(
+            images,
+            task.prompt,
+            text_layers,
+            on_page_done=_make_shard_progress_callback(shard, stages, cancel, counted),
+            failed_pages=failed_pages,
+            on_page_result=_make_shard_index_callback(shard, stages),
+            config=config,
+            page_metrics=call_metrics,
+            flow=_shard_flow(shard),
+            cancel_event=cancel,
+        )
+        stages["transcribe_ms"] = (time.perf_counter() - transcribe_offset) * 1000
+        stages["total_ms"] = (time.perf_counter() - origin) * 1000
+        metrics = build_task_metrics(
+            render_metrics,
+            call_metrics,
+            stages,
+            render_offset_ms=0.0,
+            transcribe_offset_ms=(transcribe_offset - origin) * 1000,
+        )
+    except Exception as exc:
+        logger.exception("Task %d shard %d failed on %s", task.pk, shard.index, worker)
+        _release_failed_shard(shard, worker, exc, counted["task_pages"])
+        return
+    finally:
+        telemetry.TASKS_IN_PROGRESS.dec()
+
+    offset = shard.first_index
+    for fp in failed_pages:
+        fp["page"] += offset
+    for page in metrics["pages"]:
+        page["page"] += offset
+    stored = TaskShard.objects.filter(
+        pk=shard.pk, worker=worker, status=TaskShard.Status.CLAIMED
+    ).update(
+        status=TaskShard.Status.DONE,
+        page_results=page_results,
+        failed_pages=failed_pages,
+        metrics=metrics,
+        pages_processed=len(images),
+        heartbeat_at=timezone.now(),
+    )
+    if not stored:
+        # Our lease expired and another worker took the shard over; its result wins
+        logger.warning("Task %d shard %d: lease lost by %s, result discarded", task.pk, shard.index, worker)
+        return
+    logger.info(
+        "Task %d shard %d (pages %d–%d) done on %s in %.1fs",
+        task.pk,
+        shard.index,
+        shard.start_page,
+        shard.end_page,
+        worker,
+        stages["total_ms"] / 1000,
+    )
+    try_merge(task.pk)
+
+
+def run_worker(
+    worker: str | None = None,
+    task_id: int | None = None,
+    stop_when_idle: bool = True,
+    poll_interval: float | None = None,
+    stop_event: threading.Event | None = None,
+) -> int:
+    """Claim and process shards until none are left (or forever); return the number processed."""
+    worker = worker or default_worker_name()
+    if poll_interval is None:
+        poll_interval = getattr(settings, "SHARD_POLL_INTERVAL", 2.0)
+    done = 0
+    while not (stop_event and stop_event.is_set()):
+        shard = claim_shard(worker, task_id=task_id)
+        if shard is None:
+            if stop_when_idle:
+                break
+            if stop_event:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        process_shard(shard, worker)
+        done += 1
+    return done
+
+
+def _shard_flow(shard: TaskShard) -> PageFlow:
+    """Each shard is its own flow (with its own concurrency) sharing its task's fair share."""
+    flow = task_flow(shard.task)
+    return flow._replace(key=f"{flow.key}:shard-{shard.index}")
+
+
+def _make_shard_progress_callback(
+    shard: TaskShard, timings: dict, cancel: threading.Event, counted: dict
+):
+    """Bump the task's aggregate progress and this shard's heartbeat for each page.
+
+    Sets *cancel* once the task is no longer processing; ``counted["task_pages"]``
+    tracks the increments that landed on the task.
+    """
+    lock = threading.Lock()
+
+    def callback(page_idx: int) -> None:
+        with lock:
+            t0 = time.perf_counter()
+            updated = ConversionTask.objects.filter(
+                pk=shard.task_id, status=ConversionTask.Status.PROCESSING
+            ).update(pages_processed=F("pages_processed") + 1)
+            if updated:
+                counted["task_pages"] += 1
+            else:
+                cancel.set()
+            TaskShard.objects.filter(pk=shard.pk).update(
+                pages_processed=F("pages_processed") + 1,
+                heartbeat_at=timezone.now(),
+            )
+            timings["progress_db_ms"] += (time.perf_counter() - t0) * 1000
+
+    return callback
+
+
+def _make_shard_index_callback(shard: TaskShard, timings: dict):
+    def callback(page_idx: int, markdown_text: str) -> None:
+        t0 = time.perf_counter()
+        index_task_pages(shard.task_id, {shard.first_index + page_idx + 1: markdown_text})
+        timings["index_ms"] += (time.perf_counter() - t0) * 1000
+
+    return callback
+
+
+def _give_up_if_exhausted(shard_pk: int, max_attempts: int) -> bool:
+    """Mark an abandoned shard that used up its attempts as done with all pages failed."""
+    shard = TaskShard.objects.filter(pk=shard_pk).only("pk", "task_id", "attempts").first()
+    if shard is None or shard.attempts < max_attempts:
+        return False
+    _finish_as_failed(shard, "Worker stopped responding (lease expired).")
+    return True
+
+
+def _release_failed_shard(shard: TaskShard, worker: str, exc: Exception, counted: int) -> None:
+    """Put a crashed shard back in the queue, or give up after ``SHARD_MAX_ATTEMPTS``.
+
+    *counted* is the number of pages this attempt added to the task's progress.
+    """
+    mine = TaskShard.objects.filter(pk=shard.pk, worker=worker, status=TaskShard.Status.CLAIMED)
+    attempts = mine.values_list("attempts", flat=True).first()
+    if attempts is None:
+        # Deleted with its task, or taken over after our lease expired
+        return
+    if attempts < getattr(settings, "SHARD_MAX_ATTEMPTS", 3):
+        # Pages counted by this attempt will be counted again by the next one
+        if mine.update(status=TaskShard.Status.PENDING, worker="", error_message=str(exc)):
+            ConversionTask.objects.filter(pk=shard.task_id).update(
+                pages_processed=F("pages_processed") - counted
+            )
+            TaskShard.objects.filter(pk=shard.pk).update(pages_processed=0)
+        return
+    _finish_as_failed(shard, str(exc), worker=worker)
+
+
+def _finish_as_failed(
+    shard: TaskShard,
+    error: str,
+    worker: str | None = None,
+    status: str = TaskShard.Status.CLAIMED,
+) -> None:
+    """Mark *shard* done with every page failed, if it is still in *status*."""
+    shard = (
+        TaskShard.objects.filter(pk=shard.pk)
+        .only("task_id", "index", "start_page", "end_page", "first_index", "pages_processed", "status")
+        .first()
+    )
+    if shard is None:
+        # Deleted along with its task
+        return
+    qs = TaskShard.objects.filter(pk=shard.pk, status=status)
+    if worker is not None:
+        qs = qs.filter(worker=worker)
+    total = shard.page_total
+    page_nums = range(shard.first_index + 1, shard.first_index + total + 1)
+    placeholders = ["\n\n" + FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(n) + "\n\n" for n in page_nums]
+    updated = qs.update(
+        status=TaskShard.Status.DONE,
+        error_message=error,
+        page_results=placeholders,
+        failed_pages=[{"page": n, "error": error} for n in page_nums],
+        metrics={},
+        pages_processed=total,
+    )
+    if not updated:
+        return
+    ConversionTask.objects.filter(pk=shard.task_id).update(
+        pages_processed=F("pages_processed") + (total - shard.pages_processed)
+    )
+    logger.warning("Task %d shard %d finished without transcription: %s", shard.task_id, shard.index, error)
+    try_merge(shard.task_id)
+
+
+# ── Merge ─────────────────────────────────────────────────────
+
+
+def try_merge(task_id: int) -> bool:
+    """Merge *task_id*'s shards if all are done; return True if this call merged.
+
+    Exactly one caller wins: shards move from DONE to MERGED in one UPDATE
+    that only matches while no shard of the task is unfinished.
+    """
+    unfinished = TaskShard.objects.filter(task_id=OuterRef("task_id")).exclude(
+        status__in=(TaskShard.Status.DONE, TaskShard.Status.MERGED)
+    )
+    total = TaskShard.objects.filter(task_id=task_id).count()
+    won = (
+        TaskShard.objects.filter(task_id=task_id, status=TaskShard.Status.DONE)
+        .filter(~Exists(unfinished))
+        .update(status=TaskShard.Status.MERGED)
+    )
+    if not total or won != total:
+        return False
+
+    task = ConversionTask.objects.filter(pk=task_id).first()
+    if task is None:
+        # Deleted while its last shard finished; nothing to report
+        return False
+    try:
+        _merge(task)
+    except Exception as exc:
+        logger.exception("Task %d: merging shards failed", task_id)
+        task.status = ConversionTask.Status.FAILED
+        task.error_message = str(exc)
+        task.save(update_fields=["status", "error_message"])
+    telemetry.TASKS_FINISHED.inc(status=task.status)
+    webhooks.task_finished(task_id)
+    return True
+
+
+def _merge(task: ConversionTask) -> None:
+    merge_start = time.perf_counter()
+    shards = list(task.shards.order_by("index"))
+    page_results: list[str] = []
+    failed_pages: list[dict] = []
+    pages: list[dict] = []
+    stages: dict[str, float] = {}
+    for shard in shards:
+        page_results.extend(shard.page_results)
+        failed_pages.extend(shard.failed_pages)
+        pages.extend((shard.metrics or {}).get("pages", []))
+        for name, ms in (shard.metrics or {}).get("stages", {}).items():
+            # Summed across shards: worker time, not wall time
+            stages[name] = stages.get(name, 0.0) + ms
+
+    output_name, output_bytes = output_file_content(task.markdown_filename, "\n\n".join(page_results))
+    task.markdown_file.save(output_name, ContentFile(output_bytes), save=False)
+    stages["merge_ms"] = (time.perf_counter() - merge_start) * 1000
+    started = min(shard.created_at for shard in shards)
+    task.processing_time_seconds = (timezone.now() - started).total_seconds()
+    task.page_results = page_results
+    task.set_failed_pages(failed_pages)
+    task.metrics = {
+        "stages": {name: round(ms, 1) for name, ms in stages.items()},
+        "pages": pages,
+        "shards": len(shards),
+    }
+    task.pages_processed = len(page_results)
+    total_pages = len(page_results)
+    if task.status == ConversionTask.Status.CANCELLED:
+        # Keep what was transcribed; "Retry" re-runs the cancelled pages
+        task.error_message = cancelled_message(len(failed_pages), total_pages)
+    elif total_pages and len(failed_pages) >= total_pages:
+        task.status = ConversionTask.Status.FAILED
+        task.error_message = "All pages failed transcription."
+    elif failed_pages:
+        task.status = ConversionTask.Status.PARTIAL_SUCCESS
+    else:
+        task.status = ConversionTask.Status.SUCCESS
+    task.save(
+        update_fields=[
+            "markdown_file",
+            "status",
+            "error_message",
+            "processing_time_seconds",
+            "pages_processed",
+            "failed_pages",
+            "failed_page_count",
+            "page_results",
+            "metrics",
+            # Part of the result page's cache keys
+            "updated_at",
+        ]
+    )
+    task.shards.all().delete()
+    invalidate_task_render(task.pk)
+    logger.info(
+        "Task %d: merged %d shard(s) (%d pages) in %.1fs",
+        task.pk,
+        len(shards),
+        total_pages,
+        task.processing_time_seconds,
+    )
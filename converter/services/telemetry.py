@@ -0,0 +1,375 @@
+"""Prometheus-style metrics, aggregated in-process.
+
+Metrics are plain counters, gauges and histograms held in memory and
+updated under one lock, so recording is cheap and a scrape of ``/metrics``
+never touches the database. ``render_metrics()`` produces the Prometheus
+text exposition format.
+
+When several worker processes serve the app, set ``METRICS_MULTIPROC_DIR``
+to a directory they share: each process then writes a JSON snapshot of its
+metrics there every ``METRICS_FLUSH_INTERVAL`` seconds (and at exit), and a
+scrape merges all snapshots. Counters and histograms of processes that have
+exited are kept; their gauges are dropped. Clear the directory on deploy.
+"""
+
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import math
+import os
+import socket
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_registry: dict[str, "_Metric"] = {}
+
+DEFAULT_LATENCY_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+DEFAULT_RENDER_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+# ── Metric types ──────────────────────────────────────────────
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], object] = {}
+        _registry[name] = self
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self) -> dict:
+        return {
+            "kind": self.kind,
+            "help": self.documentation,
+            "labels": list(self.labelnames),
+            "samples": [[list(key), value] for key, value in self._values.items()],
+        }
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _ensure_flusher()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _ensure_flusher()
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = value
+        _ensure_flusher()
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram; each sample is [bucket counts..., sum, count]."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample[i] += 1
+            sample[-2] += value
+            sample[-1] += 1
+        _ensure_flusher()
+
+    def snapshot(self) -> dict:
+        data = super().snapshot()
+        data["buckets"] = list(self.buckets)
+        data["samples"] = [[labels, list(value)] for labels, value in data["samples"]]
+        return data
+
+
+# ── Application metrics ───────────────────────────────────────
+
+PAGES_TRANSCRIBED = Counter(
+    "converter_pages_transcribed_total",
+    "Pages transcribed successfully.",
+    ("backend", "model"),
+)
+PAGE_FAILURES = Counter(
+    "converter_page_failures_total",
+    "Pages whose transcription failed, by exception class.",
+    ("backend", "model", "error"),
+)
+PAGE_RESUBMITS = Counter(
+    "converter_page_resubmits_total",
+    "Extra calls sent for a page still running, by reason.",
+    ("backend", "model", "reason"),
+)
+PAGE_RESUBMIT_WINS = Counter(
+    "converter_page_resubmit_wins_total",
+    "Pages whose extra call answered before the first one, by reason.",
+    ("backend", "model", "reason"),
+)
+API_LATENCY = Histogram(
+    "converter_api_latency_seconds",
+    "Wall time of one vision API call, including SDK retries.",
+    ("backend", "model"),
+)
+API_IN_FLIGHT = Gauge(
+    "converter_api_in_flight",
+    "Vision API calls currently in progress.",
+    ("backend",),
+)
+API_KEY_REQUESTS = Counter(
+    "converter_api_key_requests_total",
+    "Vision API calls per pooled key (last four characters) and HTTP status.",
+    ("provider", "key", "status"),
+)
+API_KEY_QUARANTINES = Counter(
+    "converter_api_key_quarantines_total",
+    "Times a pooled API key was quarantined after repeated 429/401/403 responses.",
+    ("provider", "key"),
+)
+BREAKER_TRANSITIONS = Counter(
+    "converter_breaker_transitions_total",
+    "Circuit breaker state changes per backend/model (opened, reopened, closed).",
+    ("backend", "model", "transition"),
+)
+CASCADE_PAGES = Counter(
+    "converter_cascade_pages_total",
+    "Pages scored after the cheap cascade pass, by result (accepted or escalated).",
+    ("backend", "result"),
+)
+CASCADE_ESCALATIONS = Counter(
+    "converter_cascade_escalations_total",
+    "Reasons cascade pages were escalated to the configured model.",
+    ("backend", "reason"),
+)
+QUEUE_DEPTH = Gauge(
+    "converter_page_queue_depth",
+    "Pages submitted for transcription but not yet started.",
+)
+RENDER_SECONDS = Histogram(
+    "converter_render_seconds",
+    "Time to render and PNG-encode one PDF page.",
+    buckets=DEFAULT_RENDER_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "converter_cache_requests_total",
+    "Cache lookups by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+TASKS_FINISHED = Counter(
+    "converter_tasks_finished_total",
+    "Conversion runs finished, by final status.",
+    ("status",),
+)
+WEBHOOK_DELIVERIES = Counter(
+    "converter_webhook_deliveries_total",
+    "Completion webhook attempts, by result (delivered, retried or failed).",
+    ("result",),
+)
+TASKS_IN_PROGRESS = Gauge(
+    "converter_tasks_in_progress",
+    "Conversion runs currently executing.",
+)
+
+
+def record_cache(cache_name: str, hits: int, misses: int) -> None:
+    """Count *hits* and *misses* for one cache."""
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache_name, result="hit")
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache_name, result="miss")
+
+
+# ── Exposition ────────────────────────────────────────────────
+
+
+def snapshot() -> dict:
+    """Return this process's metrics as a JSON-serialisable dict."""
+    with _lock:
+        return {name: metric.snapshot() for name, metric in _registry.items()}
+
+
+def render_metrics() -> str:
+    """Return all metrics (merged across processes if configured) in Prometheus text format."""
+    snapshots = [(snapshot(), True)]
+    directory = _multiproc_dir()
+    if directory:
+        _flush()
+        snapshots += _read_other_snapshots(directory)
+    return _format(_merge(snapshots))
+
+
+def _merge(snapshots: list[tuple[dict, bool]]) -> dict:
+    merged: dict[str, dict] = {}
+    for snap, alive in snapshots:
+        for name, data in snap.items():
+            if data["kind"] == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {**data, "samples": {}})
+            for labels, value in data["samples"]:
+                key = tuple(labels)
+                if data["kind"] == "histogram":
+                    prev = target["samples"].get(key)
+                    target["samples"][key] = (
+                        [a + b for a, b in zip(prev, value)] if prev else list(value)
+                    )
+                else:
+                    target["samples"][key] = target["samples"].get(key, 0) + value
+    return merged
+
+
+def _format(merged: dict) -> str:
+    lines: list[str] = []
+    for name in sorted(merged):
+        data = merged[name]
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        labelnames = data["labels"]
+        for key, value in sorted(data["samples"].items()):
+            labels = list(zip(labelnames, key))
+            if data["kind"] != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+                continue
+            for bound, count in zip(data["buckets"], value):
+                lines.append(f"{name}_bucket{_labels(labels + [('le', _number(bound))])} {count}")
+            lines.append(f"{name}_bucket{_labels(labels + [('le', '+Inf')])} {value[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(value[-2])}")
+            lines.append(f"{name}_count{_labels(labels)} {value[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def _labels(pairs) -> str:
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# ── Multi-process snapshots ───────────────────────────────────
+
+_HOST = socket.gethostname()
+_flusher_lock = threading.Lock()
+_flusher: dict = {"thread": None, "pid": None}
+
+
+def _multiproc_dir() -> Path | None:
+    value = getattr(settings, "METRICS_MULTIPROC_DIR", "")
+    return Path(value) if value else None
+
+
+def _snapshot_path(directory: Path) -> Path:
+    return directory / f"{_HOST}-{os.getpid()}.json"
+
+
+def _ensure_flusher() -> None:
+    """Start the background snapshot writer once per process (no-op when disabled)."""
+    if _flusher["pid"] == os.getpid():
+        return
+    if not _multiproc_dir():
+        return
+    with _flusher_lock:
+        if _flusher["pid"] == os.getpid():
+            return
+        # After a fork the parent's thread does not exist in the child; start a new one
+        _flusher["pid"] = os.getpid()
+        thread = threading.Thread(target=_flush_loop, daemon=True, name="metrics-flush")
+        _flusher["thread"] = thread
+        thread.start()
+        atexit.register(_flush)
+
+
+def _flush_loop() -> None:
+    interval = getattr(settings, "METRICS_FLUSH_INTERVAL", 5)
+    while True:
+        time.sleep(interval)
+        _flush()
+
+
+def _flush() -> None:
+    directory = _multiproc_dir()
+    if not directory:
+        return
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        payload = {"host": _HOST, "pid": os.getpid(), "metrics": snapshot()}
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(payload, fh)
+        os.replace(tmp, _snapshot_path(directory))
+    except OSError:
+        logger.warning("Could not write metrics snapshot to %s", directory, exc_info=True)
+
+
+def _read_other_snapshots(directory: Path) -> list[tuple[dict, bool]]:
+    own = _snapshot_path(directory)
+    result = []
+    for path in directory.glob("*.json"):
+        if path == own:
+            continue
+        try:
+            payload = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        result.append((payload.get("metrics", {}), _process_alive(payload)))
+    return result
+
+
+def _process_alive(payload: dict) -> bool:
+    if payload.get("host") != _HOST:
+        # Can't check processes on other hosts; trust their gauges
+        return True
+    try:
+        pid = int(payload.get("pid", 0))
+        if pid <= 0:
+            return False
+        os.kill(pid, 0)
+    except (OSError, ValueError):
+        return False
+    return True
@@ -1,35 +1,84 @@
 """Vision API backends — OpenAI and Gemini.
 
 The public entry point is ``transcribe_images_to_markdown()``.  It reads
-``settings.VISION_BACKEND`` to dispatch to the correct provider and uses
-``concurrent.futures.ThreadPoolExecutor`` for concurrent page processing.
+``settings.VISION_BACKEND`` to dispatch to the correct provider and submits
+pages to the shared ``PageScheduler`` (or, with the scheduler disabled, a
+``concurrent.futures.ThreadPoolExecutor``) for concurrent page processing.
+Additional backends (e.g. the benchmark mock) can be added with
+``register_backend()``; ``multi`` spreads pages over several of them (see
+``services/multi_backend.py``).
 """
 
 from __future__ import annotations
 
+import contextlib
+import functools
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Callable, Optional
+import math
+import statistics
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, NamedTuple, Optional, Union
 
 # Placeholder string for a failed page (must match processing/views logic)
 FAILED_PAGE_PLACEHOLDER_TEMPLATE = "<!-- [Page {}: transcription failed] -->"
 
 from django.conf import settings
 
-from converter.models import get_effective_vision_config
+from converter.models import VisionConfig, get_effective_vision_config
+from converter.services import circuit_breaker, hedging, key_pool, multi_backend, telemetry
+from converter.services.cancellation import CANCELLED_PAGE_ERROR
+from converter.services.cassettes import cassette_mode, wrap_transcribe_fn
+from converter.services.circuit_breaker import CircuitOpen
+from converter.services.scheduler import PageFlow, anonymous_flow, get_scheduler
 
 logger = logging.getLogger(__name__)
 
+# How often the waiting loop checks for cancels, deadlines and stragglers
+_WATCH_SECONDS = 0.25
+# Never resubmit a page that has been running for less than this
+_STRAGGLER_MIN_SECONDS = 1.0
+
+
+class PageTranscription(NamedTuple):
+    """A backend's result for one page, with usage reported by the provider."""
+
+    text: str
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    retries: int = 0
+
+
+# Backends return a PageTranscription or plain Markdown
+TranscribeFn = Callable[[str, str, str], Union[PageTranscription, str]]
+
+# Extra backends by name: fn(base64_image, prompt, model) -> Markdown
+_registered_backends: dict[str, TranscribeFn] = {}
+
 
 # ── Public API ────────────────────────────────────────────────
 
 
+def register_backend(name: str, transcribe_fn: Optional[TranscribeFn]) -> None:
+    """Register (or with None, remove) a transcription backend selectable by name."""
+    if transcribe_fn is None:
+        _registered_backends.pop(name, None)
+    else:
+        _registered_backends[name] = transcribe_fn
+
+
 def transcribe_images_to_markdown(
     base64_images: list[str],
     prompt: str,
     on_page_done: Optional[Callable[[int], None]] = None,
     failed_pages: Optional[list[dict]] = None,
     indices_to_process: Optional[list[int]] = None,
+    on_page_result: Optional[Callable[[int, str], None]] = None,
+    config: Optional[VisionConfig] = None,
+    page_metrics: Optional[dict[int, dict]] = None,
+    flow: Optional[PageFlow] = None,
+    cancel_event: Optional[threading.Event] = None,
 ) -> tuple[str | None, list[str]]:
     """Transcribe page images to Markdown, optionally only a subset of indices.
 
@@ -43,6 +92,37 @@ def transcribe_images_to_markdown(
         indices_to_process: If set, only these 0-based indices are transcribed
             (for retrying failed pages). Returned list has one entry per index
             in this list, in order.
+        on_page_result: Optional callback invoked with (page index, Markdown)
+            for each page that transcribed successfully, as it finishes.
+        config: Vision backend/models to use. Callers processing a task pass
+            the snapshot taken at task start; defaults to the current
+            effective config.
+        page_metrics: Optional mutable dict; for each processed index it
+            receives ``start_ms`` (API call start, offset from this call),
+            ``queue_ms``, ``api_ms``, ``retries``, ``input_tokens``,
+            ``output_tokens``, ``failed``, ``attempts`` (calls sent for the
+            page), ``backend`` and ``model`` (the ones that answered).
+        flow: Scheduling identity of these pages (see ``services/scheduler.py``);
+            tasks pass ``task_flow(task)``. Defaults to a flow of its own.
+        cancel_event: When set, pages not yet started are dropped, in-flight
+            calls get ``CANCEL_GRACE_SECONDS`` to finish and are then
+            abandoned. Pages that did not complete are reported in
+            *failed_pages* with ``CANCELLED_PAGE_ERROR``; the call returns
+            normally with the pages finished so far.
+
+    Deadlines: a call running longer than ``PAGE_DEADLINE_SECONDS`` is
+    abandoned and its page fails; after ``TASK_DEADLINE_SECONDS`` all pages
+    not yet done fail. A page running ``STRAGGLER_FACTOR`` times longer than
+    the median of the pages finished so far is sent again (at most
+    ``STRAGGLER_MAX_FRACTION`` of the pages) and the first answer is used.
+    With ``HEDGE_ENABLED``, a page running past the latency percentile seen
+    across recent calls is also sent to ``HEDGE_BACKEND`` (see
+    ``services/hedging.py``).
+
+    Circuit breakers (``services/circuit_breaker.py``) refuse calls to a
+    backend/model with a high recent error rate. A refused page fails, or
+    with ``BREAKER_MODE=park`` waits outside the queue until the breaker
+    lets calls through again (at most ``BREAKER_PARK_SECONDS``).
 
     Returns:
         (full_markdown, page_results):
@@ -51,64 +131,412 @@ def transcribe_images_to_markdown(
         - If indices_to_process is set: full_markdown is None, page_results
           has length len(indices_to_process) (results for those indices only).
     """
-    backend, openai_model, gemini_model = get_effective_vision_config()
+    config = config or get_effective_vision_config()
     max_workers = getattr(settings, "VISION_MAX_WORKERS", 4)
 
-    if backend == "openai":
-        transcribe_fn = _openai_transcribe_page
-        model = openai_model
-    elif backend == "gemini":
-        transcribe_fn = _gemini_transcribe_page
-        model = gemini_model
-    else:
-        raise ValueError(f"Unknown VISION_BACKEND: {backend!r}")
+    cassette = cassette_mode()
+    primary = _route(config.backend, config, cassette)
+    backend, model = primary.backend, primary.model
+    hedge_route = None
+    if hedging.hedging_enabled():
+        hedge_route = _route(hedging.hedge_backend(backend), config, cassette)
 
     if indices_to_process is not None:
         indices_to_process = sorted(set(indices_to_process))
-        image_subset = [base64_images[i] for i in indices_to_process]
         n_results = len(indices_to_process)
         idx_to_subset_pos = {idx: pos for pos, idx in enumerate(indices_to_process)}
     else:
-        image_subset = base64_images
         indices_to_process = list(range(len(base64_images)))
         n_results = len(base64_images)
         idx_to_subset_pos = {i: i for i in range(n_results)}
 
     logger.info(
-        "Transcribing %d page(s) via %s / %s (workers=%d)",
+        "Transcribing %d page(s) via %s / %s (workers=%d%s)",
         n_results,
         backend,
         model,
         max_workers,
+        f", cassette={cassette}" if cassette else "",
     )
 
     results: list[str | None] = [None] * n_results
+    origin = time.perf_counter()
+    # (idx, attempt) -> perf_counter times of the backend call
+    call_started: dict[tuple[int, int], float] = {}
+    call_times: dict[tuple[int, int], tuple[float, float]] = {}
+
+    # (idx, attempt) -> route the call was sent to
+    call_routes: dict[tuple[int, int], _Route] = {}
+
+    def call(route: _Route, img: str):
+        with circuit_breaker.guard(route.backend, route.model):
+            telemetry.API_IN_FLIGHT.inc(backend=route.backend)
+            started = time.perf_counter()
+            try:
+                return route.fn(img, prompt, route.model)
+            finally:
+                telemetry.API_IN_FLIGHT.dec(backend=route.backend)
+                telemetry.API_LATENCY.observe(
+                    time.perf_counter() - started, backend=route.backend, model=route.model
+                )
 
-    with ThreadPoolExecutor(max_workers=max_workers) as pool:
-        future_to_idx = {
-            pool.submit(transcribe_fn, img, prompt, model): indices_to_process[pos]
-            for pos, img in enumerate(image_subset)
-        }
+    def call_members(key: tuple[int, int], route: _Route, img: str):
+        """Send the call to the least loaded member of *route*, failing over on errors."""
+        tried: set[str] = set()
+        while True:
+            member = multi_backend.balancer.pick(route.members, exclude=tried)
+            call_routes[key] = member
+            multi_backend.balancer.started(member.backend)
+            try:
+                result = call(member, img)
+            except Exception as exc:
+                multi_backend.balancer.finished(member.backend, ok=False)
+                tried.add(member.backend)
+                if len(tried) == len(route.members):
+                    raise
+                telemetry.PAGE_FAILURES.inc(
+                    backend=member.backend, model=member.model, error=type(exc).__name__
+                )
+                logger.warning("Page %d failed on %s (%s); failing over", key[0] + 1, member.backend, exc)
+                continue
+            multi_backend.balancer.finished(member.backend, ok=True)
+            return result
+
+    def timed_call(idx: int, attempt: int, img: str):
+        key = (idx, attempt)
+        route = call_routes[key]
+        telemetry.QUEUE_DEPTH.dec()
+        started = call_started[key] = time.perf_counter()
+        ok = False
+        try:
+            result = call_members(key, route, img) if route.members else call(route, img)
+            ok = True
+            return result
+        finally:
+            finished = time.perf_counter()
+            call_times[key] = (started, finished)
+            if ok:
+                hedging.observe(route.backend, route.model, finished - started)
+
+    page_deadline = getattr(settings, "PAGE_DEADLINE_SECONDS", 0)
+    task_timeout = getattr(settings, "TASK_DEADLINE_SECONDS", 0)
+    task_deadline = time.monotonic() + task_timeout if task_timeout > 0 else None
+    straggler_factor = getattr(settings, "STRAGGLER_FACTOR", 0)
+    straggler_budget = (
+        math.ceil(n_results * getattr(settings, "STRAGGLER_MAX_FRACTION", 0.1))
+        if straggler_factor > 0
+        else 0
+    )
+    straggler_min_samples = max(1, getattr(settings, "STRAGGLER_MIN_SAMPLES", 5))
+    park_refused = circuit_breaker.park_pages()
+    park_limit = getattr(settings, "BREAKER_PARK_SECONDS", 240)
+    watching = (
+        cancel_event is not None
+        or page_deadline > 0
+        or task_deadline
+        or straggler_budget
+        or hedge_route is not None
+    )
 
-        for future in as_completed(future_to_idx):
-            idx = future_to_idx[future]
+    submitted: dict[int, float] = {}
+    attempts: dict[Future, tuple[int, int]] = {}
+    # Attempts per page whose outcome has not been handled yet
+    open_attempts: dict[int, set[Future]] = {}
+    tries: dict[int, int] = {}
+    # (idx, attempt) -> why an extra call was sent ("straggler" or "hedge")
+    resend_reasons: dict[tuple[int, int], str] = {}
+    latencies: list[float] = []
+    abandoned: set[Future] = set()
+    # Pages refused by an open circuit breaker, waiting to be sent again
+    parked: set[int] = set()
+    parked_since: dict[int, float] = {}
+
+    scheduler = get_scheduler()
+    with contextlib.ExitStack() as stack:
+        if scheduler is None:
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+            # Don't wait for abandoned calls on the way out
+            stack.callback(lambda: pool.shutdown(wait=not abandoned, cancel_futures=True))
+
+            def submit(fn, *args, front=False):
+                return pool.submit(fn, *args)
+
+        else:
+            submit = functools.partial(
+                scheduler.submit, flow or anonymous_flow(), max_in_flight=max_workers
+            )
+
+        def send(idx: int, route: _Route = primary, reason: str = "", front: bool = False) -> Future:
+            """Submit a call for page *idx*; extra calls (with a *reason*) jump the queue."""
+            attempt = tries[idx] = tries.get(idx, -1) + 1
+            call_routes[(idx, attempt)] = route
+            if reason:
+                resend_reasons[(idx, attempt)] = reason
+                telemetry.PAGE_RESUBMITS.inc(backend=route.backend, model=route.model, reason=reason)
+            elif hedge_route is not None and not front:
+                hedging.earn()
+            telemetry.QUEUE_DEPTH.inc()
+            future = submit(timed_call, idx, attempt, base64_images[idx], front=bool(reason) or front)
+            attempts[future] = (idx, attempt)
+            open_attempts.setdefault(idx, set()).add(future)
+            return future
+
+        def drop(future: Future) -> bool:
+            """Cancel *future* if it has not started yet."""
+            if not future.done() and future.cancel():
+                telemetry.QUEUE_DEPTH.dec()
+                return True
+            return False
+
+        def give_up(futures) -> None:
+            """Stop waiting for *futures*: drop queued ones, abandon running ones."""
+            running = [f for f in futures if not drop(f) and not f.done()]
+            abandoned.update(running)
+            if scheduler is not None and running:
+                scheduler.abandon(running)
+            for future in futures:
+                open_attempts.get(attempts[future][0], set()).discard(future)
+
+        @stack.callback
+        def drop_queued() -> None:
+            # If we bail out early, don't leave our pages queued behind other tasks
+            for future in attempts:
+                drop(future)
+
+        def finish_page(idx, attempt, transcription=None, error="", progress=True) -> None:
+            """Record the outcome of page *idx*; *attempt* is the call it came from."""
             pos = idx_to_subset_pos[idx]
             page_num = idx + 1
+            route = call_routes.get((idx, attempt), primary)
+            give_up(open_attempts.pop(idx, set()))
+            if transcription is not None:
+                results[pos] = transcription.text
+                telemetry.PAGES_TRANSCRIBED.inc(backend=route.backend, model=route.model)
+                if on_page_result is not None:
+                    on_page_result(idx, results[pos])
+            else:
+                if failed_pages is not None:
+                    failed_pages.append({"page": page_num, "error": error})
+                results[pos] = "\n\n" + FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(page_num) + "\n\n"
+
+            started = call_started.get((idx, attempt))
+            if page_metrics is not None and started is not None:
+                finished = call_times.get((idx, attempt), (started, time.perf_counter()))[1]
+                page_metrics[idx] = {
+                    "start_ms": (started - origin) * 1000,
+                    "queue_ms": (started - submitted[idx]) * 1000,
+                    "api_ms": (finished - started) * 1000,
+                    "retries": transcription.retries if transcription else 0,
+                    "input_tokens": transcription.input_tokens if transcription else None,
+                    "output_tokens": transcription.output_tokens if transcription else None,
+                    "failed": transcription is None,
+                    "attempts": tries[idx] + 1,
+                    "backend": route.backend,
+                    "model": route.model,
+                }
+
+            if progress and on_page_done is not None:
+                on_page_done(idx)
+
+        def park(idx: int, reason: Exception) -> None:
+            if idx not in parked_since:
+                logger.info("Page %d parked: %s", idx + 1, reason)
+                parked_since[idx] = time.perf_counter()
+            parked.add(idx)
+
+        def settle(future: Future) -> None:
+            """Handle a finished attempt; the first success wins its page."""
+            idx, attempt = attempts[future]
+            route = call_routes[(idx, attempt)]
+            open_attempts.get(idx, set()).discard(future)
+            if results[idx_to_subset_pos[idx]] is not None:
+                return
+            if future.cancelled():
+                # Dropped from the scheduler by a cancel in another thread
+                telemetry.QUEUE_DEPTH.dec()
+                if not open_attempts.get(idx):
+                    finish_page(idx, attempt, error=CANCELLED_PAGE_ERROR, progress=False)
+                return
             try:
-                results[pos] = future.result()
+                transcription = _as_transcription(future.result())
+            except CircuitOpen as exc:
+                if open_attempts.get(idx):
+                    return
+                if park_refused:
+                    park(idx, exc)
+                    return
+                telemetry.PAGE_FAILURES.inc(backend=route.backend, model=route.model, error="CircuitOpen")
+                logger.warning("Page %d failed: %s", idx + 1, exc)
+                finish_page(idx, attempt, error=str(exc))
+                return
             except Exception as exc:
-                err_msg = str(exc) or type(exc).__name__
-                logger.exception("Page %d transcription failed", page_num)
-                if failed_pages is not None:
-                    failed_pages.append({"page": page_num, "error": err_msg})
-                results[pos] = (
-                    "\n\n"
-                    + FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(page_num)
-                    + "\n\n"
+                telemetry.PAGE_FAILURES.inc(
+                    backend=route.backend, model=route.model, error=type(exc).__name__
                 )
-
-            if on_page_done is not None:
-                on_page_done(idx)
+                if (
+                    park_refused
+                    and not open_attempts.get(idx)
+                    and circuit_breaker.counts_as_outage(exc)
+                    and _breaker_state(route) != circuit_breaker.CLOSED
+                ):
+                    # The outage that opened the breaker: wait for it like refused pages
+                    park(idx, exc)
+                    return
+                if open_attempts.get(idx):
+                    logger.warning("Page %d attempt %d failed: %s", idx + 1, attempt + 1, exc)
+                    return
+                logger.exception("Page %d transcription failed", idx + 1)
+                finish_page(idx, attempt, error=str(exc) or type(exc).__name__)
+                return
+            started, finished = call_times[(idx, attempt)]
+            latencies.append(finished - started)
+            reason = resend_reasons.get((idx, attempt))
+            if reason:
+                logger.info("Page %d: %s call to %s finished first", idx + 1, reason, route.backend)
+                telemetry.PAGE_RESUBMIT_WINS.inc(backend=route.backend, model=route.model, reason=reason)
+            finish_page(idx, attempt, transcription)
+
+        def stop(pending: set[Future], error: str, grace: float, progress: bool) -> None:
+            """Drop queued pages, give in-flight calls *grace* seconds, fail the rest with *error*."""
+            for future in pending:
+                drop(future)
+            # wait() never reports futures cancelled before they started
+            running = {f for f in pending if not f.cancelled()}
+            done, running = wait(running, timeout=grace)
+            for future in sorted(done, key=attempts.get):
+                settle(future)
+            give_up(running)
+            for future in sorted(pending, key=attempts.get):
+                idx, attempt = attempts[future]
+                if results[idx_to_subset_pos[idx]] is None:
+                    finish_page(idx, max(tries[idx], attempt), error=error, progress=progress)
+            for idx in sorted(parked):
+                finish_page(idx, tries[idx], error=error, progress=progress)
+            logger.info(
+                "%s: %d page(s) dropped, %d parked, %d in-flight call(s) abandoned",
+                error,
+                sum(1 for f in pending if f.cancelled()),
+                len(parked),
+                len(running),
+            )
+            parked.clear()
+
+        def expire(pending: set[Future], now: float) -> None:
+            """Abandon calls running longer than ``PAGE_DEADLINE_SECONDS``."""
+            expired = {
+                f
+                for f in pending
+                if now - call_started.get(attempts[f], now) > page_deadline and not f.done()
+            }
+            give_up(expired)
+            for future in sorted(expired, key=attempts.get):
+                idx, attempt = attempts[future]
+                if results[idx_to_subset_pos[idx]] is None and not open_attempts.get(idx):
+                    telemetry.PAGE_FAILURES.inc(backend=backend, model=model, error="PageTimeout")
+                    logger.warning("Page %d timed out after %gs", idx + 1, page_deadline)
+                    finish_page(idx, attempt, error=f"Timed out after {page_deadline:g}s.")
+
+        def unpark(now: float) -> None:
+            """Send parked pages again once the breaker allows; fail those parked too long."""
+            state = _breaker_state(primary)
+            for idx in sorted(parked):
+                if park_limit > 0 and now - parked_since[idx] > park_limit:
+                    parked.discard(idx)
+                    telemetry.PAGE_FAILURES.inc(backend=backend, model=model, error="CircuitOpen")
+                    logger.warning("Page %d failed: parked for %gs behind an open circuit", idx + 1, park_limit)
+                    finish_page(
+                        idx, tries[idx], error=f"Circuit open for {backend} / {model} for over {park_limit:g}s."
+                    )
+                elif state != circuit_breaker.OPEN:
+                    parked.discard(idx)
+                    send(idx, front=True)
+                    if state == circuit_breaker.HALF_OPEN:
+                        # Only one page probes; the rest follow once it closes
+                        state = circuit_breaker.OPEN
+
+        def resubmit_stragglers(pending: set[Future], now: float) -> None:
+            """Send pages running far longer than this call's median latency again."""
+            nonlocal straggler_budget
+            if not straggler_budget or len(latencies) < straggler_min_samples:
+                return
+            threshold = max(straggler_factor * statistics.median(latencies), _STRAGGLER_MIN_SECONDS)
+            for future in sorted(pending, key=attempts.get):
+                idx, attempt = attempts[future]
+                started = call_started.get((idx, attempt))
+                if tries[idx] or started is None or now - started < threshold:
+                    continue
+                logger.info(
+                    "Page %d running for %.1fs (median %.1fs): resubmitting",
+                    idx + 1,
+                    now - started,
+                    statistics.median(latencies),
+                )
+                send(idx, reason="straggler")
+                straggler_budget -= 1
+                if not straggler_budget:
+                    break
+
+        def hedge(pending: set[Future], now: float) -> None:
+            """Hedge first calls running past the observed ``HEDGE_PERCENTILE`` latency."""
+            threshold = hedging.hedge_after(backend, model)
+            if threshold is None or _breaker_state(hedge_route) == circuit_breaker.OPEN:
+                return
+            for future in sorted(pending, key=attempts.get):
+                idx, attempt = attempts[future]
+                started = call_started.get((idx, attempt))
+                if tries[idx] or started is None or now - started < threshold:
+                    continue
+                if not hedging.try_spend():
+                    break
+                logger.info(
+                    "Page %d running for %.1fs (p%g %.1fs): hedging to %s",
+                    idx + 1,
+                    now - started,
+                    getattr(settings, "HEDGE_PERCENTILE", 95),
+                    threshold,
+                    hedge_route.backend,
+                )
+                send(idx, hedge_route, reason="hedge")
+
+        for idx in indices_to_process:
+            submitted[idx] = time.perf_counter()
+            send(idx)
+
+        while open_attempts or parked:
+            pending = set().union(*open_attempts.values())
+            if pending:
+                done, pending = wait(
+                    pending,
+                    timeout=_WATCH_SECONDS if watching or parked else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in sorted(done, key=attempts.get):
+                    settle(future)
+            else:
+                # Only parked pages left
+                (cancel_event or threading.Event()).wait(_WATCH_SECONDS)
+            # Settling a page gives up on its other attempts
+            pending = set().union(*open_attempts.values())
+            if not pending and not parked:
+                break
+            if cancel_event is not None and cancel_event.is_set():
+                grace = getattr(settings, "CANCEL_GRACE_SECONDS", 5)
+                stop(pending, CANCELLED_PAGE_ERROR, grace, progress=False)
+                break
+            if task_deadline is not None and time.monotonic() >= task_deadline:
+                telemetry.PAGE_FAILURES.inc(
+                    len({attempts[f][0] for f in pending}), backend=backend, model=model, error="TaskDeadline"
+                )
+                stop(pending, f"Task deadline of {task_timeout:g}s exceeded.", 0, progress=True)
+                break
+            now = time.perf_counter()
+            if parked:
+                unpark(now)
+            if page_deadline > 0:
+                expire(pending, now)
+            if hedge_route is not None:
+                hedge(pending, now)
+            resubmit_stragglers(pending, now)
 
     page_results_list = [r for r in results if r is not None]
     full_markdown = "\n\n".join(page_results_list) if page_results_list else ""
@@ -117,16 +545,65 @@ def transcribe_images_to_markdown(
     return (None, list(results))
 
 
+class _Route(NamedTuple):
+    """Where a call goes: backend name, model and the function that calls it.
+
+    The multi backend has no function of its own; each call goes to one of
+    its *members*, picked by weight and load.
+    """
+
+    backend: str
+    model: str
+    fn: Optional[TranscribeFn]
+    weight: float = 1.0
+    members: tuple["_Route", ...] = ()
+
+
+def _route(backend: str, config: VisionConfig, cassette: str) -> _Route:
+    if backend == multi_backend.MULTI_BACKEND:
+        members = tuple(
+            _route(name, config, cassette)._replace(weight=weight)
+            for name, weight in multi_backend.member_weights(_registered_backends).items()
+        )
+        if not members:
+            raise ValueError("Multi-backend mode has no configured backends (see VISION_MULTI_WEIGHTS).")
+        return _Route(backend, " + ".join(m.model for m in members), None, members=members)
+    if backend == "openai":
+        fn, model = _openai_transcribe_page, config.openai_model
+    elif backend == "gemini":
+        fn, model = _gemini_transcribe_page, config.gemini_model
+    elif backend in _registered_backends:
+        fn, model = _registered_backends[backend], backend
+    else:
+        raise ValueError(f"Unknown VISION_BACKEND: {backend!r}")
+    if cassette:
+        fn = wrap_transcribe_fn(fn, backend, cassette)
+    return _Route(backend, model, fn)
+
+
+def _breaker_state(route: _Route) -> str:
+    """The most permissive circuit breaker state among *route* (or its members)."""
+    states = {circuit_breaker.state(m.backend, m.model) for m in route.members or (route,)}
+    for state in (circuit_breaker.CLOSED, circuit_breaker.HALF_OPEN):
+        if state in states:
+            return state
+    return circuit_breaker.OPEN
+
+
+def _as_transcription(result: Union[PageTranscription, str]) -> PageTranscription:
+    if isinstance(result, PageTranscription):
+        return result
+    return PageTranscription(result)
+
+
 # ── OpenAI backend ────────────────────────────────────────────
 
 
-def _openai_transcribe_page(base64_image: str, prompt: str, model: str) -> str:
+def _openai_transcribe_page(base64_image: str, prompt: str, model: str) -> PageTranscription:
     """Transcribe a single page image using the OpenAI chat completions API."""
-    from openai import OpenAI
+    from openai import DEFAULT_MAX_RETRIES, OpenAI
 
-    client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-    response = client.chat.completions.create(
+    request = dict(
         model=model,
         response_format={"type": "text"},
         messages=[
@@ -153,27 +630,79 @@ def _openai_transcribe_page(base64_image: str, prompt: str, model: str) -> str:
         ],
     )
 
-    return response.choices[0].message.content
+    # With several keys the pool retries, so a 429 moves to another key
+    # instead of the SDK retrying it on the same one
+    pooled = len(key_pool.provider_keys("openai")) > 1
+    attempts = 0
+
+    def create(api_key: str):
+        nonlocal attempts
+        attempts += 1
+        client = OpenAI(
+            api_key=api_key,
+            base_url=settings.OPENAI_BASE_URL or None,
+            timeout=getattr(settings, "VISION_REQUEST_TIMEOUT", 90),
+            max_retries=0 if pooled else DEFAULT_MAX_RETRIES,
+        )
+        # The raw response exposes the rate-limit headers and how many times
+        # the SDK retried (429/5xx)
+        return client.chat.completions.with_raw_response.create(**request)
+
+    raw = key_pool.call_with_key(
+        "openai",
+        create,
+        headers_of=lambda raw: raw.headers,
+        retries=DEFAULT_MAX_RETRIES if pooled else 0,
+    )
+
+    response = raw.parse()
+    usage = response.usage
+    return PageTranscription(
+        response.choices[0].message.content,
+        input_tokens=usage.prompt_tokens if usage else None,
+        output_tokens=usage.completion_tokens if usage else None,
+        retries=attempts - 1 + raw.retries_taken,
+    )
 
 
 # ── Gemini backend ────────────────────────────────────────────
 
 
-def _gemini_transcribe_page(base64_image: str, prompt: str, model: str) -> str:
+def _gemini_transcribe_page(base64_image: str, prompt: str, model: str) -> PageTranscription:
     """Transcribe a single page image using the Google Gemini API."""
     import base64
     import io
 
     from google import genai
+    from google.genai import types
     from PIL import Image
 
-    client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    http_options = types.HttpOptions(
+        base_url=settings.GEMINI_BASE_URL or None,
+        # Milliseconds
+        timeout=int(getattr(settings, "VISION_REQUEST_TIMEOUT", 90) * 1000),
+    )
     image_bytes = base64.b64decode(base64_image)
     pil_image = Image.open(io.BytesIO(image_bytes))
 
-    response = client.models.generate_content(
-        model=model,
-        contents=[prompt, pil_image],
+    def generate(api_key: str):
+        client = genai.Client(api_key=api_key, http_options=http_options)
+        return client.models.generate_content(
+            model=model,
+            contents=[prompt, pil_image],
+        )
+
+    response = key_pool.call_with_key("gemini", generate, headers_of=_gemini_headers)
+
+    usage = response.usage_metadata
+    return PageTranscription(
+        response.text,
+        input_tokens=usage.prompt_token_count if usage else None,
+        output_tokens=usage.candidates_token_count if usage else None,
     )
 
-    return response.text
+
+def _gemini_headers(response):
+    """HTTP headers of a Gemini response, when the SDK exposes them."""
+    http_response = getattr(response, "sdk_http_response", None)
+    return getattr(http_response, "headers", None)
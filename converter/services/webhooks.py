@@ -0,0 +1,282 @@
+"""Completion webhooks and the task JSON shared with the task API.
+
+A task submitted with a ``webhook_url`` gets a POST to that URL whenever one
+of its runs ends (success, partial success, failure or cancellation)::
+
+    {"event": "task.finished", "delivery": "<hex id>", "task": {...}}
+
+``task`` is ``task_payload()``, the same object ``GET /api/tasks/<pk>/``
+returns. With ``WEBHOOK_SECRET`` set, each attempt carries
+``X-Converter-Signature: t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>">``;
+receivers check it with ``verify()`` (or the same computation) and reject old
+timestamps to prevent replays.
+
+Deliveries run on a background thread. Network errors, 408, 429 and 5xx
+answers are retried up to ``WEBHOOK_MAX_ATTEMPTS`` times with exponential
+backoff (``WEBHOOK_RETRY_BACKOFF`` seconds, doubling); other answers end the
+delivery. The outcome is stored in ``ConversionTask.webhook_status``.
+Redirects are not followed.
+
+Webhook URLs are checked by ``check_url()`` on submission and before every
+attempt, so a task cannot make the server call its own network: with
+``WEBHOOK_ALLOWED_HOSTS`` set only those hosts are accepted, otherwise only
+hosts whose addresses are all public. Each attempt connects to the addresses
+that check approved rather than resolving the host again, so a DNS answer
+changed in between (rebinding) cannot redirect it.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+import uuid
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from converter.models import ConversionTask
+
+from . import telemetry
+
+logger = logging.getLogger(__name__)
+
+EVENT = "task.finished"
+SIGNATURE_HEADER = "X-Converter-Signature"
+FINISHED_STATUSES = (
+    ConversionTask.Status.SUCCESS,
+    ConversionTask.Status.PARTIAL_SUCCESS,
+    ConversionTask.Status.FAILED,
+    ConversionTask.Status.CANCELLED,
+)
+
+_RETRY_STATUSES = {408, 429}
+_STATUS_MAX_LENGTH = 200
+
+
+def task_payload(task: ConversionTask) -> dict:
+    """JSON-serializable summary of *task* (status, progress, failures, links)."""
+    status = task.effective_status
+    urls = {
+        "self": reverse("converter:task_detail_api", args=[task.pk]),
+        "result": reverse("converter:task_result_api", args=[task.pk]),
+        "page": reverse("converter:result", args=[task.pk]),
+    }
+    if task.markdown_file:
+        urls["download"] = reverse("converter:download", args=[task.pk])
+    return {
+        "id": task.pk,
+        "status": status,
+        "original_filename": task.original_filename,
+        "source_sha256": task.source_sha256,
+        "start_page": task.start_page,
+        "end_page": task.end_page,
+        "priority": ConversionTask.Priority(task.priority).label.lower(),
+        "page_count": task.page_count,
+        "pages_processed": task.pages_processed,
+        "failed_pages": task.failed_pages or [],
+        "error_message": task.effective_error_message if status in (ConversionTask.Status.FAILED, ConversionTask.Status.CANCELLED) else "",
+        "vision_backend": task.vision_backend,
+        "vision_model": task.vision_model,
+        "processing_time_seconds": task.processing_time_seconds,
+        "webhook_status": task.webhook_status,
+        "created_at": task.created_at.isoformat(),
+        "updated_at": task.updated_at.isoformat(),
+        "urls": urls,
+    }
+
+
+# ── Signatures ────────────────────────────────────────────────
+
+
+def sign(body: bytes, secret: str, timestamp: int | None = None) -> str:
+    """Return the ``X-Converter-Signature`` header value for *body*."""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify(body: bytes, header: str, secret: str, tolerance: float = 300, now: float | None = None) -> bool:
+    """True if *header* is a valid signature of *body* made within *tolerance* seconds."""
+    try:
+        parts = dict(item.split("=", 1) for item in header.split(","))
+        timestamp = int(parts["t"])
+    except (ValueError, KeyError):
+        return False
+    now = time.time() if now is None else now
+    if abs(now - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(body, secret, timestamp), f"t={timestamp},v1={parts.get('v1', '')}")
+
+
+# ── Targets ───────────────────────────────────────────────────
+
+
+def check_url(url: str) -> list[str]:
+    """Raise ValueError unless webhooks may be sent to *url*; return the addresses to use.
+
+    With ``WEBHOOK_ALLOWED_HOSTS`` set, the host must be listed (an entry
+    starting with a dot also matches subdomains) and may resolve anywhere;
+    the returned list is empty and the host is connected to by name.
+    Otherwise every address the host resolves to must be public: loopback,
+    private, link-local (cloud metadata) and reserved addresses are refused.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("Webhook URLs must be http or https URLs with a host.")
+    host = parts.hostname.rstrip(".").lower()
+    allowed = [entry.lower() for entry in getattr(settings, "WEBHOOK_ALLOWED_HOSTS", [])]
+    if allowed:
+        if not any(host == entry.lstrip(".") or (entry.startswith(".") and host.endswith(entry)) for entry in allowed):
+            raise ValueError(f"Webhook host {host} is not in WEBHOOK_ALLOWED_HOSTS.")
+        return []
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (OSError, UnicodeError) as exc:
+        raise ValueError(f"Webhook host {host} does not resolve.") from exc
+    for address in sorted(addresses):
+        if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+            raise ValueError(
+                f"Webhook host {host} resolves to a non-public address ({address}); "
+                "list it in WEBHOOK_ALLOWED_HOSTS to allow it."
+            )
+    return sorted(addresses)
+
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to *addresses* (from ``check_url()``) instead of looking the host up again.
+
+    The Host header, and for HTTPS the server name (SNI) and certificate
+    check, still use the URL's host. Without *addresses* it connects by name.
+    """
+
+    def __init__(self, host, port=None, *, addresses=(), **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.addresses = list(addresses)
+
+    def connect(self):
+        if not self.addresses:
+            return super().connect()
+        self.sock = self._pinned_socket()
+
+    def _pinned_socket(self) -> socket.socket:
+        error = None
+        for address in self.addresses:
+            try:
+                return socket.create_connection((address, self.port), self.timeout, self.source_address)
+            except OSError as exc:
+                error = exc
+        raise error
+
+
+class _PinnedHTTPSConnection(_PinnedHTTPConnection, http.client.HTTPSConnection):
+    def connect(self):
+        if not self.addresses:
+            return http.client.HTTPSConnection.connect(self)
+        self.sock = self._context.wrap_socket(self._pinned_socket(), server_hostname=self.host)
+
+
+# ── Delivery ──────────────────────────────────────────────────
+
+
+def task_finished(task_id: int) -> None:
+    """Send the completion webhook of *task_id*, if it has one and its run has ended.
+
+    Never raises: a webhook problem must not change the outcome of the run.
+    """
+    try:
+        _schedule(task_id)
+    except Exception:
+        logger.exception("Task %d: could not schedule the completion webhook", task_id)
+
+
+def _schedule(task_id: int) -> None:
+    task = ConversionTask.objects.filter(pk=task_id).first()
+    if task is None or not task.webhook_url or task.status not in FINISHED_STATUSES:
+        return
+    body = json.dumps(
+        {"event": EVENT, "delivery": uuid.uuid4().hex, "task": task_payload(task)},
+        separators=(",", ":"),
+    ).encode()
+    ConversionTask.objects.filter(pk=task_id).update(webhook_status="pending")
+    # Not a daemon: a worker process that exits waits for its deliveries
+    threading.Thread(
+        target=_deliver,
+        args=(task_id, task.webhook_url, body),
+        name=f"webhook-task-{task_id}",
+    ).start()
+
+
+def _deliver(task_id: int, url: str, body: bytes) -> None:
+    attempts = max(1, getattr(settings, "WEBHOOK_MAX_ATTEMPTS", 5))
+    backoff = getattr(settings, "WEBHOOK_RETRY_BACKOFF", 2.0)
+    try:
+        for attempt in range(1, attempts + 1):
+            try:
+                # Again for every attempt: the host may resolve differently by now
+                addresses = check_url(url)
+            except ValueError as exc:
+                status, error = None, str(exc)
+                break
+            status, error = _post(url, body, addresses)
+            if status is not None and 200 <= status < 300:
+                telemetry.WEBHOOK_DELIVERIES.inc(result="delivered")
+                _record(task_id, f"delivered (HTTP {status}, attempt {attempt})")
+                logger.info("Task %d: webhook delivered to %s", task_id, url)
+                return
+            retryable = status is None or status in _RETRY_STATUSES or status >= 500
+            if not retryable or attempt == attempts:
+                break
+            telemetry.WEBHOOK_DELIVERIES.inc(result="retried")
+            logger.warning("Task %d: webhook attempt %d failed (%s); retrying", task_id, attempt, error)
+            time.sleep(backoff * 2 ** (attempt - 1))
+        telemetry.WEBHOOK_DELIVERIES.inc(result="failed")
+        _record(task_id, f"failed after {attempt} attempt(s): {error}")
+        logger.error("Task %d: webhook to %s failed: %s", task_id, url, error)
+    finally:
+        connection.close()
+
+
+def _post(url: str, body: bytes, addresses: list[str] = ()) -> tuple[int | None, str]:
+    """POST *body* once to one of *addresses* (by name if empty).
+
+    Return (HTTP status or None, description of the failure). Redirects are
+    answers like any other: their target was never checked.
+    """
+    headers = {"Content-Type": "application/json", "User-Agent": "pdf-to-markdown-webhook"}
+    secret = getattr(settings, "WEBHOOK_SECRET", "")
+    if secret:
+        headers[SIGNATURE_HEADER] = sign(body, secret)
+    parts = urllib.parse.urlsplit(url)
+    timeout = getattr(settings, "WEBHOOK_TIMEOUT", 10)
+    if parts.scheme == "https":
+        conn = _PinnedHTTPSConnection(
+            parts.hostname, parts.port, addresses=addresses, timeout=timeout, context=ssl.create_default_context()
+        )
+    else:
+        conn = _PinnedHTTPConnection(parts.hostname, parts.port, addresses=addresses, timeout=timeout)
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    try:
+        conn.request("POST", path, body=body, headers=headers)
+        status = conn.getresponse().status
+    except (OSError, http.client.HTTPException) as exc:
+        return None, str(exc) or type(exc).__name__
+    finally:
+        conn.close()
+    if 200 <= status < 300:
+        return status, ""
+    return status, f"HTTP {status}"
+
+
+def _record(task_id: int, outcome: str) -> None:
+    ConversionTask.objects.filter(pk=task_id).update(webhook_status=outcome[:_STATUS_MAX_LENGTH])
@@ -0,0 +1,48 @@
+"""Model signal receivers for the converter app (connected in ``apps.py``)."""
+
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from .models import AppSettings, ConversionTask, invalidate_vision_config
+from .services.cancellation import signal_cancel
+from .services.search import get_search_backend, index_filename, invalidate_fts_tables, unindex_filename
+
+
+@receiver(post_save, sender=ConversionTask)
+def index_task_filename(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the filename search index in sync when a task is created or renamed."""
+    if created or update_fields is None or "original_filename" in update_fields:
+        index_filename(instance.pk, instance.original_filename)
+
+
+@receiver(post_delete, sender=ConversionTask)
+def unindex_task(sender, instance, **kwargs):
+    """Drop a deleted task from the filename and content search indexes."""
+    unindex_filename(instance.pk)
+    get_search_backend().delete_task(instance.pk)
+
+
+@receiver(post_migrate)
+def search_tables_migrated(sender, **kwargs):
+    """Migrations may create or drop the FTS tables: look them up again."""
+    invalidate_fts_tables()
+
+
+@receiver(post_delete, sender=ConversionTask)
+def stop_deleted_task(sender, instance, **kwargs):
+    """Stop transcribing a task deleted while it runs (other processes notice on their next page)."""
+    signal_cancel(instance.pk)
+
+
+@receiver(post_save, sender=AppSettings)
+@receiver(post_delete, sender=AppSettings)
+def app_settings_changed(sender, **kwargs):
+    """Backend/model overrides changed: drop cached vision configs everywhere."""
+    invalidate_vision_config()
+
+
+@receiver(setting_changed)
+def vision_setting_changed(sender, setting, **kwargs):
+    if setting in ("VISION_BACKEND", "OPENAI_VISION_MODEL", "GEMINI_VISION_MODEL"):
+        invalidate_vision_config()
@@ -1,3 +1,742 @@
-from django.test import TestCase
+import io
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from converter.bench.mock_backend import MockServerError
+from converter.models import ConversionTask, TaskShard, VisionConfig
+from converter.services import (
+    cascade,
+    circuit_breaker,
+    compression,
+    downloads,
+    key_pool,
+    processing,
+    rendering,
+    search,
+    sharding,
+    vision,
+    webhooks,
+)
+from converter.services.cancellation import CANCELLED_PAGE_ERROR, cancel_scope, signal_cancel
+
+
+class ScriptedBackend:
+    """Registered vision backend whose answer depends on the page "image".
+
+    ``script`` maps an image to a function of the call number for that image
+    (0 for the first call); it returns the Markdown or raises. Calls told to
+    ``hang`` block until the test ends.
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = Counter()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, base64_image, prompt, model):
+        with self._lock:
+            call_no = self.calls[base64_image]
+            self.calls[base64_image] += 1
+        return self.script[base64_image](self, call_no)
+
+    def hang(self):
+        self.release.wait(10)
+        return "too late"
+
+
+def answer(text, delay=0.0):
+    def respond(backend, call_no):
+        time.sleep(delay)
+        return text
+
+    return respond
+
+
+def hang(backend, call_no):
+    return backend.hang()
+
+
+def fail(backend, call_no):
+    raise MockServerError(f"Simulated server error (call {call_no})")
+
+
+# Deterministic defaults: pool instead of the shared scheduler, no hedging,
+# no deadlines, stragglers or breakers unless a test turns them on
+@override_settings(
+    SCHEDULER_WORKERS=0,
+    VISION_MAX_WORKERS=4,
+    VISION_CASSETTE_MODE="",
+    HEDGE_ENABLED=False,
+    PAGE_DEADLINE_SECONDS=0,
+    TASK_DEADLINE_SECONDS=0,
+    STRAGGLER_FACTOR=0,
+    BREAKER_ERROR_RATE=0,
+)
+class TranscribeImagesTests(SimpleTestCase):
+    """Behaviour of ``vision.transcribe_images_to_markdown`` with registered backends."""
+
+    def setUp(self):
+        circuit_breaker.registry.reset()
+        self.addCleanup(circuit_breaker.registry.reset)
+
+    def register(self, name, script):
+        backend = ScriptedBackend(script)
+        vision.register_backend(name, backend)
+        self.addCleanup(vision.register_backend, name, None)
+        # Let abandoned calls finish so their threads end with the test
+        self.addCleanup(backend.release.set)
+        return backend
+
+    def transcribe(self, backend_name, images, **kwargs):
+        failed_pages, page_metrics = [], {}
+        _, results = vision.transcribe_images_to_markdown(
+            images,
+            "prompt",
+            failed_pages=failed_pages,
+            page_metrics=page_metrics,
+            config=VisionConfig(backend_name, "", ""),
+            **kwargs,
+        )
+        return results, failed_pages, page_metrics
+
+    # ── Deadlines ─────────────────────────────────────────────
+
+    @override_settings(PAGE_DEADLINE_SECONDS=0.3)
+    def test_page_deadline_fails_only_the_slow_page(self):
+        self.register("scripted", {"a": answer("A"), "b": hang})
+
+        started = time.monotonic()
+        results, failed, metrics = self.transcribe("scripted", ["a", "b"])
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results[0], "A")
+        self.assertIn(vision.FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(2), results[1])
+        self.assertEqual(failed, [{"page": 2, "error": "Timed out after 0.3s."}])
+        self.assertTrue(metrics[1]["failed"])
+
+    @override_settings(TASK_DEADLINE_SECONDS=0.3, VISION_MAX_WORKERS=1)
+    def test_task_deadline_fails_running_and_queued_pages(self):
+        self.register("scripted", {"a": answer("A"), "b": hang, "c": answer("C")})
+        done = []
+
+        started = time.monotonic()
+        results, failed, _ = self.transcribe("scripted", ["a", "b", "c"], on_page_done=done.append)
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results[0], "A")
+        error = "Task deadline of 0.3s exceeded."
+        self.assertEqual(failed, [{"page": 2, "error": error}, {"page": 3, "error": error}])
+        # Expired pages still count as done for progress
+        self.assertEqual(sorted(done), [0, 1, 2])
+
+    # ── Stragglers ────────────────────────────────────────────
+
+    @override_settings(STRAGGLER_FACTOR=2, STRAGGLER_MIN_SAMPLES=2, STRAGGLER_MAX_FRACTION=1)
+    @mock.patch.object(vision, "_STRAGGLER_MIN_SECONDS", 0.2)
+    def test_straggler_is_resent_and_first_answer_wins(self):
+        backend = self.register(
+            "scripted",
+            {
+                "a": answer("A", 0.05),
+                "b": answer("B", 0.05),
+                "slow": lambda backend, call_no: backend.hang() if call_no == 0 else "resent",
+            },
+        )
+
+        results, failed, metrics = self.transcribe("scripted", ["a", "b", "slow"])
+
+        self.assertEqual(results, ["A", "B", "resent"])
+        self.assertEqual(failed, [])
+        self.assertEqual(backend.calls["slow"], 2)
+        self.assertEqual(backend.calls["a"], 1)
+        self.assertEqual(metrics[2]["attempts"], 2)
+        self.assertFalse(metrics[2]["failed"])
+
+    # ── Cancellation ──────────────────────────────────────────
+
+    @override_settings(CANCEL_GRACE_SECONDS=1, VISION_MAX_WORKERS=3)
+    def test_cancel_keeps_pages_finished_within_grace(self):
+        self.register(
+            "scripted",
+            {"a": answer("A"), "b": answer("B", 0.3), "c": hang, "d": hang},
+        )
+        cancel = threading.Event()
+
+        def on_page_result(idx, markdown):
+            if idx == 0:
+                cancel.set()
+
+        done = []
+        results, failed, _ = self.transcribe(
+            "scripted",
+            ["a", "b", "c", "d"],
+            cancel_event=cancel,
+            on_page_result=on_page_result,
+            on_page_done=done.append,
+        )
+
+        # "a" finished before the cancel, "b" during the grace period
+        self.assertEqual(results[:2], ["A", "B"])
+        # "c" and "d" were still running or queued when the grace period ended
+        self.assertEqual(
+            failed,
+            [{"page": 3, "error": CANCELLED_PAGE_ERROR}, {"page": 4, "error": CANCELLED_PAGE_ERROR}],
+        )
+        self.assertEqual(sorted(done), [0, 1])
+
+    # ── Circuit breakers ──────────────────────────────────────
+
+    def trip(self, backend, model):
+        for _ in range(2):
+            circuit_breaker.registry.record(backend, model, failed=True, probe=False)
+        self.assertEqual(circuit_breaker.state(backend, model), circuit_breaker.OPEN)
+
+    @override_settings(
+        BREAKER_ERROR_RATE=0.5,
+        BREAKER_MIN_CALLS=2,
+        BREAKER_OPEN_SECONDS=0.3,
+        BREAKER_MODE="park",
+        BREAKER_PARK_SECONDS=10,
+    )
+    def test_parked_pages_are_sent_once_the_breaker_closes(self):
+        backend = self.register("scripted", {"a": answer("A"), "b": answer("B"), "c": answer("C")})
+        self.trip("scripted", "scripted")
+
+        results, failed, metrics = self.transcribe("scripted", ["a", "b", "c"])
+
+        self.assertEqual(results, ["A", "B", "C"])
+        self.assertEqual(failed, [])
+        # Refused calls never reached the backend; each page was answered by its resend
+        self.assertEqual(sum(backend.calls.values()), 3)
+        self.assertTrue(all(metrics[idx]["attempts"] == 2 for idx in range(3)))
+        self.assertEqual(circuit_breaker.state("scripted", "scripted"), circuit_breaker.CLOSED)
+
+    @override_settings(
+        BREAKER_ERROR_RATE=0.5,
+        BREAKER_MIN_CALLS=2,
+        BREAKER_OPEN_SECONDS=60,
+        BREAKER_MODE="park",
+        BREAKER_PARK_SECONDS=0.3,
+    )
+    def test_pages_parked_too_long_fail(self):
+        backend = self.register("scripted", {"a": answer("A")})
+        self.trip("scripted", "scripted")
+
+        results, failed, _ = self.transcribe("scripted", ["a"])
+
+        self.assertEqual(failed, [{"page": 1, "error": "Circuit open for scripted / scripted for over 0.3s."}])
+        self.assertEqual(backend.calls["a"], 0)
+
+    @override_settings(BREAKER_ERROR_RATE=0.5, BREAKER_MIN_CALLS=2, BREAKER_OPEN_SECONDS=60, BREAKER_MODE="fail")
+    def test_refused_pages_fail_at_once_in_fail_mode(self):
+        self.register("scripted", {"a": answer("A")})
+        self.trip("scripted", "scripted")
+
+        _, failed, _ = self.transcribe("scripted", ["a"])
+
+        self.assertEqual(len(failed), 1)
+        self.assertTrue(failed[0]["error"].startswith("Circuit open for scripted / scripted"))
+
+    # ── Multi-backend ─────────────────────────────────────────
+
+    @override_settings(VISION_MULTI_WEIGHTS={"scripted-down": 1.0, "scripted-up": 1.0})
+    def test_multi_backend_fails_over_to_a_healthy_member(self):
+        down = self.register("scripted-down", {"a": fail, "b": fail, "c": fail})
+        self.register("scripted-up", {"a": answer("A"), "b": answer("B"), "c": answer("C")})
+
+        results, failed, metrics = self.transcribe("multi", ["a", "b", "c"])
+
+        self.assertEqual(results, ["A", "B", "C"])
+        self.assertEqual(failed, [])
+        self.assertGreater(sum(down.calls.values()), 0)
+        self.assertEqual({metrics[idx]["backend"] for idx in range(3)}, {"scripted-up"})
+
+    @override_settings(VISION_MULTI_WEIGHTS={"scripted-down": 1.0, "scripted-up": 1.0})
+    def test_multi_backend_fails_the_page_when_every_member_fails(self):
+        self.register("scripted-down", {"a": fail})
+        self.register("scripted-up", {"a": fail})
+
+        _, failed, _ = self.transcribe("multi", ["a"])
+
+        self.assertEqual(len(failed), 1)
+        self.assertIn("Simulated server error", failed[0]["error"])
+
+
+@override_settings(OPENAI_CASCADE_MODEL="cheap-model", CASCADE_MIN_SCORE=0.7)
+class CascadeTests(SimpleTestCase):
+    """Escalation decisions of ``cascade.transcribe_with_cascade``."""
+
+    config = VisionConfig("openai", "full-model", "")
+
+    def fake_transcribe(self, answers):
+        """Stand-in for the vision call: *answers* maps a model to {image: Markdown or None to fail}."""
+        calls = []
+
+        def transcribe(images, prompt, config, indices_to_process=None, failed_pages=None, page_metrics=None, **kwargs):
+            calls.append((config.openai_model, indices_to_process))
+            indices = indices_to_process if indices_to_process is not None else range(len(images))
+            results = []
+            for idx in indices:
+                text = answers[config.openai_model][images[idx]]
+                if text is None:
+                    failed_pages.append({"page": idx + 1, "error": "boom"})
+                    text = vision.FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(idx + 1)
+                results.append(text)
+            full = "\n\n".join(results) if indices_to_process is None else None
+            return full, results
+
+        return transcribe, calls
+
+    def test_first_pass_failures_are_escalated(self):
+        transcribe, calls = self.fake_transcribe(
+            {
+                "cheap-model": {"a": "Good page " * 20, "b": None},
+                "full-model": {"b": "Recovered page"},
+            }
+        )
+        failed_pages = []
+        with mock.patch.object(cascade, "transcribe_images_to_markdown", transcribe):
+            _, results = cascade.transcribe_with_cascade(
+                ["a", "b"], "prompt", None, self.config, failed_pages=failed_pages
+            )
+
+        self.assertEqual(calls, [("cheap-model", None), ("full-model", [1])])
+        self.assertEqual(results[1], "Recovered page")
+        self.assertEqual(failed_pages, [])
+
+    def test_page_failing_on_both_models_stays_failed(self):
+        transcribe, _ = self.fake_transcribe({"cheap-model": {"a": None}, "full-model": {"a": None}})
+        failed_pages = []
+        with mock.patch.object(cascade, "transcribe_images_to_markdown", transcribe):
+            cascade.transcribe_with_cascade(["a"], "prompt", None, self.config, failed_pages=failed_pages)
+
+        self.assertEqual(failed_pages, [{"page": 1, "error": "boom"}])
+
+
+class TaskApiAccessTests(TestCase):
+    """Every ``/api/tasks/`` view needs the bearer token, or CSRF when none is set."""
+
+    def setUp(self):
+        self.task = ConversionTask.objects.create(original_filename="x.pdf", pdf_file="x.pdf", prompt="p")
+        self.client = Client(enforce_csrf_checks=True)
+        self.mutations = [
+            "/api/tasks/",
+            f"/api/tasks/{self.task.pk}/priority/",
+            f"/api/tasks/{self.task.pk}/cancel/",
+        ]
+
+    @override_settings(API_TOKEN="")
+    def test_without_a_token_mutations_need_csrf(self):
+        for url in self.mutations:
+            self.assertEqual(self.client.post(url, {"priority": "high"}).status_code, 403, url)
+
+        self.client.get("/")
+        csrf = self.client.cookies["csrftoken"].value
+        response = self.client.post(self.mutations[1], {"priority": "high"}, HTTP_X_CSRFTOKEN=csrf)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(API_TOKEN="secret")
+    def test_with_a_token_every_view_needs_it(self):
+        for url in self.mutations:
+            self.assertEqual(self.client.post(url, {"priority": "high"}).status_code, 401, url)
+        self.assertEqual(self.client.get(f"/api/tasks/{self.task.pk}/").status_code, 401)
+
+        response = self.client.post(self.mutations[2], HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], ConversionTask.Status.CANCELLED)
+
+
+@override_settings(HISTORY_PAGE_SIZE=2)
+class HistoryCursorTests(TestCase):
+    """Keyset paging of ``/history/`` over ``(created_at, pk)``."""
+
+    def setUp(self):
+        # Five tasks, the middle three sharing one created_at so ties straddle pages.
+        self.tasks = [
+            ConversionTask.objects.create(original_filename=f"{i}.pdf", pdf_file=f"{i}.pdf", prompt="p")
+            for i in range(5)
+        ]
+        tie = self.tasks[1].created_at
+        ConversionTask.objects.filter(pk__in=[t.pk for t in self.tasks[1:4]]).update(created_at=tie)
+
+    def page(self, **params):
+        response = self.client.get("/history/", params)
+        self.assertEqual(response.status_code, 200)
+        return [t.pk for t in response.context["tasks"]], response.context
+
+    def test_pages_walk_through_ties_without_gaps_or_repeats(self):
+        seen = []
+        pks, context = self.page()
+        while True:
+            seen.extend(pks)
+            if not context["older_cursor"]:
+                break
+            pks, context = self.page(after=context["older_cursor"])
+        self.assertEqual(seen, [t.pk for t in reversed(self.tasks)])
+
+        newer, _ = self.page(before=context["newer_cursor"])
+        self.assertEqual(newer, seen[2:4])
+
+    def test_last_page_has_no_older_cursor(self):
+        _, context = self.page()
+        _, context = self.page(after=context["older_cursor"])
+        pks, context = self.page(after=context["older_cursor"])
+        self.assertEqual(pks, [self.tasks[0].pk])
+        self.assertEqual(context["older_cursor"], "")
+        self.assertNotEqual(context["newer_cursor"], "")
+
+    def test_malformed_cursor_falls_back_to_the_first_page(self):
+        first, _ = self.page()
+        for cursor in ["junk", "1-2-3", "12-", "99999999999999999999999-1"]:
+            self.assertEqual(self.page(after=cursor)[0], first, cursor)
+            self.assertEqual(self.page(before=cursor)[0], first, cursor)
+
+
+class ContentSearchTests(TestCase):
+    """Both search backends show finished tasks only, and forget deleted ones."""
+
+    backends = [search.SQLiteFTSBackend, search.PageResultsScanBackend]
+
+    def setUp(self):
+        Status = ConversionTask.Status
+        self.tasks = {
+            status: ConversionTask.objects.create(
+                original_filename="x.pdf", pdf_file="x.pdf", prompt="p", status=status
+            )
+            for status in [Status.SUCCESS, Status.PROCESSING, Status.PARTIAL_SUCCESS, Status.FAILED]
+        }
+
+    def index(self, backend):
+        for task in self.tasks.values():
+            backend.index_pages(task.pk, {1: "invoice total", 2: "invoice"})
+
+    def test_only_finished_tasks_fill_each_page(self):
+        Status = ConversionTask.Status
+        finished = {self.tasks[Status.SUCCESS].pk, self.tasks[Status.PARTIAL_SUCCESS].pk}
+        for backend_class in self.backends:
+            backend = backend_class()
+            self.index(backend)
+            hits = backend.search("invoice", limit=3)
+            self.assertEqual(len(hits), 3, backend_class)
+            self.assertLessEqual({hit.task_id for hit in hits}, finished, backend_class)
+            self.assertEqual(len(backend.search("invoice", limit=3, offset=3)), 1, backend_class)
+
+    def test_deleted_task_leaves_the_index(self):
+        task = self.tasks[ConversionTask.Status.SUCCESS]
+        for backend_class in self.backends:
+            backend = backend_class()
+            self.index(backend)
+            with mock.patch.object(search, "get_search_backend", return_value=backend):
+                ConversionTask.objects.filter(pk=task.pk).delete()
+            self.assertNotIn(task.pk, {hit.task_id for hit in backend.search("invoice")}, backend_class)
+            task.save(force_insert=True)
+
+    def test_search_api_pages(self):
+        self.index(search.get_search_backend())
+        first = self.client.get("/api/search/", {"q": "invoice", "limit": 3}).json()
+        rest = self.client.get("/api/search/", {"q": "invoice", "limit": 3, "offset": 3}).json()
+        self.assertEqual((len(first["results"]), first["has_more"]), (3, True))
+        self.assertEqual((len(rest["results"]), rest["has_more"]), (1, False))
+
+
+class CompressionDictionaryTests(SimpleTestCase):
+    """Blobs written with a dictionary trained after this process loaded the directory."""
+
+    def test_unknown_dictionary_rereads_the_directory(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(COMPRESSION_DICT_DIR=directory):
+            compression.reset_dictionaries()
+            self.addCleanup(compression.reset_dictionaries)
+            path = compression.save_dictionary(b"invoice total due " * 64)
+            blob = compression.compress_bytes(b"invoice total due: 42")
+
+            # This process loaded the directory before the dictionary existed
+            builtin = {zlib.crc32(compression.BUILTIN_DICT): compression.BUILTIN_DICT}
+            with mock.patch.object(compression, "_dicts", builtin):
+                self.assertEqual(compression.decompress_bytes(blob), b"invoice total due: 42")
+
+            compression.reset_dictionaries()
+            path.unlink()
+            with self.assertRaises(ValueError):
+                compression.decompress_bytes(blob)
+
+
+class CleanupOldTasksTests(TestCase):
+    """``cleanup_old_tasks`` keeps PDFs that newer copies of a task still use."""
+
+    def test_shared_pdf_survives_until_its_last_task_goes(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            old = ConversionTask(original_filename="x.pdf", prompt="p")
+            old.pdf_file.save("x.pdf", ContentFile(b"%PDF-"), save=False)
+            old.save()
+            copy = processing.copy_task(old)
+            storage, name = old.pdf_file.storage, old.pdf_file.name
+            ConversionTask.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=40))
+
+            call_command("cleanup_old_tasks", days=30, stdout=io.StringIO())
+            self.assertFalse(ConversionTask.objects.filter(pk=old.pk).exists())
+            self.assertTrue(storage.exists(name))
+
+            ConversionTask.objects.filter(pk=copy.pk).update(created_at=timezone.now() - timedelta(days=40))
+            call_command("cleanup_old_tasks", days=30, stdout=io.StringIO())
+            self.assertFalse(storage.exists(name))
+
+
+class ShardFailureTests(TestCase):
+    """Progress bookkeeping when a shard fails, and shards outliving their task."""
+
+    def setUp(self):
+        self.task = ConversionTask.objects.create(
+            original_filename="x.pdf", pdf_file="x.pdf", prompt="p", status=ConversionTask.Status.PROCESSING
+        )
+        self.shard = TaskShard.objects.create(
+            task=self.task, index=0, start_page=1, end_page=3, first_index=0,
+            status=TaskShard.Status.CLAIMED, worker="w", attempts=1,
+        )
+
+    def test_release_takes_back_only_the_progress_that_landed(self):
+        counted = {"task_pages": 0}
+        cancel = threading.Event()
+        callback = sharding._make_shard_progress_callback(self.shard, {"progress_db_ms": 0.0}, cancel, counted)
+        callback(0)
+        callback(1)
+        ConversionTask.objects.filter(pk=self.task.pk).update(status=ConversionTask.Status.CANCELLED)
+        callback(2)
+        self.assertTrue(cancel.is_set())
+
+        sharding._release_failed_shard(self.shard, "w", RuntimeError("boom"), counted["task_pages"])
+        self.task.refresh_from_db()
+        self.shard.refresh_from_db()
+        self.assertEqual(self.task.pages_processed, 0)
+        self.assertEqual((self.shard.status, self.shard.pages_processed), (TaskShard.Status.PENDING, 0))
+
+    def test_deleted_task_is_left_alone(self):
+        task_id = self.task.pk
+        self.task.delete()
+        with mock.patch.object(sharding.webhooks, "task_finished") as finished:
+            sharding._finish_as_failed(self.shard, "boom", worker="w")
+            sharding._release_failed_shard(self.shard, "w", RuntimeError("boom"), 0)
+            self.assertFalse(sharding.try_merge(task_id))
+        finished.assert_not_called()
+
+
+class CancelScopeTests(TestCase):
+    """Each run of a task has its own cancel event; a late failure keeps the cancel."""
+
+    def test_runs_have_their_own_events(self):
+        with cancel_scope(7) as first, cancel_scope(7) as second:
+            signal_cancel(7)
+            self.assertTrue(first.is_set() and second.is_set())
+            with cancel_scope(7) as retry:
+                self.assertFalse(retry.is_set())
+        with cancel_scope(7) as later:
+            self.assertFalse(later.is_set())
+
+    def test_failure_after_cancel_keeps_cancelled(self):
+        task = ConversionTask.objects.create(original_filename="x.pdf", pdf_file="x.pdf", prompt="p")
+
+        def render(*args, **kwargs):
+            processing.cancel_processing(task.pk)
+            raise RuntimeError("unreadable")
+
+        with mock.patch.object(processing, "pdf_to_base64_images", render):
+            processing._run_cancellable_pipeline(task, False, threading.Event())
+        task.refresh_from_db()
+        self.assertEqual(task.status, ConversionTask.Status.CANCELLED)
+
+
+class KeyPoolTests(SimpleTestCase):
+    """Headroom bookkeeping and who retries a failed call."""
+
+    budget = {"x-ratelimit-remaining-requests": "10", "x-ratelimit-reset-requests": "60s"}
+
+    def test_calls_in_flight_count_once(self):
+        pool = key_pool.KeyPool("openai", ["a", "b"])
+        key = pool.acquire(exclude={"b"})
+        pool.release(key, 200, self.budget)
+        key = pool.acquire(exclude={"b"})
+        self.assertEqual(key.remaining, 10)
+        self.assertEqual(key.headroom(time.monotonic()), 9)
+
+    def test_pool_retries_transient_failures(self):
+        class Unavailable(Exception):
+            status_code = 503
+
+        pool = key_pool.KeyPool("openai", ["a", "b"])
+        outcomes = [Unavailable(), Unavailable(), "ok"]
+
+        def call(api_key):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with mock.patch.object(key_pool, "get_pool", return_value=pool), mock.patch.object(key_pool.time, "sleep"):
+            self.assertEqual(key_pool.call_with_key("openai", call, lambda r: None, retries=2), "ok")
+            outcomes[:] = [Unavailable(), "ok"]
+            with self.assertRaises(Unavailable):
+                key_pool.call_with_key("openai", call, lambda r: None)
+
+    @override_settings(OPENAI_API_KEY="a", OPENAI_API_KEYS=["b"])
+    def test_openai_sdk_does_not_retry_when_keys_are_pooled(self):
+        raw = mock.MagicMock(headers={}, retries_taken=0)
+        raw.parse.return_value.usage = None
+        with mock.patch("openai.OpenAI") as client:
+            client.return_value.chat.completions.with_raw_response.create.return_value = raw
+            vision._openai_transcribe_page("aW1n", "prompt", "gpt-4o")
+        self.assertEqual(client.call_args.kwargs["max_retries"], 0)
+
+
+class WebhookTargetTests(SimpleTestCase):
+    """Where ``webhooks`` agrees to send deliveries."""
+
+    @override_settings(WEBHOOK_ALLOWED_HOSTS=[])
+    def test_non_public_addresses_are_refused(self):
+        for url in (
+            "http://127.0.0.1:8200/",
+            "http://localhost/",
+            "http://169.254.169.254/latest/meta-data/",
+            "http://10.0.0.5/",
+            "http://[::1]/",
+            "http://0x7f000001/",
+            "ftp://93.184.216.34/",
+        ):
+            with self.assertRaises(ValueError, msg=url):
+                webhooks.check_url(url)
+        self.assertEqual(webhooks.check_url("https://93.184.216.34/hook"), ["93.184.216.34"])
+
+    @override_settings(WEBHOOK_ALLOWED_HOSTS=["127.0.0.1", ".example.com"])
+    def test_allowlist_admits_only_listed_hosts(self):
+        webhooks.check_url("http://127.0.0.1:8200/")
+        webhooks.check_url("https://hooks.example.com/x")
+        webhooks.check_url("https://example.com/")
+        for url in ("http://93.184.216.34/", "http://10.0.0.5/", "https://badexample.com/"):
+            with self.assertRaises(ValueError, msg=url):
+                webhooks.check_url(url)
+
+    def test_redirects_are_not_followed(self):
+        reached = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                if self.path == "/hook":
+                    self.send_response(302)
+                    self.send_header("Location", "/elsewhere")
+                else:
+                    reached.append(self.path)
+                    self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        status, error = webhooks._post(f"http://127.0.0.1:{server.server_port}/hook", b"{}")
+
+        self.assertEqual((status, error), (302, "HTTP 302"))
+        self.assertEqual(reached, [])
+
+    def test_post_connects_to_the_checked_address(self):
+        hosts = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                hosts.append(self.headers["Host"])
+                self.send_response(204)
+                self.end_headers()
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        # The name no longer matters: no second lookup happens
+        url = f"http://hooks.invalid:{server.server_port}/hook"
+        self.assertEqual(webhooks._post(url, b"{}", ["127.0.0.1"]), (204, ""))
+        self.assertEqual(hosts, [f"hooks.invalid:{server.server_port}"])
+        self.assertIsNone(webhooks._post(url, b"{}")[0])
+
+
+class RenderingTests(SimpleTestCase):
+    """Per-page Markdown rendering for the result page."""
+
+    def test_failed_page_boxes_keep_the_page_heading_prefix(self):
+        # A legacy single-page document holds the placeholders of several failed pages
+        text = "\n\n".join(
+            ["# Intro", vision.FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(2), vision.FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(5)]
+        )
+
+        page_html = rendering._render_page(1, 1, text, {2: "boom", 5: "bang"})
+
+        self.assertIn('<h1 id="p1-intro">', page_html)
+        self.assertIn('data-page="2"', page_html)
+        self.assertIn('data-page="5"', page_html)
+
+
+class TaskPageCacheTests(TestCase):
+    """Cached page sources never outlive the results they were built from."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_new_results_are_served_even_if_the_version_counter_was_evicted(self):
+        task = ConversionTask.objects.create(
+            original_filename="x.pdf", pdf_file="x.pdf", prompt="p", page_results=["old one", "old two"]
+        )
+        self.assertEqual(rendering.task_page(task, 1).markdown, "old one")
+
+        # A retry saves new pages; its version bump is lost to cache culling
+        rendering.invalidate_task_render(task.pk)
+        cache.delete(rendering._VERSION_KEY.format(task.pk))
+        task.page_results = ["new one", "new two", "new three"]
+        task.save(update_fields=["page_results", "updated_at"])
+        task = ConversionTask.objects.defer(*ConversionTask.HEAVY_FIELDS).get(pk=task.pk)
+
+        page = rendering.task_page(task, 1)
+        self.assertEqual(page.markdown, "new one")
+        self.assertEqual(page.total, 3)
+        self.assertEqual(rendering.task_page_total(task), 3)
+
+
+class ByteRangeTests(SimpleTestCase):
+    """Which ``Range`` headers get a 206, a 416 or the whole file."""
+
+    def requested(self, header, size=10):
+        request = RequestFactory().get("/", HTTP_RANGE=header)
+        return downloads._requested_range(request, size, '"etag"', 0)
+
+    def test_ranges(self):
+        self.assertEqual(self.requested("bytes=2-5"), (2, 5))
+        self.assertEqual(self.requested("bytes=4-"), (4, 9))
+        self.assertEqual(self.requested("bytes=-3"), (7, 9))
+        self.assertEqual(self.requested("bytes=8-50"), (8, 9))
+
+    def test_last_byte_before_first_is_ignored(self):
+        self.assertIsNone(self.requested("bytes=5-2"))
+
+    def test_start_past_the_end_is_unsatisfiable(self):
+        self.assertEqual(self.requested("bytes=10-12"), "unsatisfiable")
+        self.assertEqual(self.requested("bytes=-0"), "unsatisfiable")
@@ -8,11 +8,21 @@ urlpatterns = [
     path("", views.index, name="index"),
     path("processing/<int:pk>/", views.processing, name="processing"),
     path("api/status/<int:pk>/", views.task_status, name="task_status"),
+    path("api/tasks/", views.task_create_api, name="task_create_api"),
+    path("api/tasks/<int:pk>/", views.task_detail_api, name="task_detail_api"),
+    path("api/tasks/<int:pk>/result/", views.task_result_api, name="task_result_api"),
+    path("api/tasks/<int:pk>/priority/", views.task_priority, name="task_priority"),
+    path("api/tasks/<int:pk>/cancel/", views.task_cancel_api, name="task_cancel_api"),
     path("result/<int:pk>/", views.result, name="result"),
+    path("result/<int:pk>/pages/<int:page>/", views.result_page, name="result_page"),
+    path("result/<int:pk>/metrics/", views.result_metrics, name="result_metrics"),
     path("retry/<int:pk>/", views.retry_task, name="retry_task"),
+    path("cancel/<int:pk>/", views.cancel_task, name="cancel_task"),
     path("download/<int:pk>/", views.download, name="download"),
     path("download-pdf/<int:pk>/", views.download_pdf, name="download_pdf"),
     path("history/", views.history, name="history"),
     path("history/bulk-delete/", views.history_bulk_delete, name="history_bulk_delete"),
+    path("api/search/", views.search_api, name="search_api"),
     path("settings/", views.settings_view, name="settings"),
+    path("metrics", views.metrics, name="metrics"),
 ]
@@ -1,26 +1,49 @@
-import html
+import functools
+import json
 import logging
+from datetime import datetime, timedelta, timezone
 from urllib.parse import quote
 
-import markdown as md
 from django.conf import settings
 from django.contrib import messages
-from django.http import FileResponse, Http404, JsonResponse
+from django.db.models import Count, Q
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_http_methods, require_POST
 
 from .forms import (
     GEMINI_MODEL_CHOICES,
     OPENAI_MODEL_CHOICES,
     SettingsForm,
+    TaskApiForm,
     UploadForm,
+    parse_priority,
 )
-from .models import APP_SETTINGS_ID, AppSettings, ConversionTask, get_effective_vision_config
-from .services.processing import start_processing
-from .services.vision import FAILED_PAGE_PLACEHOLDER_TEMPLATE
+from .models import APP_SETTINGS_ID, AppSettings, ConversionTask, TaskShard, get_effective_vision_config
+from .services import circuit_breaker, key_pool, webhooks
+from .services.downloads import serve_file
+from .services.page_metrics import summarize_metrics
+from .services.processing import (
+    cancel_processing,
+    copy_task,
+    create_task_from_path,
+    create_task_from_upload,
+    profiling_supported,
+    start_processing,
+)
+from .services.rendering import task_page, task_page_total, task_pages_markdown
+from .services.scheduler import set_task_priority
+from .services.search import filter_by_filename, get_search_backend
+from .services.telemetry import render_metrics
 
 logger = logging.getLogger(__name__)
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
 
 # ── Upload / Index ────────────────────────────────────────────
 
@@ -35,13 +58,20 @@ def index(request):
             start_page = form.cleaned_data.get("start_page") or 1
             end_page = form.cleaned_data.get("end_page") or 0
 
-            task = ConversionTask.objects.create(
-                original_filename=pdf_file.name,
-                pdf_file=pdf_file,
+            task = create_task_from_upload(
+                pdf_file,
                 prompt=prompt,
                 start_page=start_page,
                 end_page=end_page,
+                profile_requested=form.cleaned_data.get("profile", False),
+                priority=form.cleaned_data["priority"],
+                submitter=_submitter(request),
             )
+            if task.profile_requested and not profiling_supported(task):
+                ConversionTask.objects.filter(pk=task.pk).update(profile_requested=False)
+                messages.warning(
+                    request, "This document is split into shards, which cannot be profiled; converting it unprofiled."
+                )
 
             # Kick off background processing
             start_processing(task.pk)
@@ -53,6 +83,13 @@ def index(request):
     return render(request, "converter/index.html", {"form": form})
 
 
+def _submitter(request) -> str:
+    """Fair-share identity of the uploader: username if logged in, else client address."""
+    if request.user.is_authenticated:
+        return request.user.get_username()[:150]
+    return request.META.get("REMOTE_ADDR", "")
+
+
 # ── Processing (polling page) ─────────────────────────────────
 
 
@@ -66,10 +103,11 @@ def processing(request, pk):
         ConversionTask.Status.PARTIAL_SUCCESS,
     ):
         return redirect("converter:result", pk=task.pk)
-    if task.status == ConversionTask.Status.FAILED:
+    if task.status in (ConversionTask.Status.FAILED, ConversionTask.Status.CANCELLED):
         return redirect("converter:result", pk=task.pk)
 
-    backend, _, _ = get_effective_vision_config()
+    # A running task has its own config snapshot; pending ones will use the current one
+    backend = task.vision_backend or get_effective_vision_config().backend
     return render(
         request,
         "converter/processing.html",
@@ -77,18 +115,84 @@ def processing(request, pk):
     )
 
 
+# ── Task API access ───────────────────────────────────────────
+
+
+def _api_unauthorized(request):
+    """401 response unless the request carries ``Bearer <API_TOKEN>``."""
+    if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {settings.API_TOKEN}"):
+        return JsonResponse({"error": "Unauthorized."}, status=401)
+    return None
+
+
+def _task_api(view):
+    """Guard a ``/api/tasks/`` view: ``Bearer <API_TOKEN>`` when a token is set, else CSRF.
+
+    Token requests carry no session cookie, so they skip the CSRF check;
+    without a token the API is protected like the HTML forms.
+    """
+    protected = csrf_protect(view)
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not settings.API_TOKEN:
+            return protected(request, *args, **kwargs)
+        return _api_unauthorized(request) or view(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
+
+
 # ── Status API (JSON for polling) ─────────────────────────────
 
 
 def task_status(request, pk):
     """Return task status as JSON for the polling frontend."""
     task = get_object_or_404(ConversionTask, pk=pk)
+    data = {
+        "status": task.status,
+        "page_count": task.page_count,
+        "pages_processed": task.pages_processed,
+        "error_message": task.error_message if task.status == "failed" else "",
+    }
+    if task.status == ConversionTask.Status.PROCESSING:
+        shards = task.shards.aggregate(
+            total=Count("pk"),
+            done=Count("pk", filter=Q(status__in=(TaskShard.Status.DONE, TaskShard.Status.MERGED))),
+        )
+        if shards["total"]:
+            data["shards_total"] = shards["total"]
+            data["shards_done"] = shards["done"]
+    return JsonResponse(data)
+
+
+@_task_api
+@require_http_methods(["GET", "POST"])
+def task_priority(request, pk):
+    """Return (GET) or change (POST ``priority``, form or JSON body) a task's priority.
+
+    A change applies immediately to pages not yet sent to the vision API.
+    """
+    task = get_object_or_404(ConversionTask.objects.only("pk", "priority"), pk=pk)
+    if request.method == "POST":
+        if request.content_type == "application/json":
+            try:
+                value = json.loads(request.body or b"{}").get("priority")
+            except (ValueError, AttributeError):
+                return JsonResponse({"error": "Invalid JSON body."}, status=400)
+        else:
+            value = request.POST.get("priority")
+        try:
+            priority = parse_priority(value)
+        except ValueError as exc:
+            return JsonResponse({"error": str(exc)}, status=400)
+        task.priority = priority
+        task.save(update_fields=["priority"])
+        set_task_priority(task.pk, priority)
     return JsonResponse(
         {
-            "status": task.status,
-            "page_count": task.page_count,
-            "pages_processed": task.pages_processed,
-            "error_message": task.error_message if task.status == "failed" else "",
+            "id": task.pk,
+            "priority": task.priority,
+            "priority_label": ConversionTask.Priority(task.priority).label.lower(),
         }
     )
 
@@ -97,55 +201,73 @@ def task_status(request, pk):
 
 
 def result(request, pk):
-    """Show the conversion result with a rendered Markdown preview."""
-    task = get_object_or_404(ConversionTask, pk=pk)
+    """Show the conversion result; pages are loaded on demand by the viewer.
 
-    markdown_html = ""
-    markdown_raw = ""
+    The response only carries the page count, so its size stays constant
+    regardless of document length. Page content comes from ``result_page``.
+    """
+    # Pages are read through the per-page cache; the template never needs them
+    task = get_object_or_404(ConversionTask.objects.defer("metrics", "page_results"), pk=pk)
 
-    if task.markdown_file and task.status in (
-        ConversionTask.Status.SUCCESS,
-        ConversionTask.Status.PARTIAL_SUCCESS,
-    ):
+    page_total = 0
+    if _has_result(task):
         try:
-            markdown_raw = task.markdown_file.read().decode("utf-8")
-            task.markdown_file.seek(0)
-            # Replace transcription-failed placeholders with error UI for preview
-            failed_pages = getattr(task, "failed_pages", None) or []
-            markdown_for_preview = markdown_raw
-            for fp in failed_pages:
-                page_num = fp.get("page")
-                err_msg = fp.get("error", "Unknown error")
-                if page_num is None:
-                    continue
-                placeholder = FAILED_PAGE_PLACEHOLDER_TEMPLATE.format(page_num)
-                safe_error = html.escape(err_msg)
-                retry_url = reverse("converter:retry_task", kwargs={"pk": task.pk})
-                replacement = (
-                    f'<div class="transcription-failed-box" data-page="{page_num}">'
-                    f'<p class="transcription-failed-title">Page {page_num}: transcription failed</p>'
-                    f'<pre class="transcription-failed-error">{safe_error}</pre>'
-                    f'<a href="{retry_url}" class="transcription-failed-retry">Retry conversion</a>'
-                    "</div>"
-                )
-                markdown_for_preview = markdown_for_preview.replace(
-                    placeholder, replacement, 1
-                )
-            markdown_html = md.markdown(
-                markdown_for_preview,
-                extensions=["tables", "fenced_code", "toc"],
-            )
+            page_total = task_page_total(task)
         except Exception:
             logger.exception("Failed to read markdown for task %d", pk)
 
     return render(
         request,
         "converter/result.html",
+        {"task": task, "page_total": page_total},
+    )
+
+
+def result_page(request, pk, page):
+    """Return one page of a result as JSON, or as an HTML fragment with ``?format=html``.
+
+    Pages come from the per-page cache; the task's pages are loaded (once for
+    all pages) only on a miss.
+    """
+    task = get_object_or_404(ConversionTask.objects.defer(*ConversionTask.HEAVY_FIELDS), pk=pk)
+    if not _has_result(task):
+        raise Http404("Result not available.")
+
+    task_page_data = task_page(task, page)
+    if task_page_data is None:
+        raise Http404("Page out of range.")
+
+    if request.GET.get("format") == "html":
+        return HttpResponse(task_page_data.html)
+    return JsonResponse(
         {
-            "task": task,
-            "markdown_html": markdown_html,
-            "markdown_raw": markdown_raw,
-        },
+            "page": page,
+            "page_total": task_page_data.total,
+            "html": task_page_data.html,
+            "markdown": task_page_data.markdown,
+        }
+    )
+
+
+def result_metrics(request, pk):
+    """Return per-page timings and their aggregates for the result page waterfall."""
+    task = get_object_or_404(ConversionTask.objects.only("pk", "metrics"), pk=pk)
+    metrics = task.metrics or {}
+    return JsonResponse(
+        {
+            "summary": summarize_metrics(metrics),
+            "stages": metrics.get("stages", {}),
+            "pages": metrics.get("pages", []),
+        }
+    )
+
+
+def _has_result(task) -> bool:
+    """True when the task has Markdown output that can be viewed."""
+    return bool(task.markdown_file) and task.status in (
+        ConversionTask.Status.SUCCESS,
+        ConversionTask.Status.PARTIAL_SUCCESS,
+        ConversionTask.Status.CANCELLED,
     )
 
 
@@ -165,68 +287,210 @@ def retry_task(request, pk):
         start_processing(task.pk, retry_failed_only=True)
         return redirect("converter:processing", pk=task.pk)
     # No per-page data or legacy task: create new task and run full conversion
-    new_task = ConversionTask.objects.create(
-        original_filename=task.original_filename,
-        pdf_file=task.pdf_file,
-        prompt=task.prompt,
-        start_page=task.start_page,
-        end_page=task.end_page,
-    )
+    new_task = copy_task(task)
     start_processing(new_task.pk)
     return redirect("converter:processing", pk=new_task.pk)
 
 
+# ── Cancel ────────────────────────────────────────────────────
+
+
+@require_POST
+def cancel_task(request, pk):
+    """Cancel a pending or running task (form POST) and show what was transcribed."""
+    task = get_object_or_404(ConversionTask.objects.only("pk"), pk=pk)
+    if cancel_processing(task.pk):
+        messages.info(request, "Conversion cancelled. Pages finished so far are kept.")
+    next_url = request.POST.get("next")
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect("converter:result", pk=task.pk)
+
+
+@_task_api
+@require_POST
+def task_cancel_api(request, pk):
+    """Cancel a task (JSON API); ``cancelled`` is False if it was not running."""
+    task = get_object_or_404(ConversionTask.objects.only("pk"), pk=pk)
+    cancelled = cancel_processing(task.pk)
+    task.refresh_from_db(fields=["status"])
+    return JsonResponse({"id": task.pk, "cancelled": cancelled, "status": task.status})
+
+
+# ── Task API (JSON) ───────────────────────────────────────────
+
+
+@_task_api
+@require_POST
+def task_create_api(request):
+    """Submit a PDF (multipart ``pdf_file`` or JSON/form ``path``) and start converting it.
+
+    Optional fields: ``prompt``, ``start_page``, ``end_page``, ``priority``
+    and ``webhook_url``. Answers 201 with the task (as ``task_detail_api``).
+    """
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Invalid JSON body."}, status=400)
+        form = TaskApiForm(data)
+    else:
+        form = TaskApiForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse(
+            {"error": "Invalid task.", "fields": {name: list(errors) for name, errors in form.errors.items()}},
+            status=400,
+        )
+
+    fields = {
+        "prompt": form.cleaned_data["prompt"],
+        "start_page": form.cleaned_data["start_page"],
+        "end_page": form.cleaned_data.get("end_page") or 0,
+        "priority": form.cleaned_data["priority"],
+        "webhook_url": form.cleaned_data["webhook_url"],
+        "submitter": _submitter(request),
+    }
+    if form.cleaned_data["path"]:
+        task = create_task_from_path(form.cleaned_data["path"], **fields)
+    else:
+        task = create_task_from_upload(form.cleaned_data["pdf_file"], **fields)
+    start_processing(task.pk)
+
+    response = JsonResponse(webhooks.task_payload(task), status=201)
+    response["Location"] = reverse("converter:task_detail_api", args=[task.pk])
+    return response
+
+
+@_task_api
+@require_http_methods(["GET"])
+def task_detail_api(request, pk):
+    """Return a task's status, progress, failed pages and links."""
+    task = get_object_or_404(ConversionTask.objects.defer("prompt", "page_results", "metrics"), pk=pk)
+    return JsonResponse(webhooks.task_payload(task))
+
+
+@_task_api
+@require_http_methods(["GET"])
+def task_result_api(request, pk):
+    """Return a finished task's Markdown, whole and per page; 409 while it is running."""
+    task = get_object_or_404(ConversionTask.objects.defer("metrics"), pk=pk)
+    if task.status in (ConversionTask.Status.PENDING, ConversionTask.Status.PROCESSING):
+        return JsonResponse({"error": "Task has not finished.", "id": task.pk, "status": task.status}, status=409)
+    pages = task_pages_markdown(task) if task.markdown_file else []
+    return JsonResponse(
+        {
+            "id": task.pk,
+            "status": task.effective_status,
+            "markdown": "\n\n".join(pages),
+            "pages": pages,
+            "failed_pages": task.failed_pages or [],
+        }
+    )
+
+
 # ── Download ──────────────────────────────────────────────────
 
 
 def download(request, pk):
-    """Serve the Markdown file as a download."""
+    """Serve the Markdown file as a download (ETag/304, gzip or brotli)."""
     task = get_object_or_404(ConversionTask, pk=pk)
 
     if not task.markdown_file or task.effective_status == ConversionTask.Status.FAILED:
         raise Http404("Markdown file not available.")
 
-    safe_name = task.markdown_filename
-
-    response = FileResponse(
-        task.markdown_file.open("rb"),
+    return serve_file(
+        request,
+        task.markdown_file,
         content_type="text/markdown; charset=utf-8",
+        filename=task.markdown_filename,
+        compress=True,
     )
-    response["Content-Disposition"] = f'attachment; filename="{safe_name}"'
-    return response
 
 
 def download_pdf(request, pk):
-    """Serve the original PDF file as a download."""
+    """Serve the original PDF file as a download (ETag/304, byte ranges)."""
     task = get_object_or_404(ConversionTask, pk=pk)
 
     if not task.pdf_file:
         raise Http404("Original PDF not available.")
 
-    response = FileResponse(
-        task.pdf_file.open("rb"),
+    return serve_file(
+        request,
+        task.pdf_file,
         content_type="application/pdf",
+        filename=task.original_filename,
+        ranges=True,
     )
-    response["Content-Disposition"] = f'attachment; filename="{task.original_filename}"'
-    return response
 
 
 # ── History ───────────────────────────────────────────────────
 
 
 def history(request):
-    """List all conversion tasks, optionally filtered by filename search."""
-    tasks = ConversionTask.objects.all()
+    """List conversion tasks newest first, with keyset pagination and filename search.
+
+    ``?after=<cursor>`` shows older tasks and ``?before=<cursor>`` newer ones;
+    cursors encode ``(created_at, pk)`` of the boundary row, so each page is
+    an index range scan regardless of how deep the user pages.
+    """
+    page_size = settings.HISTORY_PAGE_SIZE
+    tasks = ConversionTask.objects.defer(*ConversionTask.HEAVY_FIELDS)
     search_query = (request.GET.get("q") or "").strip()
     if search_query:
-        tasks = tasks.filter(original_filename__icontains=search_query)
+        tasks = filter_by_filename(tasks, search_query)
+
+    after = _decode_history_cursor(request.GET.get("after"))
+    before = _decode_history_cursor(request.GET.get("before"))
+    if before:
+        created_at, pk = before
+        rows = list(
+            tasks.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+            ).order_by("created_at", "pk")[: page_size + 1]
+        )
+        has_newer = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_older = True
+    else:
+        if after:
+            created_at, pk = after
+            tasks = tasks.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+        rows = list(tasks.order_by("-created_at", "-pk")[: page_size + 1])
+        has_older = len(rows) > page_size
+        rows = rows[:page_size]
+        has_newer = after is not None
+
     return render(
         request,
         "converter/history.html",
-        {"tasks": tasks, "search_query": search_query},
+        {
+            "tasks": rows,
+            "search_query": search_query,
+            "newer_cursor": _encode_history_cursor(rows[0]) if rows and has_newer else "",
+            "older_cursor": _encode_history_cursor(rows[-1]) if rows and has_older else "",
+        },
     )
 
 
+def _encode_history_cursor(task) -> str:
+    """Encode a task's (created_at, pk) as ``<epoch microseconds>-<pk>``."""
+    micros = (task.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}-{task.pk}"
+
+
+def _decode_history_cursor(value):
+    """Inverse of ``_encode_history_cursor()``; None for missing or malformed cursors."""
+    try:
+        micros, pk = (value or "").split("-")
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
 def history_bulk_delete(request):
     """Delete selected conversion tasks (POST with ids)."""
     if request.method != "POST":
@@ -244,6 +508,72 @@ def history_bulk_delete(request):
     return redirect("converter:history")
 
 
+# ── Content search ────────────────────────────────────────────
+
+
+def search_api(request):
+    """Full-text search over transcribed pages; JSON hits with snippets and rank.
+
+    Query parameters: ``q`` (required), ``limit`` (1–100, default 20) and
+    ``offset``.
+    """
+    query = (request.GET.get("q") or "").strip()
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), 100)
+        offset = max(int(request.GET.get("offset", 0)), 0)
+    except ValueError:
+        return JsonResponse({"error": "limit and offset must be integers."}, status=400)
+    if not query:
+        return JsonResponse({"error": "Missing query parameter 'q'."}, status=400)
+
+    # One extra hit tells whether another page follows
+    hits = get_search_backend().search(query, limit=limit + 1, offset=offset)
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    tasks = ConversionTask.objects.only("id", "original_filename").in_bulk(
+        {hit.task_id for hit in hits}
+    )
+    results = []
+    for hit in hits:
+        task = tasks.get(hit.task_id)
+        if task is None:
+            continue
+        results.append(
+            {
+                "task_id": hit.task_id,
+                "filename": task.original_filename,
+                "page": hit.page,
+                "snippet": hit.snippet,
+                "rank": hit.rank,
+                "url": reverse("converter:result", kwargs={"pk": hit.task_id})
+                + f"#page-{hit.page}",
+            }
+        )
+    return JsonResponse(
+        {"query": query, "offset": offset, "has_more": has_more, "results": results}
+    )
+
+
+# ── Metrics ───────────────────────────────────────────────────
+
+
+def metrics(request):
+    """Prometheus scrape endpoint; served from in-process counters without DB queries.
+
+    When ``METRICS_TOKEN`` is set, requests must send ``Authorization: Bearer <token>``.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404("Metrics are disabled.")
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 # ── Settings ──────────────────────────────────────────────────
 
 
@@ -299,4 +629,12 @@ def settings_view(request):
             }
         )
 
-    return render(request, "converter/settings.html", {"form": form})
+    return render(
+        request,
+        "converter/settings.html",
+        {
+            "form": form,
+            "key_pools": key_pool.pool_stats(),
+            "open_breakers": circuit_breaker.open_breakers(),
+        },
+    )